@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Benchmark: Geschwindigkeit der Verfahren zur Textgewinnung aus HTML
+# (textimport.EXTRACTORS) und Ähnlichkeit ihrer Ergebnisse zum bisherigen
+# Verfahren "breadability".
+#
+# Der Korpus ist ein Verzeichnis mit gespeicherten Seiten (*.html). Mit --save
+# werden die URLs einer Datei mit getaggten URLs zuerst dorthin heruntergeladen.
+# Ohne Verzeichnis wird ein künstlicher Korpus erzeugt.
+#
+# Aufruf aus dem Wurzelverzeichnis des Projekts:
+#   python3 benchmarks/bench_extract.py [--save tagged.txt] [--repeat N] [CORPUS_DIR]
+
+import argparse
+import glob
+import hashlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from collections import Counter
+
+# Modulsuchpfad erweitern
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import textimport
+
+REFERENCE = "breadability"
+
+
+def saveCorpus(tagged_fn, directory):
+    os.makedirs(directory, exist_ok=True)
+    urls = [url for urls in textimport.get_urls_per_subject_from_file(tagged_fn).values() for url in urls]
+
+    for url in urls:
+        filename = os.path.join(directory, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html")
+        if os.path.exists(filename):
+            continue
+        try:
+            html = textimport.fetch_html(url)
+        except textimport.FetchError as e:
+            print("skipping %s: %s" % (url, e.reason), file=sys.stderr)
+            continue
+        with open(filename, "wb") as html_file:
+            html_file.write(html)
+
+
+# Seiten mit Navigation, Skripten, Kommentaren und einem Artikel aus mehreren Absätzen
+def writeSyntheticCorpus(directory, pages=50, paragraphs=30):
+    rnd = random.Random(0)
+    words = ["word%i" % i for i in range(2000)]
+
+    def sentence():
+        return " ".join(rnd.choices(words, k=rnd.randint(8, 25))).capitalize() + "."
+
+    for page in range(pages):
+        navigation = "".join('<li><a href="/p%i">%s</a></li>' % (i, rnd.choice(words)) for i in range(40))
+        article = "".join("<p>%s</p>" % " ".join(sentence() for _ in range(5)) for _ in range(paragraphs))
+        script = "var data = [%s];" % ", ".join(str(rnd.random()) for _ in range(500))
+        html = ("<!DOCTYPE html><html><head><title>Page %i</title><style>p { margin: 0; }</style>"
+                "<script>%s</script></head><body><nav><ul>%s</ul></nav><!-- tracking -->"
+                "<div class=\"content\"><h1>%s</h1>%s</div><footer>%s</footer></body></html>"
+                % (page, script, navigation, sentence(), article, sentence()))
+        with open(os.path.join(directory, "page%i.html" % page), "w") as html_file:
+            html_file.write(html)
+
+
+def loadCorpus(directory):
+    pages = []
+    for filename in sorted(glob.glob(os.path.join(directory, "*.htm*"))):
+        with open(filename, "rb") as html_file:
+            pages.append(html_file.read())
+    return pages
+
+
+# Ähnlichkeit zweier Texte: Jaccard-Index der Wörter als Multimenge
+def similarity(text, reference):
+    words, reference_words = Counter(text.lower().split()), Counter(reference.lower().split())
+    union = sum((words | reference_words).values())
+    if union == 0:
+        return 1.0
+    return sum((words & reference_words).values()) / union
+
+
+def runExtractor(extractor, pages, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        texts = [textimport.extract_text_from_html(html, "http://localhost/", extractor) for html in pages]
+        durations.append(time.perf_counter() - start)
+    return min(durations), texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for the HTML extraction backends')
+    parser.add_argument('corpus', nargs='?', help='directory with saved HTML pages (default: synthetic pages)')
+    parser.add_argument('--save', metavar='TAGGED_FILE', help='download the URLs of this file into the corpus first')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per extractor')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = args.corpus
+        if args.save:
+            if directory is None:
+                parser.error("--save needs a corpus directory")
+            saveCorpus(args.save, directory)
+        elif directory is None:
+            directory = temporary
+            writeSyntheticCorpus(directory)
+
+        pages = loadCorpus(directory)
+        if len(pages) == 0:
+            parser.error("no *.html files in %s" % directory)
+
+        megabytes = sum(len(html) for html in pages) / 1e6
+        print("%i pages, %.1f MB" % (len(pages), megabytes))
+        print("%20s %12s %10s %10s %16s %16s" % ("extractor", "total [s]", "ms/page", "MB/s", "mean similarity", "min similarity"))
+
+        results = {}
+        for extractor in [REFERENCE] + [name for name in textimport.EXTRACTORS if name != REFERENCE]:
+            results[extractor] = runExtractor(extractor, pages, args.repeat)
+
+        reference_texts = results[REFERENCE][1]
+        for extractor, (duration, texts) in results.items():
+            similarities = [similarity(text, reference) for text, reference in zip(texts, reference_texts)]
+            print("%20s %12.3f %10.2f %10.2f %16.3f %16.3f" % (
+                extractor, duration, duration * 1000 / len(pages), megabytes / duration,
+                statistics.mean(similarities), min(similarities)))
+
+
+if __name__ == '__main__':
+    main()
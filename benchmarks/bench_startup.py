@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Benchmark: Startzeit von main.py, d.h. Importzeit und Zeit bis zum ersten
+# Ergebnis je Unterbefehl. Die Lerndaten werden aus einem kleinen, künstlichen
+# Textkorpus in einem temporären Verzeichnis erzeugt.
+#
+# Aufruf aus dem Wurzelverzeichnis des Projekts:
+#   python3 benchmarks/bench_startup.py [--repeat N]
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "main.py"))
+ROOT = os.path.dirname(MAIN)
+
+VOCABULARY = {
+    "cars": "engine wheel brake driver motor fuel tire garage speed road".split(),
+    "cooking": "recipe oven flour sugar butter kitchen bake dough spice taste".split(),
+    "dogs": "puppy bark leash kennel breed tail fetch collar walk bone".split(),
+}
+
+
+def writeCorpus(directory, documents_per_subject=10, words_per_document=200):
+    rnd = random.Random(0)
+    common = "the and with from this that very some many often".split()
+
+    lines = []
+    for subject, words in VOCABULARY.items():
+        for i in range(documents_per_subject):
+            filename = os.path.join(directory, "%s_%i.txt" % (subject, i))
+            with open(filename, "w") as text_file:
+                text_file.write(" ".join(rnd.choice(words + common) for _ in range(words_per_document)) + ".\n")
+            lines.append("%s | %s" % (subject, filename))
+
+    tagged_fn = os.path.join(directory, "tagged.txt")
+    with open(tagged_fn, "w") as tagged_file:
+        tagged_file.write("\n".join(lines) + "\n")
+    return tagged_fn
+
+
+def timeCommand(command, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), min(durations)
+
+
+def waitForServer(socket_fn, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(socket_fn):
+        if time.monotonic() > deadline:
+            raise RuntimeError("server did not start")
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for the startup time of main.py')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per command')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        tagged_fn = writeCorpus(directory)
+        model_fn = os.path.join(directory, "learningdata.model")
+        socket_fn = os.path.join(directory, "server.sock")
+        common = [sys.executable, MAIN, "--text-cache", os.path.join(directory, "cache.sqlite")]
+
+        commands = [
+            ("import", [sys.executable, "-c", "import main"]),
+            ("--help", [sys.executable, MAIN, "--help"]),
+            ("learn", common + ["learn", "--algorithm", "naive", "--tokenizer", "fast", "-l", model_fn, tagged_fn]),
+            ("test", common + ["test", "-l", model_fn, tagged_fn]),
+            ("classify", common + ["classify", "-l", model_fn, os.path.join(directory, "dogs_0.txt")]),
+            ("classify --server", common + ["classify", "--server", socket_fn, os.path.join(directory, "dogs_0.txt")]),
+        ]
+
+        # der Dienst läuft während der gesamten Messung
+        server = None
+        print("%20s %12s %12s" % ("command", "median [s]", "min [s]"))
+        try:
+            for name, command in commands:
+                if name == "classify --server" and server is None:
+                    server = subprocess.Popen(common + ["serve", "-l", model_fn, "--listen", socket_fn],
+                                              cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    waitForServer(socket_fn)
+
+                median, fastest = timeCommand(command, args.repeat)
+                print("%20s %12.3f %12.3f" % (name, median, fastest))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
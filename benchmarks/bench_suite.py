@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Benchmark-Suite ohne Netzwerkzugriff: misst die Verarbeitungsschritte vom
+# Herunterladen bis zum Klassifizieren, um Verschlechterungen zu erkennen.
+#
+# Der Korpus besteht aus künstlichen, getaggten Dokumenten (Anzahl der Kategorien,
+# Dokumente und Wörter einstellbar) und den gespeicherten Seiten in
+# benchmarks/pages. Alle Seiten liefert ein lokaler HTTP-Server aus.
+#
+# Gemessen werden (jeweils die schnellste von --repeat Wiederholungen)
+#   fetch             alle Seiten mit leerem Cache herunterladen und Text gewinnen
+#   word_frequency    makeWordFrequencyDictionary für jedes Dokument
+#   base              buildClassificationSpaceBase
+#   vectorize         getClassificationMatrix für alle Dokumente
+#   learn_<algo>      main.py learn mit jedem Algorithmus (Texte aus dem Cache)
+#   classify_<algo>   Latenz je Dokument (Text -> Bewertung), Perzentile, dazu die
+#                     Genauigkeit mit den Schwellwerten von getWinningSubject
+#                     (accuracy) und die der bestbewerteten Kategorie (top1_accuracy)
+#
+# Die Ergebnisse lassen sich mit --save als JSON speichern und mit --baseline
+# gegen eine gespeicherte Messung vergleichen; Schritte, die um mehr als
+# --tolerance langsamer sind oder deren top1_accuracy gesunken ist, werden
+# gemeldet und der Exit-Code ist dann 1.
+#
+# Aufruf aus dem Wurzelverzeichnis des Projekts:
+#   python3 benchmarks/bench_suite.py [--categories N] [--documents N] [--words N]
+#       [--algorithms svm,bayes] [--repeat N] [--save FILE] [--baseline FILE]
+
+import argparse
+import contextlib
+import glob
+import json
+import logging as log
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from sortedcontainers import SortedDict, SortedSet
+
+# Modulsuchpfad erweitern
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import main as main_module
+import textimport
+import textverarbeitung
+
+PAGES_DIRECTORY = os.path.join(os.path.dirname(__file__), "pages")
+ALGORITHMS = ["svm", "knn", "bayes", "naive", "sgd"]
+
+# Messwerte, die mit der Baseline verglichen werden
+COMPARED_METRICS = ["seconds", "p50", "p90", "p99"]
+
+SYLLABLES = "ba be bi bo bu da de di do du ka ke ki ko ku la le li lo lu ma me mi mo mu na ne ni no nu " \
+            "ra re ri ro ru sa se si so su ta te ti to tu van ver mon ster ing tion".split()
+
+
+# künstliche Wörter aus Silben, damit Tokenizer und Stemmer wie bei echtem Text arbeiten
+def makeWords(rnd, count):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+
+# künstlicher getaggter Korpus: Kategorie -> Liste von Texten. Gemeinsame Wörter
+# sind Zipf-verteilt, dazu kommt ein Anteil an Wörtern der eigenen Kategorie.
+# Die Wörter hängen nicht von seed ab, nur die Auswahl daraus
+def makeSyntheticCorpus(categories, documents, words, seed=0, own_share=0.3):
+    vocabulary = makeWords(random.Random(0), 3000 + 200 * categories)
+    random.Random(1).shuffle(vocabulary)
+    shared, vocabulary = vocabulary[:3000], vocabulary[3000:]
+    shared_weights = [1.0 / (rank + 1) for rank in range(len(shared))]
+
+    rnd = random.Random(seed)
+
+    corpus = SortedDict()
+    for category in range(categories):
+        own = vocabulary[200 * category:200 * (category + 1)]
+        texts = []
+        for _ in range(documents):
+            n_own = int(words * own_share)
+            tokens = rnd.choices(shared, weights=shared_weights, k=words - n_own) + rnd.choices(own, k=n_own)
+            rnd.shuffle(tokens)
+            sentences = [" ".join(tokens[start:start + 12]).capitalize() + "." for start in range(0, len(tokens), 12)]
+            texts.append(" ".join(sentences))
+        corpus["topic%i" % category] = texts
+    return corpus
+
+
+# Text als Seite mit Navigation, Skript und Absätzen aus je fünf Sätzen
+def renderPage(title, text):
+    sentences = text.split(". ")
+    paragraphs = "".join("<p>%s</p>" % ". ".join(sentences[start:start + 5]) for start in range(0, len(sentences), 5))
+    return ("<!DOCTYPE html><html><head><title>%s</title><script>var page = \"%s\";</script></head>"
+            "<body><nav><ul><li><a href=\"/\">Home</a></li><li><a href=\"/about\">About</a></li></ul></nav>"
+            "<div class=\"content\"><h1>%s</h1>%s</div><footer>Synthetic corpus</footer></body></html>"
+            % (title, title, title, paragraphs)).encode("utf-8")
+
+
+class CorpusRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        page = self.server.pages.get(self.path)
+        if page is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, *args):
+        pass
+
+
+# lokaler Ersatz für das Netz: pages ist ein dict Pfad -> HTML
+def startServer(pages):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CorpusRequestHandler)
+    server.pages = pages
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:%i" % server.server_address[1]
+
+
+def timeIt(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return min(durations), result
+
+
+def percentiles(durations):
+    cuts = statistics.quantiles(durations, n=100, method="inclusive")
+    return {"p50": cuts[49], "p90": cuts[89], "p99": cuts[98], "mean": statistics.mean(durations)}
+
+
+def runSuite(args, directory):
+    results = SortedDict()
+    params = textverarbeitung.getClassificationStdParam()
+    params["tokenizer"] = args.tokenizer
+    params["search_jobs"] = 1
+    fetch_params = textimport.get_fetch_std_param()
+
+    corpus = makeSyntheticCorpus(args.categories, args.documents, args.words)
+    texts = [text for category_texts in corpus.values() for text in category_texts]
+
+    pages = {}
+    per_subject_urls = SortedDict()
+    for subject, category_texts in corpus.items():
+        for number, text in enumerate(category_texts):
+            pages["/%s/%i.html" % (subject, number)] = renderPage("%s %i" % (subject, number), text)
+    for filename in sorted(glob.glob(os.path.join(PAGES_DIRECTORY, "*.html"))):
+        with open(filename, "rb") as html_file:
+            pages["/recorded/" + os.path.basename(filename)] = html_file.read()
+
+    server, base_url = startServer(pages)
+    try:
+        urls = [base_url + path for path in pages]
+        for subject in corpus:
+            per_subject_urls[subject] = SortedSet(url for url in urls if url.startswith("%s/%s/" % (base_url, subject)))
+
+        # jede Wiederholung mit einem neuen, leeren Cache; der letzte bleibt für learn
+        fetch_runs = iter(range(args.repeat))
+
+        def fetchAll():
+            textimport.configure_textcache(os.path.join(directory, "fetch%i.sqlite" % next(fetch_runs)))
+            failed = textimport.prefetch_urls(urls, fetch_params)
+            if len(failed) > 0:
+                raise RuntimeError("could not fetch %s" % ", ".join(sorted(failed)))
+
+        seconds, _ = timeIt(fetchAll, args.repeat)
+        results["fetch"] = {"seconds": seconds, "pages": len(pages),
+                            "megabytes": sum(len(page) for page in pages.values()) / 1e6}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # ohne Cache der Worthäufigkeiten, gemessen wird die eigentliche Verarbeitung
+    textverarbeitung.FREQUENCY_CACHE = None
+    seconds, freqs = timeIt(lambda: [textverarbeitung.makeWordFrequencyDictionary(text, args.tokenizer) for text in texts],
+                            args.repeat)
+    results["word_frequency"] = {"seconds": seconds, "documents": len(texts), "words": args.words * len(texts)}
+
+    per_subject_word_freq = SortedDict()
+    offset = 0
+    for subject, category_texts in corpus.items():
+        per_subject_word_freq[subject] = {}
+        for freq in freqs[offset:offset + len(category_texts)]:
+            textverarbeitung.appendWordFreqDictToExistingDict(per_subject_word_freq[subject], freq)
+        offset += len(category_texts)
+
+    seconds, base = timeIt(lambda: textverarbeitung.buildClassificationSpaceBase(per_subject_word_freq, params), args.repeat)
+    results["base"] = {"seconds": seconds, "base_size": len(base)}
+
+    base_index = textverarbeitung.getBaseIndex(base)
+    seconds, _ = timeIt(lambda: textverarbeitung.getClassificationMatrix(base_index, freqs), args.repeat)
+    results["vectorize"] = {"seconds": seconds, "documents": len(freqs)}
+
+    # Dokumente zum Klassifizieren, die nicht gelernt wurden
+    held_out = makeSyntheticCorpus(args.categories, args.classify_documents, args.words, seed=1)
+    held_out_texts = [text for category_texts in held_out.values() for text in category_texts]
+
+    for algorithm in args.algorithms:
+        model_fn = os.path.join(directory, "%s.model" % algorithm)
+        params["algorithm"] = algorithm
+
+        # der Bericht der Parametersuche geht nach stdout
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            seconds, _ = timeIt(lambda: main_module.learnFromUrls(model_fn, per_subject_urls, params, fetch_params), args.repeat)
+        results["learn_%s" % algorithm] = {"seconds": seconds, "documents": len(texts)}
+
+        model = main_module.loadLearningDataFromFile(model_fn)
+        durations = []
+        correct = 0
+        top1_correct = 0
+        for subject, category_texts in held_out.items():
+            for text in category_texts:
+                start = time.perf_counter()
+                freq = textverarbeitung.makeWordFrequencyDictionary(text, model.tokenizer)
+                scores = textverarbeitung.compareWordFreqDictToLearningData(freq, model, params)
+                durations.append(time.perf_counter() - start)
+                correct += textverarbeitung.getWinningSubject(scores, params) == subject
+                # SelfmadeNaive erreicht other_cutoff kaum, die beste Kategorie zeigt trotzdem Verschlechterungen
+                top1_correct += max(scores, key=scores.get) == subject
+        results["classify_%s" % algorithm] = dict(percentiles(durations), documents=len(held_out_texts),
+                                                  accuracy=correct / len(held_out_texts),
+                                                  top1_accuracy=top1_correct / len(held_out_texts))
+
+    return results
+
+
+def compareWithBaseline(report, baseline, tolerance):
+    if baseline["corpus"] != report["corpus"]:
+        print("warning: the baseline was measured on a different corpus: %s" % json.dumps(baseline["corpus"]))
+
+    print()
+    print("%-28s %12s %12s %8s" % ("compared to baseline", "now [ms]", "then [ms]", "ratio"))
+    regressions = []
+    for stage, values in report["results"].items():
+        for metric in COMPARED_METRICS:
+            then = baseline["results"].get(stage, {}).get(metric)
+            if metric not in values or not then:
+                continue
+            ratio = values[metric] / then
+            slower = ratio > 1.0 + tolerance
+            if slower:
+                regressions.append("%s %s" % (stage, metric))
+            print("%-28s %12.2f %12.2f %8.2f%s" % ("%s %s" % (stage, metric), values[metric] * 1000, then * 1000,
+                                                  ratio, "  SLOWER" if slower else ""))
+
+    # der Korpus ist bei gleichen Einstellungen immer derselbe, jede Abweichung zählt
+    for stage, values in report["results"].items():
+        then = baseline["results"].get(stage, {}).get("top1_accuracy")
+        if "top1_accuracy" in values and then is not None and values["top1_accuracy"] < then:
+            regressions.append("%s top1_accuracy" % stage)
+            print("%-28s %12.3f %12.3f  LOWER" % ("%s top1_accuracy" % stage, values["top1_accuracy"], then))
+    return regressions
+
+
+def printResults(results):
+    print("%-28s %12s   %s" % ("stage", "time [ms]", "details"))
+    for stage, values in results.items():
+        for metric in COMPARED_METRICS:
+            if metric in values:
+                details = ", ".join("%s=%s" % (key, round(value, 3) if isinstance(value, float) else value)
+                                    for key, value in values.items() if key not in COMPARED_METRICS)
+                print("%-28s %12.2f   %s" % ("%s %s" % (stage, metric), values[metric] * 1000, details))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark suite for the whole processing chain')
+    parser.add_argument('--categories', type=int, default=3, help='number of categories of the synthetic corpus')
+    parser.add_argument('--documents', type=int, default=50, help='documents per category for learning')
+    parser.add_argument('--classify-documents', type=int, default=50, help='documents per category for classify')
+    parser.add_argument('--words', type=int, default=400, help='words per document')
+    parser.add_argument('--algorithms', default=",".join(ALGORITHMS),
+                        help='comma separated algorithms for learn and classify (default: all)')
+    # "fast" braucht keine heruntergeladenen NLTK-Daten außer den Stoppwörtern
+    parser.add_argument('--tokenizer', default="fast", choices=textverarbeitung.TOKENIZERS, help='tokenizer backend')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage, the fastest counts')
+    parser.add_argument('--save', metavar='FILE', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with the results of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='report stages that are slower than the baseline by more than this fraction')
+    args = parser.parse_args()
+
+    args.algorithms = [algorithm.strip() for algorithm in args.algorithms.split(",") if algorithm.strip()]
+    unknown = set(args.algorithms) - set(ALGORITHMS)
+    if unknown:
+        parser.error("unknown algorithms %s" % ", ".join(sorted(unknown)))
+
+    # Meldungen der Bibliotheken beim Lernen würden die Ausgabe überdecken
+    log.getLogger().setLevel(log.ERROR)
+    warnings.simplefilter("ignore")
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            results = runSuite(args, directory)
+        finally:
+            textimport.TEXT_CACHE.close()
+
+    report = {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {"categories": args.categories, "documents": args.documents,
+                   "classify_documents": args.classify_documents, "words": args.words, "tokenizer": args.tokenizer},
+        "results": results,
+    }
+
+    printResults(results)
+    if args.save:
+        with open(args.save, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compareWithBaseline(report, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("worse than the baseline: %s" % ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Benchmark: Durchsatz (Tokens pro Sekunde) der Tokenizer-Varianten von getFilteredTokens
+#
+# Aufruf aus dem Wurzelverzeichnis des Projekts:
+#   python3 benchmarks/bench_tokenizer.py [--repeat N] [text files ...]
+
+import argparse
+import os
+import sys
+import time
+
+from collections import Counter
+
+# Modulsuchpfad erweitern
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from textverarbeitung import getFilteredTokens, TOKENIZERS
+
+DEFAULT_TEXT = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "test_tokenizer.txt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for the tokenizer backends')
+    parser.add_argument('--repeat', type=int, default=200, help='concatenate the input text N times')
+    parser.add_argument('files', nargs='*', default=[DEFAULT_TEXT], help='text files to tokenize')
+    args = parser.parse_args()
+
+    texts = []
+    for fn in args.files:
+        with open(fn) as file_handle:
+            texts.append(file_handle.read())
+    text = "\n".join(texts * args.repeat)
+
+    results = {}
+    print("%8s %12s %10s %14s" % ("backend", "tokens", "time [s]", "tokens/s"))
+    for tokenizer in TOKENIZERS:
+        start = time.perf_counter()
+        words, number_of_tokens = getFilteredTokens(text, tokenizer)
+        duration = time.perf_counter() - start
+
+        results[tokenizer] = Counter(words)
+        print("%8s %12i %10.3f %14.0f" % (tokenizer, number_of_tokens, duration, number_of_tokens / duration))
+
+    if results["fast"] != results["nltk"]:
+        print("WARNING: the backends yield different stems")
+
+
+if __name__ == '__main__':
+    main()
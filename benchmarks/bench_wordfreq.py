@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Benchmark: Laufzeit von wordListToFreqDict in Abhängigkeit der Anzahl an Tokens
+#
+# Aufruf aus dem Wurzelverzeichnis des Projekts:
+#   python3 benchmarks/bench_wordfreq.py [--max-tokens N] [--vocabulary-size V]
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+from fractions import Fraction
+
+from sortedcontainers import SortedDict
+
+# Modulsuchpfad erweitern
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from textverarbeitung import wordListToFreqDict
+
+
+# bisherige Implementierung (quadratisch in der Anzahl der Tokens), nur zum Vergleich
+def quadraticWordListToFreqDict(wordlist, scale=1):
+    wordfreq = [ Fraction(wordlist.count(p), scale) for p in wordlist]
+    return SortedDict(zip(wordlist, wordfreq))
+
+
+def makeWordList(n_tokens, vocabulary_size):
+    rnd = random.Random(n_tokens)
+    vocabulary = ["word%i" % i for i in range(vocabulary_size)]
+    # Zipf-ähnliche Verteilung wie bei natürlicher Sprache
+    weights = [1.0 / (rank + 1) for rank in range(vocabulary_size)]
+    return rnd.choices(vocabulary, weights=weights, k=n_tokens)
+
+
+def timeIt(function, wordlist, repeat=3):
+    return min(timeit.repeat(lambda: function(wordlist, len(wordlist)), number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for wordListToFreqDict')
+    parser.add_argument('--max-tokens', type=int, default=64000, help='largest number of tokens to test')
+    parser.add_argument('--quadratic-max-tokens', type=int, default=8000,
+                        help='largest number of tokens for the old implementation')
+    parser.add_argument('--vocabulary-size', type=int, default=5000, help='number of distinct words')
+    args = parser.parse_args()
+
+    print("%10s %14s %14s %12s" % ("tokens", "linear [ms]", "old [ms]", "ns/token"))
+
+    n_tokens = 1000
+    while n_tokens <= args.max_tokens:
+        wordlist = makeWordList(n_tokens, args.vocabulary_size)
+
+        linear = timeIt(wordListToFreqDict, wordlist)
+        if n_tokens <= args.quadratic_max_tokens:
+            quadratic = "%14.2f" % (timeIt(quadraticWordListToFreqDict, wordlist, repeat=1) * 1000)
+
+            # beide Varianten müssen dieselben normierten Häufigkeiten liefern
+            expected = quadraticWordListToFreqDict(wordlist, len(wordlist))
+            result = wordListToFreqDict(wordlist, len(wordlist))
+            assert set(expected) == set(result)
+            assert all(abs(float(expected[w]) - result[w]) < 1e-12 for w in expected)
+        else:
+            quadratic = "%14s" % "-"
+
+        print("%10i %14.2f %s %12.1f" % (n_tokens, linear * 1000, quadratic, linear * 1e9 / n_tokens))
+        n_tokens *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 
-import logging as log
 import numpy
-import pprint
+import scipy.sparse
 
 from numpy import array, zeros
 from sklearn.base import BaseEstimator
-from sortedcontainers import SortedSet, SortedDict
+from sortedcontainers import SortedSet
 
 class DummyScaler:
     def fit_transform(self, X):
@@ -17,36 +16,57 @@ class DummyScaler:
 
 class SelfmadeNaive(BaseEstimator):
     def __init__(self):
-        self.per_category_base = SortedDict({})
         self.categories = SortedSet()
+        # Zeile i markiert die Wörter der Basis, die in Kategorie i vorkommen
+        self.category_mask = zeros((0, 0))
 
     def fit(self, X, tags):
-        for x, category in zip(X, tags):
-            self.per_category_base[category] = x + self.per_category_base.get(category, zeros(len(x)))
-            self.categories.add(category)
+        self.categories = SortedSet(tags)
+        self.category_mask = (self._sumPerCategory(X, tags) > 0).astype(numpy.float64)
+        return self
+
+    # Zuordnung Dokument -> Kategorie als Matrix, damit die Summe der Vektoren
+    # je Kategorie ein einziges Matrixprodukt wird
+    def _sumPerCategory(self, X, tags):
+        tags = array(tags)
+        rows = numpy.searchsorted(array(self.categories), tags)
+        membership = scipy.sparse.csr_matrix(
+            (numpy.ones(len(tags)), (rows, numpy.arange(len(tags)))), shape=(len(self.categories), len(tags)))
+
+        per_category_sum = membership @ X
+        if scipy.sparse.issparse(per_category_sum):
+            per_category_sum = per_category_sum.toarray()
+        return numpy.asarray(per_category_sum)
+
+    # weitere Dokumente bekannter Kategorien hinzunehmen, ohne neu zu lernen
+    def partial_fit(self, X, tags, classes=None):
+        if len(self.categories) == 0:
+            return self.fit(X, tags)
+
+        unknown = set(tags) - set(self.categories)
+        if len(unknown) > 0:
+            raise ValueError("unknown categories %s, use fit instead" % ", ".join(sorted(unknown)))
+
+        self.category_mask = numpy.maximum(self.category_mask, self._sumPerCategory(X, tags) > 0)
+        return self
+
+    @property
+    def classes_(self):
+        return array(self.categories)
 
     def score(self, Xs, tags):
-        result = [prediction == tag for prediction, tag in zip(self.predict(Xs), tags)]
-        correct_ones = sum(result)
-        return correct_ones / len(result)
+        return numpy.mean(array(self.predict(Xs)) == array(tags))
 
+    # summiert je Kategorie die Komponenten von x, die zur Basis der Kategorie gehören
     def predict_proba(self, Xs):
-        probas = []
-        for X in Xs:
-            log.warning("Predicted probabilities input: %s" % pprint.pformat(X))
-            result = []
-            for category, category_vec in self.per_category_base.items():
-                # summiere die Kompenenten von x, die zur Basis der Kategorie gehören
-                score = numpy.sum( (category_vec > 0) * X)
-
-                log.debug("How it compares to %s: %f" % (category, score))
-
-                #score = N_WORDS_TOT * sum_of_probabilities / FIRST_N_WORDS
-                result.append(score)
-            probas.append(array(result))
-        log.warning("Predicted probabilities: %s" % pprint.pformat(probas))
-        return probas
+        if "category_mask" not in self.__dict__:
+            self._maskFromCategoryBase()
+        return numpy.asarray(Xs @ self.category_mask.T)
 
     def predict(self, Xs):
-        return [self.categories[numpy.argmax(scores)] for scores in self.predict_proba(Xs)]
+        return list(self.classes_[numpy.argmax(self.predict_proba(Xs), axis=1)])
 
+    # Modelle aus älteren Versionen haben statt der Maske die summierten Vektoren je Kategorie
+    def _maskFromCategoryBase(self):
+        self.category_mask = array([category_vec > 0 for category_vec in self.per_category_base.values()],
+                                   dtype=numpy.float64)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Auswertung der Schwellwerte von getWinningSubject für viele Einstellungen auf einmal
+#
+# Die Bewertungen (Dokumente x Kategorien) werden nur einmal berechnet. Ob ein
+# Dokument bei min_diff d und other_cutoff c einer Kategorie zugeordnet wird,
+# hängt nur von der höchsten und der zweithöchsten Bewertung ab:
+#   höchste >= c                      sonst "other"
+#   zweithöchste / höchste < 1 - d    sonst mehrere Gewinner, also "other"
+# Damit lässt sich das ganze Gitter (d, c) mit numpy auf einmal auswerten.
+
+import numpy
+
+# Standard-Gitter für main.py test --sweep
+MIN_DIFF_GRID = "0:0.5:0.05"
+OTHER_CUTOFF_GRID = "0:0.95:0.05"
+
+
+# "start:stop:step" (stop eingeschlossen) oder eine Liste "0.1,0.2,0.5"
+def parseGrid(text):
+    if ":" in text:
+        start, stop, step = [float(part) for part in text.split(":")]
+        if step <= 0:
+            raise ValueError("step must be positive: %s" % text)
+        values = numpy.arange(start, stop + step / 2, step)
+    else:
+        values = numpy.array([float(part) for part in text.split(",")])
+
+    values = numpy.unique(numpy.round(values, 10))
+    if len(values) == 0 or values.min() < 0:
+        raise ValueError("thresholds must be non-negative: %s" % text)
+    return values
+
+
+# Zuordnung wie getWinningSubject für alle Dokumente und Einstellungen: liefert die
+# Spalte der besten Kategorie je Dokument und eine Maske (min_diffs x other_cutoffs x
+# Dokumente), welche Dokumente bei welcher Einstellung zugeordnet werden
+def classifyForThresholds(scores, min_diffs, other_cutoffs):
+    scores = numpy.asarray(scores, dtype=numpy.float64)
+    n_documents, n_subjects = scores.shape
+
+    top = numpy.argmax(scores, axis=1)
+    best = scores[numpy.arange(n_documents), top]
+    if n_subjects > 1:
+        second = numpy.partition(scores, -2, axis=1)[:, -2]
+    else:
+        second = numpy.zeros(n_documents)
+
+    # bei höchster Bewertung 0 wird nie zugeordnet (Verhältnis nan)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        ratio = numpy.where(best > 0, second / best, numpy.nan)
+
+    unique = ratio[numpy.newaxis, :] < 1.0 - numpy.asarray(min_diffs)[:, numpy.newaxis]
+    confident = best[numpy.newaxis, :] >= numpy.asarray(other_cutoffs)[:, numpy.newaxis]
+    return top, unique[:, numpy.newaxis, :] & confident[numpy.newaxis, :, :]
+
+
+# Kennzahlen für jedes Paar (min_diff, other_cutoff); ein Dokument einer nicht
+# gelernten Kategorie ist richtig zugeordnet, wenn es "other" ergibt
+def sweepThresholds(scores, subjects, true_subjects, min_diffs, other_cutoffs):
+    min_diffs = numpy.asarray(min_diffs, dtype=numpy.float64)
+    other_cutoffs = numpy.asarray(other_cutoffs, dtype=numpy.float64)
+    column = {subject: i for i, subject in enumerate(subjects)}
+    truth = numpy.array([column.get(subject, -1) for subject in true_subjects], dtype=numpy.int64)
+
+    top, classified = classifyForThresholds(scores, min_diffs, other_cutoffs)
+    correct = numpy.where(classified, top == truth, truth == -1)
+
+    shape = (len(subjects), len(min_diffs), len(other_cutoffs))
+    precision, recall = numpy.zeros(shape), numpy.zeros(shape)
+    for i in range(len(subjects)):
+        predicted = (classified & (top == i)).sum(axis=-1)
+        hits = (classified & (top == i) & (truth == i)).sum(axis=-1)
+        support = (truth == i).sum()
+        precision[i] = numpy.divide(hits, predicted, out=numpy.zeros(predicted.shape), where=predicted > 0)
+        recall[i] = hits / support if support > 0 else 0.0
+
+    return {
+        "subjects": list(subjects),
+        "documents": len(truth),
+        "min_diff": min_diffs,
+        "other_cutoff": other_cutoffs,
+        "accuracy": correct.mean(axis=-1),
+        "other_rate": 1.0 - classified.mean(axis=-1),
+        "precision": precision,
+        "recall": recall,
+    }
+
+
+# bestes Paar: höchste Genauigkeit, bei Gleichstand der kleinste Anteil "other"
+def bestThresholds(sweep):
+    order = numpy.lexsort((sweep["other_rate"].ravel(), -sweep["accuracy"].ravel()))
+    d, c = numpy.unravel_index(order[0], sweep["accuracy"].shape)
+    return d, c
+
+
+# Ergebnis als Liste von dicts (eine Zeile je Paar), z.B. für JSON
+def sweepRows(sweep):
+    rows = []
+    for d, min_diff in enumerate(sweep["min_diff"]):
+        for c, other_cutoff in enumerate(sweep["other_cutoff"]):
+            rows.append({
+                "min_diff": float(min_diff),
+                "other_cutoff": float(other_cutoff),
+                "accuracy": float(sweep["accuracy"][d, c]),
+                "other_rate": float(sweep["other_rate"][d, c]),
+                "precision": {subject: float(sweep["precision"][i, d, c]) for i, subject in enumerate(sweep["subjects"])},
+                "recall": {subject: float(sweep["recall"][i, d, c]) for i, subject in enumerate(sweep["subjects"])},
+            })
+    return rows
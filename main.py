@@ -1,39 +1,76 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 
+import json
 import pprint
 
 import textimport
 import textverarbeitung
+import textcache
+import profiling
+import modelfile
+import search
+import streaming
+import evaluation
 import pickle
 
 import logging as log
 import argparse
+import os
 import sys
-
-from numpy import array
+import tempfile
 
 from sortedcontainers import SortedSet, SortedDict
+from collections import deque
 
-from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.model_selection import GridSearchCV
-from sklearn.metrics import classification_report
-from sklearn.svm import SVC
-from sklearn.naive_bayes import MultinomialNB
+# sklearn wird nur zum Lernen gebraucht und erst dort importiert, beim
+# Laden der Lerndaten holt pickle die benötigten Module selbst
 
-from classification import DummyScaler, SelfmadeNaive
+DEFAULT_LEARNING_DATA = "learningdata.model"
+# bisheriges, gepickeltes Format
+LEGACY_LEARNING_DATA = "learningdata.obj"
 
 class LearningData:
     def __init__(self):
         self.base = SortedSet()
         self.category_words = SortedDict()
+        self.hashing = None
         self.data = []
         self.target = []
 
 
         
+def addFetchArguments(parser):
+    fetch_params = textimport.get_fetch_std_param()
+
+    parser.add_argument('--fetch-workers', type=int, default=fetch_params['fetch_workers'],
+                        help='number of URLs to download in parallel')
+    parser.add_argument('--fetch-per-host', type=int, default=fetch_params['fetch_per_host'],
+                        help='max. number of parallel downloads from the same host')
+    parser.add_argument('--fetch-timeout', type=float, default=fetch_params['fetch_timeout'],
+                        help='timeout in seconds for a single download')
+    parser.add_argument('--fetch-retries', type=int, default=fetch_params['fetch_retries'],
+                        help='number of retries after a failed download')
+    parser.add_argument('--refresh', default=False, action='store_true',
+                        help='check cached URLs for changes (conditional requests), changed pages are downloaded again')
+
+
+def getFetchParams(args):
+    fetch_params = textimport.get_fetch_std_param()
+    fetch_params["fetch_workers"] = args.fetch_workers
+    fetch_params["fetch_per_host"] = args.fetch_per_host
+    fetch_params["fetch_timeout"] = args.fetch_timeout
+    fetch_params["fetch_retries"] = args.fetch_retries
+    fetch_params["fetch_refresh"] = args.refresh
+
+    return fetch_params
+
+
+def addJobsArgument(parser, classification_params):
+    parser.add_argument('--jobs', '-j', type=int, default=classification_params['jobs'],
+                        help='number of processes for tokenizing and stemming the texts')
+
+
 def processArguments():
     classification_params = textverarbeitung.getClassificationStdParam()
 
@@ -41,19 +78,63 @@ def processArguments():
     parser.add_argument('--verbose', '-v', action='store_true', help='verbose flag')
     parser.add_argument('--debug', '-d', action='store_true', help='debug flag')
     parser.add_argument('--logfile', help="Write to this file instead of console")
+    parser.add_argument('--text-cache', default=textcache.DEFAULT_FILENAME, help="Cache downloaded texts in this file")
+    parser.add_argument('--cache-max-size', type=float, help="Max. size of the text cache in MB")
+    parser.add_argument('--cache-max-age', type=float, help="Drop cached texts older than this many days")
+    parser.add_argument('--no-cache-compression', default=False, action='store_true',
+                        help="store new texts in the cache uncompressed")
+    parser.add_argument('--extractor', default=textimport.EXTRACTOR, choices=textimport.EXTRACTORS,
+                        help="how to get the text of a web page; texts already in the text cache are not extracted again")
+    parser.add_argument('--no-freq-cache', default=False, action='store_true',
+                        help="do not cache the word frequencies of processed texts")
+    parser.add_argument('--no-fold-cache', default=False, action='store_true',
+                        help="do not cache the results of the parameter search")
+    parser.add_argument('--profile', metavar='FILE', help="write timings of the processing stages as JSON to this file")
+    parser.add_argument('--stem-cache-size', type=int, default=textverarbeitung.STEM_CACHE.maxsize,
+                        help="number of word stems to keep in memory")
 
     subparsers = parser.add_subparsers(dest="action")
 
     parser_learn = subparsers.add_parser('learn', help='learn from the given data')
-    parser_learn.add_argument('--algorithm', default="svm", choices=["svm", "knn", "bayes", "naive"], help='classification algorithm')
+    parser_learn.add_argument('--algorithm', default="svm", choices=["svm", "knn", "bayes", "naive", "sgd"], help='classification algorithm')
     parser_learn.add_argument('--category-base-length', type=int,
                              default=classification_params['category_base_length'],
                              help='Use the first N most frequent words of the category\'s word list to be part of the global base.')
+    parser_learn.add_argument('--feature-selection', default=classification_params['feature_selection'],
+                              choices=textverarbeitung.FEATURE_SELECTIONS,
+                              help='how to choose the base words of each category: most frequent words (default) or by chi2 or mutual information')
     parser_learn.add_argument('--keep-shared-words', default=False, action='store_true',
                               help='keep words, which occur in every word list (default: remove)')
-    parser_learn.add_argument('--learning-data', '-l', help='Write learning data to this file')
+    parser_learn.add_argument('--tokenizer', default=classification_params['tokenizer'], choices=textverarbeitung.TOKENIZERS,
+                              help='tokenizer backend; "fast" is a compiled single-pass replacement for NLTK (test and classify use the one stored in the learning data)')
+    parser_learn.add_argument('--search-jobs', type=int, default=classification_params['search_jobs'],
+                              help='number of processes for the parameter search (default: -1, all cores)')
+    parser_learn.add_argument('--halving', default=False, action='store_true',
+                              help='successive halving instead of the full parameter grid (for large grids like svm)')
+    parser_learn.add_argument('--streaming', default=False, action='store_true',
+                              help='two passes over the data with bounded memory, the vectors are kept in files next to the model')
+    parser_learn.add_argument('--hashing', default=False, action='store_true',
+                              help='hash the words into a fixed number of columns instead of building a base (not with naive)')
+    parser_learn.add_argument('--hash-bits', type=int, default=classification_params['hash_bits'],
+                              help='with --hashing: use 2**N columns (default: %(default)s)')
+    parser_learn.add_argument('--signed-hash', default=False, action='store_true',
+                              help='with --hashing: take the sign of each feature from its hash, so collisions cancel out (not with bayes)')
+    parser_learn.add_argument('--learning-data', '-l', help='Write the model to this directory (default: learningdata.model)')
+    addFetchArguments(parser_learn)
+    addJobsArgument(parser_learn, classification_params)
     parser_learn.add_argument('data', nargs='+', help=
-        'Data to process. The program expects a path to a file with tagged urls for learning.')
+        'Data to process. The program expects a path to a file with tagged urls for learning, or local corpora: '
+        'directories with one folder per category, .jsonl files with "subject" and "text", or tar/zip archives.')
+
+
+    parser_update = subparsers.add_parser('update', help='add new tagged data to existing learning data')
+    parser_update.add_argument('--learning-data', '-l', help='Update the model in this directory (default: learningdata.model)')
+    parser_update.add_argument('--retrain-threshold', type=float, default=classification_params['retrain_threshold'],
+                               help='learn from scratch, if this fraction of the base words changes (default: %(default)s)')
+    addFetchArguments(parser_update)
+    addJobsArgument(parser_update, classification_params)
+    parser_update.add_argument('data', nargs='+', help=
+        'File(s) with tagged urls like in the learning mode; urls already in the learning data are skipped.')
 
 
     parser_test = subparsers.add_parser('test', help='test classification according to tagged data')
@@ -61,7 +142,17 @@ def processArguments():
                              help='min_difference_for_classification')
     parser_test.add_argument('--other-cutoff', type=float, default=classification_params['other_cutoff'],
                              help='probability threshold to classify text as "other')
-    parser_test.add_argument('--learning-data', '-l', help='Read learning data from this file')
+    parser_test.add_argument('--sweep', default=False, action='store_true',
+                             help='score the documents once and evaluate every pair of the threshold grids below '
+                                  '(instead of --min-diff and --other-cutoff)')
+    parser_test.add_argument('--sweep-min-diff', type=evaluation.parseGrid, default=evaluation.MIN_DIFF_GRID, metavar='GRID',
+                             help='min-diff values for --sweep, "start:stop:step" or "a,b,c" (default: %(default)s)')
+    parser_test.add_argument('--sweep-other-cutoff', type=evaluation.parseGrid, default=evaluation.OTHER_CUTOFF_GRID, metavar='GRID',
+                             help='other-cutoff values for --sweep (default: %(default)s)')
+    parser_test.add_argument('--sweep-output', metavar='FILE', help='with --sweep: also write all results as JSON to this file')
+    parser_test.add_argument('--learning-data', '-l', help='Read the model (or old pickled learning data) from this path')
+    addFetchArguments(parser_test)
+    addJobsArgument(parser_test, classification_params)
     parser_test.add_argument('data', nargs='+', help=
         'Data to process. A file like in the learning mode is used. instead of learning the catecories, it''s checked, if the links in the file are classified correctly.')
 
@@ -70,10 +161,31 @@ def processArguments():
                              help='min_difference_for_classification')
     parser_test.add_argument('--other-cutoff', type=float, default=classification_params['other_cutoff'],
                              help='probability threshold to classify text as "other')
-    parser_test.add_argument('--learning-data', '-l', help='Read learning data from this file')
+    parser_test.add_argument('--learning-data', '-l', help='Read the model (or old pickled learning data) from this path')
+    addFetchArguments(parser_test)
+    addJobsArgument(parser_test, classification_params)
+    parser_test.add_argument('--server', metavar='ADDRESS',
+                             help='send the data to a running "serve" process (host:port or socket path) instead of loading the learning data')
     parser_test.add_argument('data', nargs='+', help=
     'Data to process. A file containing the text to classify  or an URL is expected')
 
+    parser_serve = subparsers.add_parser('serve', help='keep the learning data loaded and classify requests over HTTP')
+    parser_serve.add_argument('--min-diff', type=float, default=classification_params['min_difference_for_classification'],
+                              help='min_difference_for_classification')
+    parser_serve.add_argument('--other-cutoff', type=float, default=classification_params['other_cutoff'],
+                              help='probability threshold to classify text as "other')
+    parser_serve.add_argument('--learning-data', '-l', help='Read the model from this path, reloaded when it changes')
+    parser_serve.add_argument('--listen', default="127.0.0.1:8765", metavar='ADDRESS',
+                              help='host:port or path of a Unix socket to listen on')
+    parser_serve.add_argument('--batch-wait', type=float, default=10.0,
+                              help='milliseconds to wait for more documents to classify them together')
+    parser_serve.add_argument('--max-batch-size', type=int, default=256,
+                              help='max. number of documents classified together')
+
+    parser_convert = subparsers.add_parser('convert', help='convert pickled learning data (learningdata.obj) to a model directory')
+    parser_convert.add_argument('source', help='pickled learning data')
+    parser_convert.add_argument('target', nargs='?', help='model directory to write (default: source with .model extension)')
+
     args = parser.parse_args()
 
     if args.action == None:
@@ -84,25 +196,68 @@ def processArguments():
 
 ################################################################################
 # Text von Webseite herunterladen, verarbeiten
-def processTaggedUrlsWith(learning_data, merge_operation):
+def processTaggedUrlsWith(learning_data, merge_operation, fetch_params=None, tokenizer="nltk", jobs=1):
     per_subject_word_freq = SortedDict()
 
-    for subject in learning_data:
-        for url in learning_data[subject]:
-            log.info("Processing %s" % url)
-            RAW_TEXT = textimport.load_text(url)
+    for subject, url, freq in iterateTaggedDocuments(learning_data, fetch_params, tokenizer, jobs):
+        per_subject_word_freq[subject] = merge_operation(
+            per_subject_word_freq.get(subject, SortedDict()), url, freq )
+
+    return per_subject_word_freq
 
-            if len(RAW_TEXT) > 0:
-                freq = textverarbeitung.makeWordFrequencyDictionary(RAW_TEXT)
-                log.debug("Word list: %s" % pprint.pformat(freq))
 
-                per_subject_word_freq[subject] = merge_operation(
-                    per_subject_word_freq.get(subject, SortedDict()), url, freq )
-            else:
-                log.warning("ERROR: No text from %s" % url)
+# liefert (Kategorie, URL, Worthäufigkeiten) für jedes Dokument mit Text, eines nach dem anderen;
+# learning_data ist ein SortedDict Kategorie -> URLs oder ein textimport.LocalCorpus
+def iterateTaggedDocuments(learning_data, fetch_params=None, tokenizer="nltk", jobs=1):
+    if isinstance(learning_data, textimport.LocalCorpus):
+        # lokale Korpora werden direkt gelesen, ohne TEXT_CACHE
+        tagged_texts = iter(learning_data)
+    else:
+        tagged_texts = loadTaggedUrls(learning_data, fetch_params)
+
+    # die Worthäufigkeiten kommen in der Reihenfolge der Texte zurück, die
+    # Verarbeitung liest aber einige Texte voraus
+    pending = deque()
+
+    def loadTexts():
+        for subject, url, text in tagged_texts:
+            log.info("Processing %s" % url)
+            pending.append((subject, url, len(text) == 0))
+            yield text
+
+    for freq in textverarbeitung.makeWordFrequencyDictionaries(loadTexts(), tokenizer, jobs):
+        subject, url, empty = pending.popleft()
+        if empty:
+            log.warning("ERROR: No text from %s" % url)
+        else:
+            log.debug("Word list: %s", profiling.PrettyFormat(freq))
+            yield subject, url, freq
 
     textimport.write_textcache()
-    return per_subject_word_freq
+    logCacheStatistics()
+
+
+# (Kategorie, URL, Text) der getaggten URLs, die sich laden lassen
+def loadTaggedUrls(per_subject_urls, fetch_params=None):
+    documents = [(subject, url) for subject in per_subject_urls for url in per_subject_urls[subject]]
+
+    # alle URLs vorab parallel herunterladen, danach kommen die Texte aus dem TEXT_CACHE
+    failed_urls = textimport.prefetch_urls([url for subject, url in documents], fetch_params)
+    for url, reason in failed_urls.items():
+        log.warning("ERROR: No text from %s (%s)" % (url, reason))
+
+    for subject, url in documents:
+        if url not in failed_urls:
+            yield subject, url, textimport.load_text(url)
+
+
+# Eingabe von learn und test: Dateien mit getaggten URLs oder lokale Korpora
+def readTaggedInput(files):
+    try:
+        return textimport.get_tagged_input(files)
+    except ValueError as e:
+        log.error(str(e))
+        sys.exit(1)
 
 
 def mergeWordFreqs(current_value, url, word_freq):
@@ -115,13 +270,62 @@ def addWordFreqPerUrl(current_value, url, word_freq):
 
 
 def writeLearningDataToFile(learning_data, filename):
-    learning_data_file = open(filename, mode="wb")
-    pickle.dump(learning_data, learning_data_file)
+    # erst vollständig schreiben, dann ersetzen: ein laufender "serve" liest nie ein halbes Modell
+    modelfile.writeModel(learning_data, filename)
 
 
 def loadLearningDataFromFile(filename):
-    learning_data_file = open(filename, mode="rb")
-    return pickle.load(learning_data_file)
+    if modelfile.isModel(filename):
+        learning_data = modelfile.loadModel(filename)
+    else:
+        # altes Format: gepickelte LearningData
+        with open(filename, mode="rb") as learning_data_file:
+            learning_data = pickle.load(learning_data_file)
+        log.warning("%s uses the old pickled format, convert it with: main.py convert %s" % (filename, filename))
+
+    # mit den gespeicherten Wortstämmen startet der Stem-Cache vorgewärmt
+    textverarbeitung.STEM_CACHE.preload(getattr(learning_data, "stem_table", {}))
+    return learning_data
+
+
+# gepickelte LearningData in ein Modell-Verzeichnis umwandeln
+def doConversion(source_fn, target_fn):
+    with open(source_fn, mode="rb") as learning_data_file:
+        learning_data = pickle.load(learning_data_file)
+
+    writeLearningDataToFile(learning_data, target_fn)
+    log.warning("Converted %s to %s" % (source_fn, target_fn))
+
+
+def setupTextCache(args):
+    textimport.set_extractor(args.extractor)
+    textimport.configure_textcache(
+        args.text_cache,
+        compress=not args.no_cache_compression,
+        max_size=args.cache_max_size * 1024 * 1024 if args.cache_max_size is not None else None,
+        max_age=args.cache_max_age * 24 * 3600 if args.cache_max_age is not None else None)
+
+    if not args.no_freq_cache:
+        textverarbeitung.FREQUENCY_CACHE = textcache.FrequencyCache(
+            args.text_cache,
+            max_age=args.cache_max_age * 24 * 3600 if args.cache_max_age is not None else None)
+
+    if not args.no_fold_cache:
+        search.FOLD_CACHE = textcache.FoldCache(
+            args.text_cache,
+            max_age=args.cache_max_age * 24 * 3600 if args.cache_max_age is not None else None)
+
+    textverarbeitung.STEM_CACHE.resize(args.stem_cache_size)
+
+
+def logCacheStatistics():
+    cache = textverarbeitung.FREQUENCY_CACHE
+    if cache is not None:
+        log.info("Word frequency cache: %i hits, %i misses" % (cache.hits, cache.misses))
+        cache.evict()
+
+    log.info("Stem cache: %(hits)i hits, %(misses)i misses, %(size)i entries, hit rate %(hit_rate).3f"
+             % textverarbeitung.STEM_CACHE.getStatistics())
 
 
 def setupLogging(args):
@@ -140,64 +344,175 @@ def setupLogging(args):
 
 
 # Vorgehensweise im Lernmodus
-def doLearning(wordlist_fn, learning_data_files, classification_params):
-
-    per_subject_urls = textimport.get_urls_per_subject_from_file(learning_data_files)
-    per_subject_url_and_word_freq = processTaggedUrlsWith(per_subject_urls, addWordFreqPerUrl)
-    per_subject_word_freq = SortedDict()
-
-    # Erstellen eines wordfreq dictionary, alle Wortlisten werden dabei im Speicher belassen
-    for subject, url_and_word_freq_dist in per_subject_url_and_word_freq.items():
-        for url, wordfreq_dist in url_and_word_freq_dist.items():
-            per_subject_word_freq[subject] = mergeWordFreqs(per_subject_word_freq.get(subject, SortedDict()), "", wordfreq_dist)
-
-
-    # Erstellen der Basis
-    classification_base = textverarbeitung.buildClassificationSpaceBase(per_subject_word_freq, classification_params)
-
-    constructed_base_as_text_output = "\n\t".join(classification_base)
-    log.info("Constructed the following base of length %i:\n\t%s" % (len(classification_base), constructed_base_as_text_output))
+def doLearning(wordlist_fn, learning_data_files, classification_params, fetch_params=None):
+    per_subject_urls = readTaggedInput(learning_data_files)
+    learnFromUrls(wordlist_fn, per_subject_urls, classification_params, fetch_params)
+
+
+def learnFromUrls(wordlist_fn, per_subject_urls, classification_params, fetch_params=None):
+    if not classification_params["streaming"]:
+        learnFromTaggedDocuments(wordlist_fn, per_subject_urls, classification_params, fetch_params)
+        return
+
+    # --streaming: die Merkmalsmatrix liegt in Dateien neben dem Modell, das
+    # Verzeichnis wird auch bei Fehlern wieder gelöscht
+    with tempfile.TemporaryDirectory(prefix=".features-", dir=os.path.dirname(os.path.abspath(wordlist_fn))) as feature_directory:
+        learnFromTaggedDocuments(wordlist_fn, per_subject_urls, classification_params, fetch_params, feature_directory)
+
+
+# feature_directory: nur mit --streaming, dort wird die Merkmalsmatrix abgelegt
+def learnFromTaggedDocuments(wordlist_fn, per_subject_urls, classification_params, fetch_params=None, feature_directory=None):
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report
+    from sklearn.svm import SVC
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.linear_model import SGDClassifier
+
+    from classification import DummyScaler, SelfmadeNaive
+
+    tokenizer, jobs = classification_params["tokenizer"], classification_params["jobs"]
+    hashing = classification_params["hashing"]
+    if hashing and classification_params["algorithm"] == "naive":
+        log.error("The naive algorithm needs a base, it cannot be used with --hashing")
+        sys.exit(1)
+    if hashing and classification_params["signed_hash"] and classification_params["algorithm"] == "bayes":
+        log.error("Signed hashes give negative features, the bayes algorithm needs non-negative counts")
+        sys.exit(1)
+
+    if hashing:
+        # keine Basis: die Dokumente werden in einem einzigen Durchlauf direkt in
+        # Zeilen umgewandelt (siehe unten), dabei werden nur die URLs gesammelt
+        base_index = textverarbeitung.HashingIndex(classification_params["hash_bits"], classification_params["signed_hash"])
+        documents = SortedDict()
+        tagged_freqs = streaming.recordDocuments(
+            iterateTaggedDocuments(per_subject_urls, fetch_params, tokenizer, jobs), documents)
+        classification_base = SortedSet()
+        per_subject_word_freq = SortedDict()
+        category_words = SortedDict()
+        log.info("Hashing the words into %i columns" % len(base_index))
+    elif classification_params["streaming"]:
+        # erster Durchlauf: nur die Summen je Kategorie werden behalten
+        per_subject_word_freq, documents = streaming.sumPerSubject(
+            iterateTaggedDocuments(per_subject_urls, fetch_params, tokenizer, jobs))
+        vocabulary = textverarbeitung.VocabularyMatrix(per_subject_word_freq)
+    else:
+        # alle Dokumente bleiben bis zum Ende im Speicher, daher als kompakte Arrays
+        # mit einem gemeinsamen Vokabular statt als dict je Dokument
+        token_vocabulary = textverarbeitung.TokenVocabulary()
+
+        def addCompactDocumentPerUrl(current_value, url, word_freq):
+            current_value[url] = textverarbeitung.CompactDocument.fromWordFreqDict(word_freq, token_vocabulary)
+            return current_value
+
+        per_subject_url_and_document = processTaggedUrlsWith(
+            per_subject_urls, addCompactDocumentPerUrl, fetch_params, tokenizer, jobs)
+        log.info("%i documents with %i distinct words in %.1f MB" % (
+            sum(len(url_and_document) for url_and_document in per_subject_url_and_document.values()), len(token_vocabulary),
+            sum(document.nbytes() for url_and_document in per_subject_url_and_document.values()
+                for document in url_and_document.values()) / 1e6))
+
+        # Summen der Häufigkeiten je Kategorie direkt aus den Arrays
+        vocabulary = textverarbeitung.VocabularyMatrix.fromCompactDocuments(
+            SortedDict({subject: list(url_and_document.values())
+                        for subject, url_and_document in per_subject_url_and_document.items()}), token_vocabulary)
+        per_subject_word_freq = vocabulary.wordFreqDicts()
+        documents = SortedDict({subject: list(url_and_document.keys())
+                                for subject, url_and_document in per_subject_url_and_document.items()})
+
+    if not hashing:
+        # Erstellen der Basis
+        classification_base = textverarbeitung.buildClassificationSpaceBase(per_subject_word_freq, classification_params, vocabulary)
+
+        constructed_base_as_text_output = "\n\t".join(classification_base)
+        log.info("Constructed the following base of length %i:\n\t%s" % (len(classification_base), constructed_base_as_text_output))
+
+        base_index = textverarbeitung.getBaseIndex(classification_base)
+        category_words = vocabulary.categoryWords(classification_base)
 
     learning_data = LearningData()
     learning_data.base = classification_base
-    learning_data.category_words = SortedDict({subject: classification_base & set(word_freqs.keys()) for subject, word_freqs in per_subject_word_freq.items()})
-
-    log.debug("The categories have these words: %s" % pprint.pformat(learning_data.category_words))
-
+    learning_data.hashing = base_index.params() if hashing else None
+    learning_data.tokenizer = classification_params["tokenizer"]
+    learning_data.category_words = category_words
+
+    # für "update": summierte Häufigkeiten, gelernte URLs und Einstellungen werden mitgespeichert
+    learning_data.per_subject_word_freq = per_subject_word_freq
+    learning_data.documents = documents
+    learning_data.learning_params = {key: classification_params[key]
+                                     for key in ["algorithm", "category_base_length", "remove_shared_words", "feature_selection",
+                                                 "hashing", "hash_bits", "signed_hash"]}
+    # Dokumente aus lokalen Korpora lassen sich über ihre Kennung nicht wieder laden
+    learning_data.learning_params["corpus"] = isinstance(per_subject_urls, textimport.LocalCorpus)
+
+    log.debug("The categories have these words: %s", profiling.PrettyFormat(learning_data.category_words))
+
+
+    # Dünnbesetzte Matrizen lassen sich nicht zentrieren, MultinomialNB und
+    # SelfmadeNaive arbeiten direkt auf der CSR-Matrix, ebenso alle Verfahren
+    # auf den 2**hash_bits Spalten der Merkmale per Hash
+    learning_data.sparse = classification_params["algorithm"] in ["bayes", "naive"] or hashing
+
+    if classification_params["streaming"]:
+        # zweiter Durchlauf: Texte und Worthäufigkeiten kommen aus den Caches,
+        # die Vektoren landen paketweise in Dateien neben dem Modell
+        writer = streaming.FeatureMatrixWriter(feature_directory, len(base_index), learning_data.sparse)
+        if not hashing:
+            # ein lokaler Korpus wird einfach noch einmal gelesen
+            tagged_freqs = iterateTaggedDocuments(
+                per_subject_urls if isinstance(per_subject_urls, textimport.LocalCorpus) else documents,
+                fetch_params, tokenizer, jobs)
+        learning_data.target = streaming.writeFeatureRows(tagged_freqs, base_index, writer)
+        learning_data.data = writer.close()
+    elif hashing:
+        import scipy.sparse
+
+        batches = []
+        learning_data.target = streaming.writeFeatureRows(tagged_freqs, base_index, batches)
+        learning_data.data = scipy.sparse.vstack(batches, format="csr")
+    else:
+        # Konstruieren der Vektoren für jede URL auf der erstelllten Basis,
+        # alle Vektoren landen in einem Durchlauf in einer dünnbesetzten Matrix
+        compact_documents = []
+        for subject, url_and_document in per_subject_url_and_document.items():
+            for url, document in url_and_document.items():
+                compact_documents.append(document)
+                learning_data.target.append(subject)
 
-    # Konstruieren der Vektoren für jede URL auf der erstelllten Basis
-    for subject, url_and_word_freq_dist in per_subject_url_and_word_freq.items():
-        for url, wordfreq_dist in url_and_word_freq_dist.items():
-            p = textverarbeitung.getClassificationVectorSpaceElement(classification_base, wordfreq_dist)
-            learning_data.data.append(p)
-            learning_data.target.append(subject)
+        learning_data.data = textverarbeitung.getCompactClassificationMatrix(base_index, compact_documents, token_vocabulary)
+        if not learning_data.sparse:
+            learning_data.data = learning_data.data.toarray()
 
-            log.debug("Constructed vector %s" % pprint.pformat(p))
+    log.debug("Constructed %i vectors of length %i" % learning_data.data.shape)
 
 
     # Je nach verwendetem Algorithmus die Vektoren
     # normieren und den Mittelwert abziehen
-    if classification_params["algorithm"] == "bayes":
-        scaler = StandardScaler(with_mean=False)
-    elif classification_params["algorithm"] == "naive":
+    if classification_params["algorithm"] == "naive":
         scaler = DummyScaler()
+    elif learning_data.sparse:
+        scaler = StandardScaler(with_mean=False)
     else:
         scaler = StandardScaler()
 
-    learning_data.data = scaler.fit_transform(learning_data.data)
+    if classification_params["streaming"]:
+        learning_data.data = streaming.fitTransformInPlace(scaler, learning_data.data)
+    else:
+        learning_data.data = scaler.fit_transform(learning_data.data)
     learning_data.scaler = scaler
 
-    log.debug(pprint.pformat(scaler))
+    log.debug("%s", profiling.PrettyFormat(scaler))
 
     # Aufteilen des Datensatzes in zwei Teile (vgl. test_size)
     X_train, X_test, y_train, y_test = train_test_split(
-        array(learning_data.data), learning_data.target, test_size=0.2, random_state=0
+        learning_data.data, learning_data.target, test_size=0.2, random_state=0
     )
 
     log.debug("Data used for training:")
-    log.debug(pprint.pformat(list(zip(y_train, X_train))))
+    log.debug("%s", profiling.PrettyFormat(list(zip(y_train, X_train))))
     log.debug("Data used for testing:")
-    log.debug(pprint.pformat(list(zip(y_test, X_test))))
+    log.debug("%s", profiling.PrettyFormat(list(zip(y_test, X_test))))
 
 
     # Standard-Parameter für die verschiedenen Algorithmen
@@ -211,6 +526,11 @@ def doLearning(wordlist_fn, learning_data_files, classification_params):
         'C': [0.1, 1, 10, 100, 1000]
     })
 
+    sgd_tuned_parameters = SortedDict({
+        'alpha': [1e-5, 1e-4, 1e-3, 1e-2],
+        'penalty': ['l2', 'elasticnet']
+    })
+
     naive_bayes_multinominal_tuned_parameters = SortedDict({
         'alpha': [0.0, 0.5, 1.0, 2.0],
         'fit_prior': [True, False]
@@ -220,61 +540,172 @@ def doLearning(wordlist_fn, learning_data_files, classification_params):
 
 
 
-    #Ermittlung der Scores - Testen der am besten passenden nicht vom Nutzer einstellbaren Parameter
-    scores = ['precision', 'recall']
-
-    for score in scores:
-        print("# Tuning hyper-parameters for %s" % score)
-        print()
-
-        if classification_params["algorithm"] == "knn":
-            clf = GridSearchCV(KNeighborsClassifier(), knear_tuned_parameters, cv=5)
-        elif classification_params["algorithm"] == "svm":
-            clf = GridSearchCV(SVC(probability=True, tol=1e-5), svm_tuned_parameters, cv=5)
-        elif classification_params["algorithm"] == "bayes":
-            clf = GridSearchCV(MultinomialNB(), naive_bayes_multinominal_tuned_parameters, cv=5)
-        elif classification_params["algorithm"] == "naive":
-            # no parameter tuning needed
-            clf = GridSearchCV(SelfmadeNaive(), selfmade_naive_tuned_parameters, cv=5)
-        else:
-            log.error("Unsupported algorithm " % classification_params["algorithm"])
-            sys.exit(1)
-        clf.fit(X_train, y_train)
-
-        print("Best parameters set found on development set:")
-        print()
-        print(clf.best_params_)
-        print()
-        print("Grid scores on development set:")
+    #Ermittlung der Scores - Testen der am besten passenden nicht vom Nutzer einstellbaren Parameter,
+    # jede Kombination wird einmal gelernt und mit allen Metriken aus search.SCORING bewertet
+    if classification_params["algorithm"] == "knn":
+        estimator, tuned_parameters = KNeighborsClassifier(), knear_tuned_parameters
+    elif classification_params["algorithm"] == "svm":
+        estimator, tuned_parameters = SVC(probability=True, tol=1e-5), svm_tuned_parameters
+    elif classification_params["algorithm"] == "sgd":
+        estimator, tuned_parameters = SGDClassifier(loss="log_loss", random_state=0), sgd_tuned_parameters
+    elif classification_params["algorithm"] == "bayes":
+        estimator, tuned_parameters = MultinomialNB(), naive_bayes_multinominal_tuned_parameters
+    elif classification_params["algorithm"] == "naive":
+        # no parameter tuning needed
+        estimator, tuned_parameters = SelfmadeNaive(), selfmade_naive_tuned_parameters
+    else:
+        log.error("Unsupported algorithm %s" % classification_params["algorithm"])
+        sys.exit(1)
+
+    search_function = search.halvingSearch if classification_params["halving"] else search.gridSearch
+    with profiling.span("grid_search"):
+        clf = search_function(estimator, tuned_parameters, X_train, y_train, cv=5,
+                              n_jobs=classification_params["search_jobs"], cache=search.FOLD_CACHE)
+    if search.FOLD_CACHE is not None:
+        search.FOLD_CACHE.evict()
+
+    print("# Tuning hyper-parameters for %s" % ", ".join(clf.scoring))
+    print()
+    print("Best parameters set found on development set (by %s):" % clf.refit)
+    print()
+    print(clf.best_params_)
+    print()
+    for score in clf.scoring:
+        print("Grid scores for %s on development set:" % score)
         print()
-        means = clf.cv_results_['mean_test_score']
-        stds = clf.cv_results_['std_test_score']
-        for mean, std, params in zip(means, stds, clf.cv_results_['params']):
-            print("%0.3f (+/-%0.03f) for %r"
-                  % (mean, std * 2, params))
+        means = clf.cv_results_['mean_test_%s' % score]
+        stds = clf.cv_results_['std_test_%s' % score]
+        for mean, std, params, n_resources in zip(means, stds, clf.cv_results_['params'], clf.cv_results_['n_resources']):
+            print("%0.3f (+/-%0.03f) for %r on %i documents"
+                  % (mean, std * 2, params, n_resources))
         print()
 
-        print("Detailed classification report:")
-        print()
-        print("The model is trained on the full development set.")
-        print("The scores are computed on the full evaluation set.")
-        print()
+    print("Detailed classification report:")
+    print()
+    print("The model is trained on the full development set.")
+    print("The scores are computed on the full evaluation set.")
+    print()
+    with profiling.span("predict"):
         y_true, y_pred = y_test, clf.predict(X_test)
-        print(classification_report(y_true, y_pred))
-        print()
-        learning_data.classifier = clf.best_estimator_
+    print(classification_report(y_true, y_pred))
+    print()
+    learning_data.classifier = clf.best_estimator_
 
+    learning_data.stem_table = textverarbeitung.STEM_CACHE.export(textverarbeitung.STEM_TABLE_SIZE)
+    writeLearningDataToFile(learning_data, wordlist_fn)
+
+
+# Vorgehensweise im Update-Modus: nur die neuen Dokumente werden verarbeitet und,
+# solange sich die Basis kaum ändert, per partial_fit zum Modell hinzugenommen
+def doUpdate(wordlist_fn, learning_data_files, classification_params, fetch_params=None):
+    model = loadLearningDataFromFile(wordlist_fn)
+
+    per_subject_word_freq = getattr(model, "per_subject_word_freq", None)
+    if per_subject_word_freq is None:
+        log.error("%s contains no word counts for updates, learn it again with 'main.py learn'" % wordlist_fn)
+        sys.exit(1)
+    documents = SortedDict({subject: list(urls) for subject, urls in model.documents.items()})
+    learning_params = dict(model.learning_params)
+    if learning_params.get("corpus", False):
+        log.error("%s was learned from a local corpus, learn it again with 'main.py learn'" % wordlist_fn)
+        sys.exit(1)
+    if any(textimport.is_corpus(fn) for fn in learning_data_files):
+        log.error("update reads files with tagged urls only, learn local corpora with 'main.py learn'")
+        sys.exit(1)
+    tokenizer = getattr(model, "tokenizer", "nltk")
+
+    known_urls = set(url for urls in documents.values() for url in urls)
+    new_urls = SortedDict()
+    for subject, urls in textimport.get_urls_per_subject_from_file(learning_data_files).items():
+        urls = SortedSet(url for url in urls if url not in known_urls)
+        if len(urls) > 0:
+            new_urls[subject] = urls
+
+    if len(new_urls) == 0:
+        log.warning("No new documents, %s is up to date" % wordlist_fn)
+        return
+
+    new_url_and_word_freq = processTaggedUrlsWith(
+        new_urls, addWordFreqPerUrl, fetch_params, tokenizer, classification_params["jobs"])
+
+    # mit Merkmalen per Hash gibt es keine Basis, die sich ändern könnte
+    hashing = learning_params.get("hashing", False)
+
+    word_freq_dists = []
+    target = []
+    for subject, url_and_word_freq_dist in new_url_and_word_freq.items():
+        for url, wordfreq_dist in url_and_word_freq_dist.items():
+            if not hashing:
+                per_subject_word_freq[subject] = mergeWordFreqs(per_subject_word_freq.get(subject, {}), url, wordfreq_dist)
+            word_freq_dists.append(wordfreq_dist)
+            target.append(subject)
+        documents.setdefault(subject, []).extend(url_and_word_freq_dist.keys())
+
+    if hashing:
+        base_change = 0.0
+    else:
+        # Basis mit den neuen Häufigkeiten bestimmen und mit der bisherigen vergleichen
+        old_base = set(str(word) for word in model.base)
+        new_base = textverarbeitung.buildClassificationSpaceBase(per_subject_word_freq, learning_params)
+        base_change = len(old_base ^ set(new_base)) / max(len(old_base), 1)
+        log.info("Base changed by %.1f %%" % (base_change * 100))
+
+    new_subjects = set(target) - set(textverarbeitung.getLearnedSubjects(model))
+    if len(new_subjects) > 0:
+        retrain_reason = "new categories %s" % ", ".join(sorted(new_subjects))
+    elif not hasattr(model.classifier, "partial_fit"):
+        retrain_reason = "%s cannot be updated incrementally" % type(model.classifier).__name__
+    elif base_change > classification_params["retrain_threshold"]:
+        retrain_reason = "the base changed by %.1f %%" % (base_change * 100)
+    else:
+        retrain_reason = None
+
+    if retrain_reason is not None:
+        # alle Texte und Worthäufigkeiten kommen dabei aus den Caches
+        log.warning("Learning from scratch: %s" % retrain_reason)
+        params = textverarbeitung.getClassificationStdParam()
+        params.update(learning_params)
+        params["tokenizer"] = tokenizer
+        params["jobs"] = classification_params["jobs"]
+        learnFromUrls(wordlist_fn, SortedDict({subject: SortedSet(urls) for subject, urls in documents.items()}),
+                      params, fetch_params)
+        return
+
+    # die neuen Dokumente auf der bisherigen Basis, mit dem bisherigen Scaler
+    X = textverarbeitung.getClassificationMatrix(textverarbeitung.getFeatureIndex(model), word_freq_dists)
+    if not getattr(model, "sparse", False):
+        X = X.toarray()
+    X = model.scaler.transform(X)
+
+    with profiling.span("partial_fit"):
+        model.classifier.partial_fit(X, target)
+    log.warning("Added %i documents to %s" % (len(target), wordlist_fn))
+
+    learning_data = LearningData()
+    learning_data.base = model.base
+    learning_data.hashing = getattr(model, "hashing", None)
+    learning_data.subjects = textverarbeitung.getLearnedSubjects(model)
+    learning_data.tokenizer = tokenizer
+    learning_data.sparse = getattr(model, "sparse", False)
+    learning_data.scaler = model.scaler
+    learning_data.classifier = model.classifier
+    learning_data.per_subject_word_freq = per_subject_word_freq
+    learning_data.documents = documents
+    learning_data.learning_params = learning_params
+    learning_data.stem_table = textverarbeitung.STEM_CACHE.export(textverarbeitung.STEM_TABLE_SIZE)
     writeLearningDataToFile(learning_data, wordlist_fn)
 
 
 # Vorgehensweise im  Testmodus
-def doTesting(wordlist_fn, testing_data_files, classification_params):
-    testing_data = textimport.get_urls_per_subject_from_file(testing_data_files)
-    per_subject_url_and_word_freq = processTaggedUrlsWith(testing_data, addWordFreqPerUrl)
+def doTesting(wordlist_fn, testing_data_files, classification_params, fetch_params=None, sweep_params=None):
+    testing_data = readTaggedInput(testing_data_files)
     learning_data = loadLearningDataFromFile(wordlist_fn)
+    per_subject_url_and_word_freq = processTaggedUrlsWith(
+        testing_data, addWordFreqPerUrl, fetch_params, getattr(learning_data, "tokenizer", "nltk"),
+        classification_params["jobs"])
 
     # Lerndaten werden aus dem Speicher geladen, und die vorhandenen Kategorien zum Klassifizieren benutzt
-    learning_data.all_learned_subjects = SortedSet(learning_data.target)
+    learning_data.all_learned_subjects = SortedSet(textverarbeitung.getLearnedSubjects(learning_data))
 
     log.info("Starting to classify to these categories %s" % ", ".join(learning_data.all_learned_subjects) )
     print(learning_data.base)
@@ -287,62 +718,145 @@ def doTesting(wordlist_fn, testing_data_files, classification_params):
     result_tab = ["&\t".join([x[:6] for x in learning_data.all_learned_subjects]) + "&\testim.&\tshould \\\\"]
 
 
-    for subject, url_and_wordfreq_dist in per_subject_url_and_word_freq.items():
-        for url, wordfreq_dist in url_and_wordfreq_dist.items():
-            all_counter = all_counter + 1
-            per_subject_score = textverarbeitung.compareWordFreqDictToLearningData(
-                wordfreq_dist, learning_data, classification_params)
-            classified_to = textverarbeitung.getWinningSubject(per_subject_score, classification_params)
+    documents = [(subject, url, wordfreq_dist)
+                 for subject, url_and_wordfreq_dist in per_subject_url_and_word_freq.items()
+                 for url, wordfreq_dist in url_and_wordfreq_dist.items()]
 
-            row = [("%.3f" % x) for x in per_subject_score.values()]
-            if classified_to == subject:
-                log.info("%s correctly classified to %s" % (url, classified_to))
-                row.append(classified_to[:6])
-                row.append(subject[:6])
+    # alle Dokumente in einem Schritt bewerten
+    scores, subjects = textverarbeitung.compareWordFreqDictsToLearningData(
+        [wordfreq_dist for subject, url, wordfreq_dist in documents], learning_data, classification_params)
+
+    if sweep_params is not None:
+        if len(documents) == 0:
+            log.error("No documents to test")
+            sys.exit(1)
+        reportThresholdSweep(scores, subjects, [subject for subject, url, wordfreq_dist in documents], sweep_params)
+        return
+
+    for (subject, url, wordfreq_dist), subject_scores in zip(documents, scores):
+        all_counter = all_counter + 1
+        per_subject_score = dict(zip(subjects, subject_scores))
+        classified_to = textverarbeitung.getWinningSubject(per_subject_score, classification_params)
+
+        row = [("%.3f" % x) for x in per_subject_score.values()]
+        if classified_to == subject:
+            log.info("%s correctly classified to %s" % (url, classified_to))
+            row.append(classified_to[:6])
+            row.append(subject[:6])
+            correct_counter = correct_counter + 1
+        elif classified_to is None:
+            row.append("other")
+            if subject not in learning_data.all_learned_subjects:
+                log.info("%s correctly classified to other" % url)
                 correct_counter = correct_counter + 1
-            elif classified_to is None:
                 row.append("other")
-                if subject not in learning_data.all_learned_subjects:
-                    log.info("%s correctly classified to other" % url)
-                    correct_counter = correct_counter + 1
-                    row.append("other")
-                else:
-                    log.warning("%s incorrectly classified to other, should be %s" % (url, subject))
-                    log.warning("Scores were: %s" % pprint.pformat(per_subject_score))
-                    row.append(subject[:6])
-            elif classified_to != subject:
-                log.warning("%s incorrectly classified to %s." % (url, classified_to))
+            else:
+                log.warning("%s incorrectly classified to other, should be %s" % (url, subject))
                 log.warning("Scores were: %s" % pprint.pformat(per_subject_score))
-                row.append(classified_to[:6])
-                row.append("other" if subject not in learning_data.all_learned_subjects else subject[:6])
+                row.append(subject[:6])
+        elif classified_to != subject:
+            log.warning("%s incorrectly classified to %s." % (url, classified_to))
+            log.warning("Scores were: %s" % pprint.pformat(per_subject_score))
+            row.append(classified_to[:6])
+            row.append("other" if subject not in learning_data.all_learned_subjects else subject[:6])
 
-            result_tab.append("&\t".join(row))
+        result_tab.append("&\t".join(row))
     log.info("Tabular result:\n" + " \\\\\n".join(result_tab) + " \\\\\n")
     log.info("Correct classified: %f %%" % (correct_counter*100.0 / all_counter))
 
 
-def doClassification(wordlist_fn, classification_data_paths, classification_params):
-    learning_data = loadLearningDataFromFile(wordlist_fn)
+# Genauigkeit, Anteil "other" sowie Precision/Recall je Kategorie für jedes
+# Paar (min_diff, other_cutoff) aus sweep_params, alles aus denselben Bewertungen
+def reportThresholdSweep(scores, subjects, true_subjects, sweep_params):
+    with profiling.span("sweep"):
+        sweep = evaluation.sweepThresholds(scores, subjects, true_subjects,
+                                           sweep_params["min_diff"], sweep_params["other_cutoff"])
+
+    print("%8s %8s %8s %8s  %s" % ("min-diff", "cutoff", "correct", "other",
+                                   "  ".join("%-11s" % subject[:11] for subject in subjects)))
+    print("%8s %8s %8s %8s  %s" % ("", "", "", "", "  ".join("%-11s" % "prec/recall" for subject in subjects)))
+    for row in evaluation.sweepRows(sweep):
+        print("%8.3f %8.3f %8.3f %8.3f  %s" % (
+            row["min_diff"], row["other_cutoff"], row["accuracy"], row["other_rate"],
+            "  ".join("%5.3f/%5.3f" % (row["precision"][subject], row["recall"][subject]) for subject in subjects)))
+
+    d, c = evaluation.bestThresholds(sweep)
+    print()
+    print("Best setting for %i documents: --min-diff %g --other-cutoff %g (correct %.3f, other %.3f)" % (
+        sweep["documents"], sweep["min_diff"][d], sweep["other_cutoff"][c], sweep["accuracy"][d, c], sweep["other_rate"][d, c]))
+
+    if sweep_params.get("output"):
+        with open(sweep_params["output"], "w") as output_file:
+            json.dump({"documents": sweep["documents"], "subjects": sweep["subjects"],
+                       "best": {"min_diff": float(sweep["min_diff"][d]), "other_cutoff": float(sweep["other_cutoff"][c])},
+                       "results": evaluation.sweepRows(sweep)}, output_file, indent=2)
+
+
+# Klassifizieren über einen laufenden Dienst (main.py serve)
+def doRemoteClassification(address, classification_data_paths):
+    import server
 
     results = {}
-    for path in classification_data_paths:
-        RAW_TEXT = textimport.load_text(path)
+    for path, result in zip(classification_data_paths, server.classifyRemote(address, classification_data_paths)):
+        if "error" in result:
+            log.warning("Cannot classify %s: %s" % (path, result["error"]))
+        else:
+            results[path] = SortedDict(result["scores"])
+
+    pprint.pprint(results)
+
+
+def doServing(wordlist_fn, address, classification_params, batch_wait, max_batch_size):
+    import server
+
+    server.serve(address, wordlist_fn, loadLearningDataFromFile, classification_params,
+                 batch_wait=batch_wait, max_batch_size=max_batch_size)
+
+
+def doClassification(wordlist_fn, classification_data_paths, classification_params, fetch_params=None):
+    learning_data = loadLearningDataFromFile(wordlist_fn)
+
+    failed_urls = textimport.prefetch_urls(classification_data_paths, fetch_params)
+
+    RAW_TEXTS = [textimport.load_text(path) if path not in failed_urls else "" for path in classification_data_paths]
+    freqs = textverarbeitung.makeWordFrequencyDictionaries(
+        RAW_TEXTS, getattr(learning_data, "tokenizer", "nltk"), classification_params["jobs"])
+
+    paths = []
+    path_freqs = []
+    for path, RAW_TEXT, freq in zip(classification_data_paths, RAW_TEXTS, freqs):
         if len(RAW_TEXT) > 0:
-            freq =  textverarbeitung.makeWordFrequencyDictionary(RAW_TEXT)
-            per_subject_score = textverarbeitung.compareWordFreqDictToLearningData(
-                freq, learning_data, classification_params)
-            results[path] = per_subject_score
+            paths.append(path)
+            path_freqs.append(freq)
         else:
             log.warning("Cannot read text from %s" % path)
 
+    # alle Texte in einem Schritt bewerten
+    scores, subjects = textverarbeitung.compareWordFreqDictsToLearningData(
+        path_freqs, learning_data, classification_params)
+
+    results = {path: SortedDict(zip(subjects, subject_scores)) for path, subject_scores in zip(paths, scores)}
+
+    logCacheStatistics()
     pprint.pprint(results)
 
 def main():
     args = processArguments()
 
     setupLogging(args)
+    setupTextCache(args)
 
-    learning_data_fn = args.learning_data if args.learning_data else "learningdata.obj"
+    if args.profile:
+        profiling.enable()
+
+    if args.action == "convert":
+        doConversion(args.source, args.target or os.path.splitext(args.source)[0] + ".model")
+        return
+
+    learning_data_fn = args.learning_data if args.learning_data else DEFAULT_LEARNING_DATA
+    if not args.learning_data and args.action != "learn" and not os.path.exists(DEFAULT_LEARNING_DATA) \
+            and os.path.exists(LEGACY_LEARNING_DATA):
+        learning_data_fn = LEGACY_LEARNING_DATA
 
 
     if args.action == "learn":
@@ -350,18 +864,50 @@ def main():
         classification_params["algorithm"] = args.algorithm
         classification_params["category_base_length"] = args.category_base_length
         classification_params["remove_shared_words"] = False if args.keep_shared_words else True
+        classification_params["feature_selection"] = args.feature_selection
+        classification_params["tokenizer"] = args.tokenizer
+        classification_params["jobs"] = args.jobs
+        classification_params["search_jobs"] = args.search_jobs
+        classification_params["halving"] = args.halving
+        classification_params["streaming"] = args.streaming
+        classification_params["hashing"] = args.hashing
+        classification_params["hash_bits"] = args.hash_bits
+        classification_params["signed_hash"] = args.signed_hash
+
+        doLearning(learning_data_fn, args.data, classification_params, getFetchParams(args))
+
+    elif args.action == "update":
+        classification_params = textverarbeitung.getClassificationStdParam()
+        classification_params["retrain_threshold"] = args.retrain_threshold
+        classification_params["jobs"] = args.jobs
 
-        doLearning(learning_data_fn, args.data, classification_params)
+        doUpdate(learning_data_fn, args.data, classification_params, getFetchParams(args))
 
     else:
         classification_params = textverarbeitung.getClassificationStdParam()
         classification_params["min_difference_for_classification"] = args.min_diff
         classification_params["other_cutoff"] = args.other_cutoff
 
-        if args.action == "classify":
-            doClassification(learning_data_fn, args.data, classification_params)
+        if args.action == "serve":
+            doServing(learning_data_fn, args.listen, classification_params,
+                      args.batch_wait / 1000.0, args.max_batch_size)
+        elif args.action == "classify" and args.server:
+            doRemoteClassification(args.server, args.data)
+        elif args.action == "classify":
+            classification_params["jobs"] = args.jobs
+            doClassification(learning_data_fn, args.data, classification_params, getFetchParams(args))
         elif args.action == "test":
-            doTesting(learning_data_fn, args.data, classification_params)
+            classification_params["jobs"] = args.jobs
+            sweep_params = None
+            if args.sweep:
+                sweep_params = {"min_diff": args.sweep_min_diff,
+                                "other_cutoff": args.sweep_other_cutoff,
+                                "output": args.sweep_output}
+            doTesting(learning_data_fn, args.data, classification_params, getFetchParams(args), sweep_params)
+
+    if args.profile:
+        profiling.writeReport(args.profile)
+        log.info("Wrote profile to %s" % args.profile)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Gespeichertes Modell als Verzeichnis statt gepickelter LearningData
+#
+#   meta.json        Format-Version, Tokenizer, Kategorien, Lage der Puffer
+#   vocabulary.npy   die Basis (sortierte Wörter), per mmap geladen
+#   stem_words.npy,
+#   stem_stems.npy   Tabelle für den Stem-Cache
+#   model.pkl        Scaler und Klassifikator (pickle Protokoll 5) ...
+#   buffers.bin      ... deren numpy-Arrays getrennt davon, per mmap geladen
+#
+# für "update" (inkrementelles Lernen), optional:
+#   count_words.npy,
+#   counts.npz       summierte Worthäufigkeiten je Kategorie (Kategorien x Wörter)
+#   documents.json   gelernte URLs je Kategorie und die Einstellungen beim Lernen
+#
+# Bei Modellen mit Merkmalen per Hash (learn --hashing) ist die Basis leer und
+# meta.json enthält unter "hashing" die Einstellungen des HashingIndex; solche
+# Modelle haben Format-Version 2, alle anderen weiterhin Version 1.
+#
+# Der Pfad des Modells ist ein symbolischer Link auf das Verzeichnis der aktuellen
+# Version (.NAME.v...), so lässt sich ein Modell in einem Schritt ersetzen.
+#
+# Die Trainingsdaten (data, target, category_words) werden nicht gespeichert.
+# Alle Arrays werden direkt aus den Dateien eingeblendet (mmap), mehrere
+# Prozesse mit demselben Modell teilen sich also den Speicher.
+
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy
+
+FORMAT = "textclassification-model"
+FORMAT_VERSION = 2
+
+META_FILENAME = "meta.json"
+
+# Anfang jedes Puffers in buffers.bin ausrichten
+BUFFER_ALIGNMENT = 64
+
+
+# Geladenes Modell mit den Attributen von LearningData, die zum Klassifizieren gebraucht werden
+class Model:
+    def __init__(self, meta, base, scaler, classifier, stem_table, directory=None):
+        self.directory = directory
+        self.meta = meta
+        self.base = base
+        self.subjects = meta["subjects"]
+        self.tokenizer = meta["tokenizer"]
+        self.sparse = meta["sparse"]
+        self.hashing = meta.get("hashing")
+        self.scaler = scaler
+        self.classifier = classifier
+        self.stem_table = stem_table
+        self._base_index = None
+        self._training_state = None
+
+    # Zuordnung Wort -> Spalte, erst bei Bedarf und nur einmal berechnet
+    @property
+    def base_index(self):
+        if self._base_index is None:
+            if self.hashing:
+                import textverarbeitung
+                self._base_index = textverarbeitung.HashingIndex(**self.hashing)
+            else:
+                self._base_index = {str(word): column for column, word in enumerate(self.base)}
+        return self._base_index
+
+    # Angaben für "update", werden nur dort gebraucht und daher erst bei Bedarf gelesen
+    def hasTrainingState(self):
+        return self.meta.get("training", False)
+
+    def _getTrainingState(self):
+        if self._training_state is None:
+            if self.hasTrainingState():
+                self._training_state = _readTrainingState(self.directory)
+            else:
+                self._training_state = (None, None, None)
+        return self._training_state
+
+    @property
+    def per_subject_word_freq(self):
+        return self._getTrainingState()[0]
+
+    @property
+    def documents(self):
+        return self._getTrainingState()[1]
+
+    @property
+    def learning_params(self):
+        return self._getTrainingState()[2]
+
+
+def isModel(path):
+    return os.path.isfile(os.path.join(path, META_FILENAME))
+
+
+def _writeBuffers(filename, buffers):
+    layout = []
+    with open(filename, "wb") as buffer_file:
+        offset = 0
+        for buffer in buffers:
+            data = buffer.raw()
+            padding = -offset % BUFFER_ALIGNMENT
+            buffer_file.write(b"\0" * padding)
+            offset += padding
+
+            buffer_file.write(data)
+            layout.append([offset, data.nbytes])
+            offset += data.nbytes
+    return layout
+
+
+def _readBuffers(filename, layout):
+    if os.path.getsize(filename) == 0:
+        return [b""] * len(layout)
+
+    # copy-on-write statt nur lesend: libsvm verlangt beschreibbare Arrays, schreibt aber
+    # nicht hinein, die Seiten bleiben also mit anderen Prozessen geteilt
+    mapped = numpy.memmap(filename, dtype=numpy.uint8, mode="c")
+    return [mapped[offset:offset + length] for offset, length in layout]
+
+
+def _writeModelFiles(learning_data, directory):
+    os.makedirs(directory)
+
+    subjects = list(getattr(learning_data, "subjects", None) or sorted(set(learning_data.target)))
+    numpy.save(os.path.join(directory, "vocabulary.npy"), numpy.array([str(word) for word in learning_data.base], dtype=str))
+
+    stem_table = getattr(learning_data, "stem_table", {})
+    numpy.save(os.path.join(directory, "stem_words.npy"), numpy.array(list(stem_table.keys()), dtype=str))
+    numpy.save(os.path.join(directory, "stem_stems.npy"), numpy.array(list(stem_table.values()), dtype=str))
+
+    training = _writeTrainingState(learning_data, directory)
+
+    buffers = []
+    with open(os.path.join(directory, "model.pkl"), "wb") as model_file:
+        pickle.dump({"scaler": learning_data.scaler, "classifier": learning_data.classifier}, model_file,
+                    protocol=5, buffer_callback=buffers.append)
+    layout = _writeBuffers(os.path.join(directory, "buffers.bin"), buffers)
+
+    hashing = getattr(learning_data, "hashing", None)
+    meta = {
+        "format": FORMAT,
+        "version": FORMAT_VERSION if hashing else 1,
+        "created": time.time(),
+        "tokenizer": getattr(learning_data, "tokenizer", "nltk"),
+        "sparse": getattr(learning_data, "sparse", False),
+        "subjects": subjects,
+        "base_size": len(learning_data.base),
+        "classifier": type(learning_data.classifier).__name__,
+        "hashing": hashing,
+        "buffers": layout,
+        "training": training,
+    }
+    # meta.json zuletzt: erst damit ist das Verzeichnis ein vollständiges Modell
+    with open(os.path.join(directory, META_FILENAME), "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+
+def _writeTrainingState(learning_data, directory):
+    import scipy.sparse
+
+    per_subject_word_freq = getattr(learning_data, "per_subject_word_freq", None)
+    if per_subject_word_freq is None:
+        return False
+
+    subjects = list(per_subject_word_freq.keys())
+    words = sorted(set(word for word_freqs in per_subject_word_freq.values() for word in word_freqs))
+    word_index = {word: column for column, word in enumerate(words)}
+
+    rows, columns, data = [], [], []
+    for row, subject in enumerate(subjects):
+        for word, freq in per_subject_word_freq[subject].items():
+            rows.append(row)
+            columns.append(word_index[word])
+            data.append(float(freq))
+    counts = scipy.sparse.csr_matrix((data, (rows, columns)), shape=(len(subjects), len(words)))
+
+    numpy.save(os.path.join(directory, "count_words.npy"), numpy.array(words, dtype=str))
+    scipy.sparse.save_npz(os.path.join(directory, "counts.npz"), counts, compressed=False)
+    with open(os.path.join(directory, "documents.json"), "w") as documents_file:
+        json.dump({"subjects": subjects,
+                   "documents": {subject: list(urls) for subject, urls in learning_data.documents.items()},
+                   "params": learning_data.learning_params}, documents_file)
+    return True
+
+
+# liefert die Worthäufigkeiten je Kategorie, die gelernten URLs und die Einstellungen
+def _readTrainingState(directory):
+    import scipy.sparse
+
+    with open(os.path.join(directory, "documents.json")) as documents_file:
+        documents = json.load(documents_file)
+    words = numpy.load(os.path.join(directory, "count_words.npy")).tolist()
+    counts = scipy.sparse.load_npz(os.path.join(directory, "counts.npz")).tocsr()
+
+    per_subject_word_freq = {}
+    for row, subject in enumerate(documents["subjects"]):
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        per_subject_word_freq[subject] = {words[column]: float(freq)
+                                          for column, freq in zip(counts.indices[start:end], counts.data[start:end])}
+
+    return per_subject_word_freq, documents["documents"], documents["params"]
+
+
+# Versionen eines Modells liegen neben dem Link: .NAME.vZEITSTEMPEL-PID
+def _versionPrefix(directory):
+    return ".%s.v" % os.path.basename(directory)
+
+def _versionStamp(name, prefix):
+    try:
+        return int(name[len(prefix):].split("-")[0])
+    except ValueError:
+        return None
+
+
+# Modell schreiben; ein bestehendes Modell wird erst ersetzt, wenn das neue vollständig ist.
+# directory ist ein symbolischer Link auf das Verzeichnis der aktuellen Version, der Link
+# wird mit os.replace in einem Schritt umgesetzt. Lesende sehen also immer ein
+# vollständiges Modell; die vorige Version bleibt bis zum nächsten Schreiben erhalten.
+def writeModel(learning_data, directory):
+    directory = os.path.normpath(directory)
+    parent = os.path.dirname(directory) or "."
+    prefix = _versionPrefix(directory)
+    version = "%s%i-%i" % (prefix, time.time_ns(), os.getpid())
+    link = "%s.link-%i" % (directory, os.getpid())
+
+    _writeModelFiles(learning_data, os.path.join(parent, version))
+
+    previous = os.readlink(directory) if os.path.islink(directory) else None
+    try:
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(version, link)
+    except OSError:
+        # ohne symbolische Links: Verzeichnis umbenennen, kurz fehlt das Modell
+        _replaceDirectory(os.path.join(parent, version), directory)
+        return
+
+    if os.path.isdir(directory) and not os.path.islink(directory):
+        # altes Modell als Verzeichnis, wird einmalig durch den Link ersetzt
+        _replaceDirectory(link, directory)
+    else:
+        os.replace(link, directory)
+
+    # ältere Versionen als die vorige löschen
+    keep = _versionStamp(previous, prefix) if previous and previous.startswith(prefix) else None
+    for name in os.listdir(parent):
+        stamp = _versionStamp(name, prefix) if name.startswith(prefix) else None
+        if stamp is not None and name != version and (keep is None or stamp < keep):
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+def _replaceDirectory(source, directory):
+    previous = "%s.old-%i" % (directory, os.getpid())
+    if os.path.isdir(directory) and not os.path.islink(directory):
+        os.replace(directory, previous)
+    elif os.path.lexists(directory):
+        os.remove(directory)
+    os.replace(source, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+# alle Dateien werden aus derselben Version gelesen; wurde diese währenddessen von
+# einem schreibenden Prozess gelöscht, wird die dann aktuelle Version gelesen
+def loadModel(directory):
+    while True:
+        version = os.path.realpath(directory)
+        try:
+            return _loadVersion(version)
+        except FileNotFoundError:
+            if os.path.realpath(directory) == version:
+                raise
+
+
+def _loadVersion(directory):
+    with open(os.path.join(directory, META_FILENAME)) as meta_file:
+        meta = json.load(meta_file)
+
+    if meta.get("format") != FORMAT:
+        raise ValueError("%s is not a model directory" % directory)
+    if meta.get("version", 0) > FORMAT_VERSION:
+        raise ValueError("model %s has format version %s, this program reads up to version %i" %
+                         (directory, meta.get("version"), FORMAT_VERSION))
+
+    base = numpy.load(os.path.join(directory, "vocabulary.npy"), mmap_mode="r")
+
+    stem_words = numpy.load(os.path.join(directory, "stem_words.npy"))
+    stem_stems = numpy.load(os.path.join(directory, "stem_stems.npy"))
+    stem_table = dict(zip(stem_words.tolist(), stem_stems.tolist()))
+
+    buffers = _readBuffers(os.path.join(directory, "buffers.bin"), meta["buffers"])
+    with open(os.path.join(directory, "model.pkl"), "rb") as model_file:
+        content = pickle.load(model_file, buffers=buffers)
+
+    return Model(meta, base, content["scaler"], content["classifier"], stem_table, directory)
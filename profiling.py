@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Zeitmessung der einzelnen Verarbeitungsschritte und Zähler pro Dokument
+#
+# Standardmäßig ausgeschaltet, dann kosten die Messpunkte praktisch nichts.
+# Mit enable() werden Laufzeiten je Schritt ("span") aufsummiert, getReport()
+# liefert alles als dict, writeReport() schreibt es als JSON-Datei.
+
+import functools
+import json
+import pprint
+import threading
+import time
+
+from contextlib import contextmanager
+
+ENABLED = False
+
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+_documents = []
+_started = time.time()
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+    reset()
+
+
+def reset():
+    global _started
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        del _documents[:]
+        _started = time.time()
+
+
+def record(stage, duration, count=1):
+    with _lock:
+        stats = _spans.get(stage)
+        if stats is None:
+            stats = _spans[stage] = {"count": 0, "total": 0.0, "min": duration, "max": duration}
+        stats["count"] += count
+        stats["total"] += duration
+        stats["min"] = min(stats["min"], duration)
+        stats["max"] = max(stats["max"], duration)
+
+
+# Laufzeit eines Verarbeitungsschritts messen:
+#   with profiling.span("tokenize"):
+#       ...
+@contextmanager
+def span(stage):
+    if not ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+# wie span, für eine ganze Funktion:
+#   @profiling.timed("base")
+#   def buildClassificationSpaceBase(...):
+def timed(stage):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    if ENABLED:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+# Kennzahlen eines einzelnen Dokuments, z.B. bytes, tokens, unique_stems
+def addDocument(**counters):
+    if ENABLED:
+        with _lock:
+            _documents.append(counters)
+
+
+# Messwerte z.B. aus einem Worker-Prozess abholen und zurücksetzen ...
+def collect():
+    with _lock:
+        snapshot = {"spans": dict(_spans), "counters": dict(_counters), "documents": list(_documents)}
+        _spans.clear()
+        _counters.clear()
+        del _documents[:]
+    return snapshot
+
+
+# ... und im Hauptprozess hinzufügen
+def merge(snapshot):
+    if not ENABLED:
+        return
+
+    with _lock:
+        for stage, stats in snapshot["spans"].items():
+            current = _spans.get(stage)
+            if current is None:
+                _spans[stage] = dict(stats)
+            else:
+                current["count"] += stats["count"]
+                current["total"] += stats["total"]
+                current["min"] = min(current["min"], stats["min"])
+                current["max"] = max(current["max"], stats["max"])
+        for name, value in snapshot["counters"].items():
+            _counters[name] = _counters.get(name, 0) + value
+        _documents.extend(snapshot["documents"])
+
+
+def getReport():
+    with _lock:
+        spans = {stage: dict(stats, mean=stats["total"] / stats["count"]) for stage, stats in _spans.items()}
+        documents = list(_documents)
+        counters = dict(_counters)
+
+    summary = {}
+    for key in sorted(set(key for document in documents for key in document)):
+        values = [document[key] for document in documents if key in document]
+        summary[key] = {"total": sum(values), "min": min(values), "max": max(values),
+                        "mean": sum(values) / len(values)}
+
+    return {
+        "started": _started,
+        "wall_time": time.time() - _started,
+        "spans": spans,
+        "counters": counters,
+        "documents": {"count": len(documents), "summary": summary, "per_document": documents},
+    }
+
+
+def writeReport(filename):
+    with open(filename, "w") as report_file:
+        json.dump(getReport(), report_file, indent=2, sort_keys=True)
+
+
+# Objekt erst beim Ausgeben formatieren, z.B. log.debug("%s", PrettyFormat(x)):
+# ist die Log-Stufe ausgeschaltet, wird pformat gar nicht aufgerufen
+class PrettyFormat:
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return pprint.pformat(self.obj)
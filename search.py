@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Suche nach den besten Parametern eines Klassifikators (statt GridSearchCV)
+#
+# Jede Parameterkombination wird je Fold genau einmal gelernt und dabei mit allen
+# Metriken aus scoring bewertet. Die Fits laufen mit joblib parallel (n_jobs).
+# Die Bewertungen der einzelnen Folds werden in einem FoldCache (textcache.py)
+# abgelegt, Schlüssel ist ein Hash der Trainingsdaten zusammen mit Klassifikator,
+# Parametern und Fold. Bei unveränderten Daten wird nur noch der beste
+# Klassifikator auf allen Trainingsdaten gelernt.
+#
+# halvingSearch verwirft schlecht bewertete Kombinationen schon auf kleinen
+# Teilmengen der Daten (successive halving), sinnvoll für große Gitter wie bei SVM.
+
+import hashlib
+import logging as log
+import math
+import time
+
+import numpy
+import scipy.sparse
+
+import profiling
+
+# Metriken der Parametersuche, die erste entscheidet über die besten Parameter
+SCORING = ["precision", "recall"]
+
+# bei halvingSearch kommt je Runde dieser Anteil der Kombinationen weiter
+HALVING_FACTOR = 3
+
+# Cache für die Bewertungen der Folds, wird in main.py gesetzt
+FOLD_CACHE = None
+
+
+# Hash der Trainingsdaten, unabhängig davon, ob X dicht oder dünnbesetzt ist
+def hashDataset(X, y):
+    digest = hashlib.sha256()
+    if scipy.sparse.issparse(X):
+        X = X.tocsr()
+        X.sort_indices()
+        parts = [X.data, X.indices, X.indptr]
+    else:
+        parts = [numpy.asarray(X)]
+
+    digest.update(repr(X.shape).encode("utf-8"))
+    for part in parts:
+        part = numpy.ascontiguousarray(part)
+        digest.update(str(part.dtype).encode("utf-8"))
+        digest.update(part.tobytes())
+    digest.update("\0".join(str(tag) for tag in y).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _makeScorers(scoring):
+    from sklearn.metrics import make_scorer, precision_score, recall_score, f1_score, accuracy_score
+
+    metrics = {
+        "precision": make_scorer(precision_score, average="macro", zero_division=0),
+        "recall": make_scorer(recall_score, average="macro", zero_division=0),
+        "f1": make_scorer(f1_score, average="macro", zero_division=0),
+        "accuracy": make_scorer(accuracy_score),
+    }
+    unknown = [name for name in scoring if name not in metrics]
+    if len(unknown) > 0:
+        raise ValueError("unknown metrics %s, supported: %s" % (", ".join(unknown), ", ".join(metrics)))
+    return {name: metrics[name] for name in scoring}
+
+
+def _foldKey(dataset_hash, estimator, params, test, scoring):
+    import sklearn
+
+    digest = hashlib.sha256()
+    configured = estimator.get_params(deep=True)
+    configured.update(params)
+    for part in [sklearn.__version__, type(estimator).__module__, type(estimator).__name__,
+                 repr(sorted(configured.items())), ",".join(scoring), dataset_hash]:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(numpy.ascontiguousarray(test, dtype=numpy.int64).tobytes())
+    return digest.hexdigest()
+
+
+# ein Fit und die Bewertung mit allen Metriken, läuft in den joblib-Prozessen
+def _fitAndScore(estimator, params, X, y, train, test, scorers):
+    from sklearn.base import clone
+
+    start = time.perf_counter()
+    fitted = clone(estimator).set_params(**params).fit(X[train], y[train])
+    fit_time = time.perf_counter() - start
+
+    scores = {name: float(scorer(fitted, X[test], y[test])) for name, scorer in scorers.items()}
+    return {"scores": scores, "fit_time": fit_time}
+
+
+# alle Kombinationen auf allen Folds bewerten; liefert je Kombination
+# die Bewertungen der Folds als dict Metrik -> Liste
+def _evaluate(estimator, candidates, X, y, cv, scoring, n_jobs, cache):
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import check_cv
+
+    scorers = _makeScorers(scoring)
+    splits = list(check_cv(cv, y, classifier=True).split(X, y))
+    dataset_hash = hashDataset(X, y)
+
+    tasks = [(candidate, fold) for candidate in range(len(candidates)) for fold in range(len(splits))]
+    results = {}
+    keys = {}
+    for candidate, fold in tasks:
+        keys[candidate, fold] = _foldKey(dataset_hash, estimator, candidates[candidate], splits[fold][1], scoring)
+        if cache is not None:
+            cached = cache.get(keys[candidate, fold])
+            if cached is not None:
+                results[candidate, fold] = cached
+
+    missing = [task for task in tasks if task not in results]
+    log.info("Parameter search: %i candidates x %i folds, %i fits from the cache" %
+             (len(candidates), len(splits), len(tasks) - len(missing)))
+
+    if len(missing) > 0:
+        computed = Parallel(n_jobs=n_jobs)(
+            delayed(_fitAndScore)(estimator, candidates[candidate], X, y, *splits[fold], scorers)
+            for candidate, fold in missing)
+        for task, result in zip(missing, computed):
+            results[task] = result
+            if cache is not None:
+                cache.put(keys[task], result)
+        profiling.count("fits", len(missing))
+
+    per_candidate = []
+    for candidate in range(len(candidates)):
+        fold_results = [results[candidate, fold] for fold in range(len(splits))]
+        scores = {name: [result["scores"][name] for result in fold_results] for name in scoring}
+        scores["fit_time"] = [result["fit_time"] for result in fold_results]
+        per_candidate.append(scores)
+    return per_candidate
+
+
+class SearchResult:
+    def __init__(self, estimator, scoring):
+        self.scoring = scoring
+        self.refit = scoring[0]
+        self.cv_results_ = {"params": []}
+        for name in scoring + ["fit_time"]:
+            self.cv_results_["mean_test_%s" % name] = []
+            self.cv_results_["std_test_%s" % name] = []
+        self.cv_results_["n_resources"] = []
+        self.cv_results_["iter"] = []
+        self._estimator = estimator
+        self.best_estimator_ = None
+        self.best_params_ = None
+        self.best_score_ = None
+
+    def _add(self, candidates, per_candidate, n_resources, iteration):
+        for params, scores in zip(candidates, per_candidate):
+            self.cv_results_["params"].append(params)
+            for name, values in scores.items():
+                self.cv_results_["mean_test_%s" % name].append(float(numpy.mean(values)))
+                self.cv_results_["std_test_%s" % name].append(float(numpy.std(values)))
+            self.cv_results_["n_resources"].append(n_resources)
+            self.cv_results_["iter"].append(iteration)
+
+    # beste Kombination der letzten Runde auswählen und auf allen Daten lernen
+    def _refit(self, X, y):
+        from sklearn.base import clone
+
+        last = max(self.cv_results_["iter"])
+        rows = [row for row, iteration in enumerate(self.cv_results_["iter"]) if iteration == last]
+        means = self.cv_results_["mean_test_%s" % self.refit]
+        best = max(rows, key=lambda row: means[row])
+
+        self.best_params_ = self.cv_results_["params"][best]
+        self.best_score_ = means[best]
+        self.best_estimator_ = clone(self._estimator).set_params(**self.best_params_).fit(X, y)
+        return self
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+
+# jede Kombination aus param_grid auf allen Folds bewerten
+def gridSearch(estimator, param_grid, X, y, scoring=SCORING, cv=5, n_jobs=1, cache=None):
+    from sklearn.model_selection import ParameterGrid
+
+    y = numpy.asarray(y)
+    candidates = list(ParameterGrid(param_grid))
+
+    result = SearchResult(estimator, list(scoring))
+    result._add(candidates, _evaluate(estimator, candidates, X, y, cv, result.scoring, n_jobs, cache), len(y), 0)
+    return result._refit(X, y)
+
+
+# successive halving: alle Kombinationen auf einer kleinen, geschichteten Teilmenge
+# bewerten, das beste Drittel auf einer dreimal so großen usw.; die letzte Runde
+# mit höchstens factor Kombinationen läuft auf allen Daten
+def halvingSearch(estimator, param_grid, X, y, scoring=SCORING, cv=5, n_jobs=1, cache=None, factor=HALVING_FACTOR):
+    from sklearn.model_selection import ParameterGrid
+    from sklearn.utils import resample
+
+    y = numpy.asarray(y)
+    candidates = list(ParameterGrid(param_grid))
+    n_samples = len(y)
+    n_splits = cv if isinstance(cv, int) else cv.get_n_splits()
+
+    # jede Klasse braucht in jedem Fold genug Dokumente
+    min_resources = min(n_samples, 2 * n_splits * len(set(y)))
+    # nur so viele Runden, wie die Kombinationen bzw. die Daten hergeben
+    rounds = max(0, min(math.ceil(math.log(len(candidates)) / math.log(factor)) - 1,
+                        math.floor(math.log(n_samples / min_resources) / math.log(factor))))
+
+    result = SearchResult(estimator, list(scoring))
+    for iteration in range(rounds + 1):
+        n_resources = max(min_resources, n_samples // factor ** (rounds - iteration))
+        if n_resources < n_samples:
+            rows = numpy.sort(resample(numpy.arange(n_samples), replace=False, n_samples=n_resources,
+                                       stratify=y, random_state=0))
+        else:
+            rows = numpy.arange(n_samples)
+
+        per_candidate = _evaluate(estimator, candidates, X[rows], y[rows], cv, result.scoring, n_jobs, cache)
+        result._add(candidates, per_candidate, len(rows), iteration)
+
+        if iteration < rounds:
+            keep = math.ceil(len(candidates) / factor)
+            ranking = sorted(range(len(candidates)), key=lambda c: -numpy.mean(per_candidate[c][result.refit]))
+            candidates = [candidates[c] for c in sorted(ranking[:keep])]
+
+    return result._refit(X, y)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Klassifikations-Dienst: die Lerndaten werden einmal geladen, danach werden
+# Anfragen über HTTP (TCP oder Unix-Socket) beantwortet.
+#
+#   POST /classify   {"documents": [{"text": "..."}, {"url": "http://..."}]}
+#   -> {"results": [{"scores": {subject: score}, "winner": subject oder null}, ...]}
+#   GET  /status     -> Informationen zum geladenen Modell
+#
+# Dokumente, die gleichzeitig eintreffen (auch aus verschiedenen Anfragen),
+# werden gesammelt und in einem Aufruf von compareWordFreqDictsToLearningData
+# bewertet. URLs werden vorher im Thread der jeweiligen Anfrage geladen. Ändert sich die Datei mit den Lerndaten, wird sie neu geladen.
+
+import http.client
+import http.server
+import json
+import logging as log
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from concurrent.futures import Future
+
+import textimport
+import textverarbeitung
+
+
+# Wartezeit nach dem ersten Dokument eines Pakets auf weitere Dokumente
+BATCH_WAIT = 0.01
+MAX_BATCH_SIZE = 256
+
+
+class ModelHolder:
+    def __init__(self, filename, load_function):
+        self.filename = filename
+        self.load_function = load_function
+        self.learning_data = None
+        self.mtime = None
+        self.loaded = None
+
+    # Lerndaten (neu) laden, wenn sich die Datei geändert hat
+    def refresh(self):
+        try:
+            mtime = os.stat(self.filename).st_mtime_ns
+        except OSError as e:
+            if self.learning_data is None:
+                raise
+            log.warning("Cannot stat learning data %s: %s" % (self.filename, e))
+            return self.learning_data
+
+        if mtime != self.mtime:
+            try:
+                self.learning_data = self.load_function(self.filename)
+            except Exception as e:
+                if self.learning_data is None:
+                    raise
+                log.error("Cannot reload learning data %s, keeping the old one: %s" % (self.filename, e))
+            else:
+                if self.mtime is not None:
+                    log.info("Reloaded learning data from %s" % self.filename)
+                self.loaded = time.time()
+            self.mtime = mtime
+
+        return self.learning_data
+
+
+class MicroBatcher:
+    def __init__(self, model, classification_params, batch_wait=BATCH_WAIT, max_batch_size=MAX_BATCH_SIZE):
+        self.model = model
+        self.classification_params = classification_params
+        self.batch_wait = batch_wait
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="classification-batcher", daemon=True)
+        self._thread.start()
+
+    # document ist ein dict mit "text" oder "error", liefert ein Future mit dem Ergebnis
+    def submit(self, document):
+        future = Future()
+        self._queue.put((document, future))
+        return future
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            try:
+                results = self.classify([document for document, future in batch])
+            except Exception as e:
+                log.exception("Classification of %i documents failed" % len(batch))
+                results = [{"error": str(e)}] * len(batch)
+
+            for (document, future), result in zip(batch, results):
+                future.set_result(result)
+
+    # documents wie von loadDocuments, mit "text" oder "error"; hier wird nichts
+    # heruntergeladen, damit eine langsame URL nicht das ganze Paket aufhält
+    def classify(self, documents):
+        learning_data = self.model.refresh()
+        self.batches += 1
+
+        texts = []
+        errors = []
+        for document in documents:
+            text, error = document.get("text", ""), document.get("error")
+            if error is None and "text" not in document:
+                error = 'expected "text" or an http(s) "url"'
+            elif error is None and not isinstance(text, str):
+                # ungültige Eingabe eines Clients darf nicht das ganze Paket scheitern lassen
+                text, error = "", '"text" must be a string'
+            elif error is None and len(text) == 0:
+                error = "no text"
+            texts.append(text)
+            errors.append(error)
+
+        tokenizer = getattr(learning_data, "tokenizer", "nltk")
+        freqs = list(textverarbeitung.makeWordFrequencyDictionaries(texts, tokenizer))
+        valid = [i for i, error in enumerate(errors) if error is None]
+
+        scores, subjects = textverarbeitung.compareWordFreqDictsToLearningData(
+            [freqs[i] for i in valid], learning_data, self.classification_params)
+
+        results = [{"error": error} for error in errors]
+        for i, subject_scores in zip(valid, scores):
+            per_subject_score = {subject: float(score) for subject, score in zip(subjects, subject_scores)}
+            results[i] = {
+                "scores": per_subject_score,
+                "winner": textverarbeitung.getWinningSubject(per_subject_score, self.classification_params),
+            }
+
+        return results
+
+
+# URLs der Dokumente laden, bevor sie an den MicroBatcher gehen; läuft im Thread der
+# Anfrage. Liefert die Dokumente mit "text" bzw. "error" statt "url".
+def loadDocuments(documents):
+    urls = set(document["url"] for document in documents
+               if "text" not in document and isinstance(document.get("url"), str) and textimport.is_url(document["url"]))
+    failed_urls = textimport.prefetch_urls(urls) if len(urls) > 0 else {}
+
+    loaded = []
+    for document in documents:
+        if "text" in document and not isinstance(document["text"], str):
+            loaded.append({"error": '"text" must be a string'})
+        elif "text" in document:
+            loaded.append({"text": document["text"]})
+        elif not isinstance(document.get("url"), str) or document["url"] not in urls:
+            loaded.append({"error": 'expected "text" or an http(s) "url"'})
+        elif document["url"] in failed_urls:
+            loaded.append({"error": str(failed_urls[document["url"]])})
+        else:
+            loaded.append({"text": textimport.load_text(document["url"])})
+
+    if len(urls) > 0:
+        textimport.write_textcache()
+    return loaded
+
+
+class ClassificationRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status, content):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/status":
+            self._reply(404, {"error": "unknown path %s" % self.path})
+            return
+
+        model = self.server.batcher.model
+        learning_data = model.learning_data
+        self._reply(200, {
+            "learning_data": model.filename,
+            "loaded": model.loaded,
+            "subjects": textverarbeitung.getLearnedSubjects(learning_data) if learning_data is not None else [],
+            "batches": self.server.batcher.batches,
+        })
+
+    def do_POST(self):
+        if self.path != "/classify":
+            self._reply(404, {"error": "unknown path %s" % self.path})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            documents = request["documents"]
+            if not isinstance(documents, list) or not all(isinstance(document, dict) for document in documents):
+                raise ValueError('"documents" must be a list of objects')
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {"error": "invalid request: %s" % e})
+            return
+
+        futures = [self.server.batcher.submit(document) for document in loadDocuments(documents)]
+        self._reply(200, {"results": [future.result() for future in futures]})
+
+    # bei Unix-Sockets gibt es keine Client-Adresse
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "local"
+
+    def log_message(self, format, *args):
+        log.info("%s - %s" % (self.address_string(), format % args))
+
+
+class ClassificationServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, batcher):
+        self.batcher = batcher
+        super().__init__(address, ClassificationRequestHandler)
+
+
+class UnixClassificationServer(ClassificationServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+# "host:port" bzw. ":port" für TCP, alles andere ist der Pfad eines Unix-Sockets
+def parseAddress(address):
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def makeServer(address, learning_data_fn, load_function, classification_params,
+               batch_wait=BATCH_WAIT, max_batch_size=MAX_BATCH_SIZE):
+    model = ModelHolder(learning_data_fn, load_function)
+    model.refresh()
+
+    batcher = MicroBatcher(model, classification_params, batch_wait, max_batch_size)
+
+    address = parseAddress(address)
+    if isinstance(address, tuple):
+        return ClassificationServer(address, batcher)
+    return UnixClassificationServer(address, batcher)
+
+
+def serve(address, learning_data_fn, load_function, classification_params, **batch_params):
+    server = makeServer(address, learning_data_fn, load_function, classification_params, **batch_params)
+    log.warning("Serving %s on %s" % (learning_data_fn, address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.stop()
+
+
+################################################################################
+# Client
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+# Pfade bzw. URLs vom Dienst klassifizieren lassen; Dateien werden hier gelesen,
+# URLs lädt der Dienst selbst. Liefert eine Liste mit einem Ergebnis je Pfad.
+def classifyRemote(address, paths, timeout=None):
+    documents = [{"url": path} if textimport.is_url(path) else {"text": textimport.load_text_from_file(path)}
+                 for path in paths]
+
+    address = parseAddress(address)
+    if isinstance(address, tuple):
+        con = http.client.HTTPConnection(*address, timeout=timeout)
+    else:
+        con = UnixHTTPConnection(address, timeout=timeout)
+
+    try:
+        con.request("POST", "/classify", body=json.dumps({"documents": documents}),
+                    headers={"Content-Type": "application/json"})
+        response = con.getresponse()
+        content = json.loads(response.read())
+    finally:
+        con.close()
+
+    if response.status != 200:
+        raise RuntimeError("classification server: %s" % content.get("error", response.status))
+    return content["results"]
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Lernen in zwei Durchläufen für Korpora, die nicht in den Speicher passen
+#
+#   1. Durchlauf  nur die Summen der Worthäufigkeiten je Kategorie (sumPerSubject),
+#                 daraus wird die Basis bestimmt
+#   2. Durchlauf  die Dokumente werden erneut gelesen (Texte und Worthäufigkeiten
+#                 kommen dann aus den Caches) und als Zeilen der Merkmalsmatrix in
+#                 Dateien geschrieben (writeFeatureRows, FeatureMatrixWriter)
+#
+# Die Matrix wird danach per mmap eingeblendet und auch dort skaliert
+# (fitTransformInPlace), sie liegt also nie vollständig im Speicher des Prozesses.
+
+import os
+
+import numpy
+import scipy.sparse
+
+from sortedcontainers import SortedDict
+
+import textverarbeitung
+
+# Zeilen je Paket beim Schreiben und beim Skalieren
+BATCH_ROWS = 256
+SCALE_ROWS = 8192
+
+
+# tagged_freqs liefert (Kategorie, URL, Worthäufigkeiten) je Dokument
+def sumPerSubject(tagged_freqs):
+    per_subject_word_freq = SortedDict()
+    documents = SortedDict()
+    for subject, url, freq in tagged_freqs:
+        textverarbeitung.appendWordFreqDictToExistingDict(per_subject_word_freq.setdefault(subject, {}), freq)
+        documents.setdefault(subject, []).append(url)
+    return per_subject_word_freq, documents
+
+
+# reicht die Dokumente durch und merkt sich dabei die URLs je Kategorie in documents
+def recordDocuments(tagged_freqs, documents):
+    for subject, url, freq in tagged_freqs:
+        documents.setdefault(subject, []).append(url)
+        yield subject, url, freq
+
+
+# die Dokumente auf der Basis (oder einem textverarbeitung.HashingIndex) als Zeilen
+# schreiben, liefert die Kategorien der Zeilen; writer braucht nur append(matrix)
+def writeFeatureRows(tagged_freqs, base_index, writer, batch_rows=BATCH_ROWS):
+    target = []
+    batch = []
+    for subject, url, freq in tagged_freqs:
+        batch.append(freq)
+        target.append(subject)
+        if len(batch) >= batch_rows:
+            writer.append(textverarbeitung.getClassificationMatrix(base_index, batch))
+            batch = []
+
+    if len(batch) > 0:
+        writer.append(textverarbeitung.getClassificationMatrix(base_index, batch))
+    return target
+
+
+# Merkmalsmatrix als Dateien in directory: dünnbesetzt als CSR (data.bin,
+# indices.bin, indptr.bin) oder dicht (dense.bin), Zeilen werden paketweise angehängt
+class FeatureMatrixWriter:
+    def __init__(self, directory, n_columns, sparse=True):
+        self.directory = directory
+        self.n_columns = n_columns
+        self.sparse = sparse
+        self.rows = 0
+        self.nnz = 0
+
+        names = ["data", "indices", "indptr"] if sparse else ["dense"]
+        self._files = {name: open(self._filename(name), "wb") for name in names}
+        if sparse:
+            self._files["indptr"].write(numpy.zeros(1, dtype=numpy.int32).tobytes())
+
+    def _filename(self, name):
+        return os.path.join(self.directory, name + ".bin")
+
+    # matrix: CSR-Matrix mit n_columns Spalten
+    def append(self, matrix):
+        if self.sparse:
+            if self.nnz + matrix.nnz > numpy.iinfo(numpy.int32).max:
+                raise ValueError("too many entries for a feature matrix with 32 bit indices")
+            self._files["data"].write(numpy.asarray(matrix.data, dtype=numpy.float64).tobytes())
+            self._files["indices"].write(numpy.asarray(matrix.indices, dtype=numpy.int32).tobytes())
+            self._files["indptr"].write((matrix.indptr[1:] + self.nnz).astype(numpy.int32).tobytes())
+        else:
+            self._files["dense"].write(numpy.asarray(matrix.toarray(), dtype=numpy.float64).tobytes())
+
+        self.rows += matrix.shape[0]
+        self.nnz += matrix.nnz
+
+    def _map(self, name, dtype, shape):
+        if numpy.prod(shape) == 0:
+            return numpy.zeros(shape, dtype=dtype)
+        return numpy.memmap(self._filename(name), dtype=dtype, mode="r+", shape=shape)
+
+    # Dateien schließen und die Matrix eingeblendet zurückgeben
+    def close(self):
+        for output_file in self._files.values():
+            output_file.close()
+
+        if not self.sparse:
+            return self._map("dense", numpy.float64, (self.rows, self.n_columns))
+
+        return scipy.sparse.csr_matrix(
+            (self._map("data", numpy.float64, (self.nnz,)), self._map("indices", numpy.int32, (self.nnz,)),
+             self._map("indptr", numpy.int32, (self.rows + 1,))),
+            shape=(self.rows, self.n_columns), copy=False)
+
+
+# Scaler paketweise anpassen (partial_fit) und die Matrix an Ort und Stelle
+# skalieren; Scaler ohne partial_fit (DummyScaler) verändern die Matrix nicht
+def fitTransformInPlace(scaler, X, batch_rows=SCALE_ROWS):
+    if not hasattr(scaler, "partial_fit"):
+        return scaler.fit_transform(X)
+
+    for start in range(0, X.shape[0], batch_rows):
+        scaler.partial_fit(X[start:start + batch_rows])
+
+    for start in range(0, X.shape[0], batch_rows):
+        end = min(start + batch_rows, X.shape[0])
+        if scipy.sparse.issparse(X):
+            # ohne Zentrieren bleibt die Struktur der Zeilen erhalten
+            X.data[X.indptr[start]:X.indptr[end]] = scaler.transform(X[start:end]).data
+        else:
+            X[start:end] = scaler.transform(X[start:end])
+    return X
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import unittest
+import sys, os
+import numpy
+import scipy.sparse
+
+# Modulsuchpfad erweitern
+THIS_MODULES_PATH = os.path.dirname(__file__)
+TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
+
+sys.path.append(TEST_MODULES_PATH)
+
+# Importiere zu testendes Modul
+from classification import SelfmadeNaive
+
+############################################################
+# Unittest fuer classification.py
+############################################################
+
+
+class TestSelfmadeNaive(unittest.TestCase):
+
+    X = numpy.array([[0.5, 0.5, 0.0, 0.0],
+                     [0.0, 0.3, 0.0, 0.7],
+                     [0.0, 0.0, 1.0, 0.0]])
+    TAGS = ['pigs', 'dogs', 'pigs']
+
+    def test_scores_sum_category_words(self):
+        clf = SelfmadeNaive().fit(self.X, self.TAGS)
+
+        self.assertEqual(list(clf.classes_), ['dogs', 'pigs'])
+        # dogs: Wörter 1 und 3, pigs: Wörter 0, 1 und 2
+        result = clf.predict_proba(numpy.array([[0.1, 0.2, 0.3, 0.4]]))
+        self.assertTrue(numpy.allclose(result, [[0.6, 0.6]]))
+
+    def test_predict(self):
+        clf = SelfmadeNaive().fit(self.X, self.TAGS)
+
+        self.assertEqual(clf.predict(self.X), ['pigs', 'dogs', 'pigs'])
+        self.assertEqual(clf.score(self.X, self.TAGS), 1.0)
+
+    def test_sparse_input(self):
+        dense = SelfmadeNaive().fit(self.X, self.TAGS)
+        sparse = SelfmadeNaive().fit(scipy.sparse.csr_matrix(self.X), self.TAGS)
+
+        self.assertTrue(numpy.allclose(sparse.predict_proba(scipy.sparse.csr_matrix(self.X)),
+                                       dense.predict_proba(self.X)))
+
+    def test_partial_fit_same_as_fit(self):
+        clf = SelfmadeNaive().fit(self.X[:2], self.TAGS[:2])
+        clf.partial_fit(self.X[2:], self.TAGS[2:])
+
+        expected = SelfmadeNaive().fit(self.X, self.TAGS)
+        self.assertTrue(numpy.array_equal(clf.category_mask, expected.category_mask))
+
+    def test_partial_fit_unknown_category(self):
+        clf = SelfmadeNaive().fit(self.X, self.TAGS)
+        self.assertRaises(ValueError, clf.partial_fit, self.X[:1], ['cats'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import unittest
+import sys, os
+import numpy
+
+# Modulsuchpfad erweitern
+THIS_MODULES_PATH = os.path.dirname(__file__)
+TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
+
+sys.path.append(TEST_MODULES_PATH)
+
+# Importiere zu testendes Modul
+import evaluation
+import textverarbeitung
+
+############################################################
+# Unittest fuer evaluation.py
+############################################################
+
+SUBJECTS = ["cars", "cooking", "dogs"]
+
+
+def makeScores(n_documents=300):
+    rnd = numpy.random.RandomState(0)
+    scores = rnd.rand(n_documents, len(SUBJECTS))
+    # Gleichstand, lauter Nullen und eine klare Entscheidung
+    scores[0] = [0.5, 0.5, 0.1]
+    scores[1] = [0.0, 0.0, 0.0]
+    scores[2] = [0.0, 0.9, 0.0]
+    true_subjects = [SUBJECTS[i % 3] for i in range(n_documents - 10)] + ["unknown"] * 10
+    return scores, true_subjects
+
+
+class TestSweepThresholds(unittest.TestCase):
+
+    MIN_DIFFS = [0.05, 0.1, 0.25, 0.5]
+    OTHER_CUTOFFS = [0.0, 0.3, 0.6, 0.9]
+
+    def test_same_as_getWinningSubject(self):
+        scores, true_subjects = makeScores()
+        sweep = evaluation.sweepThresholds(scores, SUBJECTS, true_subjects, self.MIN_DIFFS, self.OTHER_CUTOFFS)
+
+        for d, min_diff in enumerate(self.MIN_DIFFS):
+            for c, other_cutoff in enumerate(self.OTHER_CUTOFFS):
+                params = {"min_difference_for_classification": min_diff, "other_cutoff": other_cutoff}
+                winners = [textverarbeitung.getWinningSubject(dict(zip(SUBJECTS, row)), params)
+                           if row.max() > 0 or other_cutoff > 0 else None
+                           for row in scores]
+                correct = [winner == subject or (winner is None and subject not in SUBJECTS)
+                           for winner, subject in zip(winners, true_subjects)]
+
+                self.assertAlmostEqual(sweep["accuracy"][d, c], numpy.mean(correct))
+                self.assertAlmostEqual(sweep["other_rate"][d, c], numpy.mean([w is None for w in winners]))
+                for i, subject in enumerate(SUBJECTS):
+                    predicted = [w == subject for w in winners]
+                    hits = [w == subject == t for w, t in zip(winners, true_subjects)]
+                    self.assertAlmostEqual(sweep["precision"][i, d, c], sum(hits) / max(sum(predicted), 1))
+                    self.assertAlmostEqual(sweep["recall"][i, d, c], sum(hits) / true_subjects.count(subject))
+
+    def test_best_thresholds(self):
+        scores = numpy.array([[0.9, 0.1], [0.4, 0.35], [0.2, 0.7]])
+        sweep = evaluation.sweepThresholds(scores, ["a", "b"], ["a", "unknown", "b"], [0.0, 0.5], [0.0, 0.5])
+
+        d, c = evaluation.bestThresholds(sweep)
+        self.assertEqual((sweep["min_diff"][d], sweep["other_cutoff"][c]), (0.0, 0.5))
+        self.assertEqual(sweep["accuracy"][d, c], 1.0)
+        self.assertEqual(len(evaluation.sweepRows(sweep)), 4)
+
+    def test_parse_grid(self):
+        numpy.testing.assert_allclose(evaluation.parseGrid("0:0.5:0.1"), [0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+        numpy.testing.assert_allclose(evaluation.parseGrid("0.6,0.2,0.2"), [0.2, 0.6])
+        self.assertRaises(ValueError, evaluation.parseGrid, "0:1:0")
+        self.assertRaises(ValueError, evaluation.parseGrid, "-0.1,0.2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import unittest
+import sys, os
+import io
+import random
+import tempfile
+import contextlib
+import numpy
+
+# Modulsuchpfad erweitern
+THIS_MODULES_PATH = os.path.dirname(__file__)
+TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
+
+sys.path.append(TEST_MODULES_PATH)
+
+# Importiere zu testendes Modul
+import main
+import modelfile
+import textimport
+import textverarbeitung
+from textcache import TextCache
+
+############################################################
+# Unittest fuer main.py
+############################################################
+
+WORDS = {
+    "dogs": ["dog", "bark", "puppy", "leash", "kennel", "bone"],
+    "cats": ["cat", "meow", "whisker", "purr", "litter", "mouse"],
+    "birds": ["bird", "feather", "wing", "nest", "beak", "egg"],
+}
+
+
+# Lernen aus lokalen Textdateien in einem temporären Verzeichnis
+class LearningTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.model_fn = os.path.join(self.directory.name, "learningdata.model")
+        self.random = random.Random(0)
+        self.count = 0
+
+        # eigener, leerer Cache; die Dokumente sind lokale Dateien
+        self.original_cache = textimport.TEXT_CACHE
+        textimport.TEXT_CACHE = TextCache(os.path.join(self.directory.name, "cache.sqlite"), legacy_filename=None)
+
+        self.params = textverarbeitung.getClassificationStdParam()
+        self.params.update({"algorithm": "naive", "tokenizer": "fast", "search_jobs": 1,
+                            "category_base_length": 6})
+
+    def tearDown(self):
+        textimport.TEXT_CACHE.close()
+        textimport.TEXT_CACHE = self.original_cache
+        self.directory.cleanup()
+
+    # Datei mit getaggten Pfaden, je Kategorie n Dokumente aus deren Wörtern
+    def writeDocuments(self, subject, n, words=None):
+        lines = []
+        for _ in range(n):
+            self.count += 1
+            path = os.path.join(self.directory.name, "%s%i.txt" % (subject, self.count))
+            with open(path, "w") as text_file:
+                text_file.write(" ".join(self.random.choices(words or WORDS[subject], k=40)))
+            lines.append("%s | %s\n" % (subject, path))
+
+        tagged_fn = os.path.join(self.directory.name, "tagged%i.txt" % self.count)
+        with open(tagged_fn, "w") as tagged_file:
+            tagged_file.writelines(lines)
+        return tagged_fn
+
+    def run_quietly(self, function, *args):
+        with contextlib.redirect_stdout(io.StringIO()), self.assertLogs(level="INFO") as logs:
+            function(*args)
+        return "\n".join(logs.output)
+
+
+
+class TestUpdate(LearningTestCase):
+
+    def learn(self):
+        files = [self.writeDocuments("dogs", 10), self.writeDocuments("cats", 10)]
+        self.run_quietly(main.doLearning, self.model_fn, files, self.params)
+        return modelfile.loadModel(self.model_fn)
+
+    def test_known_categories_use_partial_fit(self):
+        before = self.learn()
+        tagged_fn = self.writeDocuments("dogs", 2)
+
+        output = self.run_quietly(main.doUpdate, self.model_fn, [tagged_fn], dict(self.params, retrain_threshold=0.5))
+        self.assertIn("Added 2 documents", output)
+        self.assertNotIn("Learning from scratch", output)
+
+        after = modelfile.loadModel(self.model_fn)
+        self.assertEqual(after.subjects, ["cats", "dogs"])
+        self.assertEqual(list(after.base), list(before.base))
+        self.assertEqual(len(after.documents["dogs"]), 12)
+        self.assertEqual(after.documents["cats"], before.documents["cats"])
+        self.assertGreater(sum(after.per_subject_word_freq["dogs"].values()),
+                           sum(before.per_subject_word_freq["dogs"].values()))
+        self.assertEqual(after.per_subject_word_freq["cats"], before.per_subject_word_freq["cats"])
+
+        # ein zweites update mit denselben Dokumenten ändert nichts
+        output = self.run_quietly(main.doUpdate, self.model_fn, [tagged_fn], self.params)
+        self.assertIn("up to date", output)
+
+    def test_changed_base_relearns(self):
+        self.learn()
+        tagged_fn = self.writeDocuments("dogs", 20, ["collie", "terrier", "poodle", "beagle", "spaniel", "husky"])
+
+        output = self.run_quietly(main.doUpdate, self.model_fn, [tagged_fn], dict(self.params, retrain_threshold=0.0))
+        self.assertIn("Learning from scratch: the base changed", output)
+
+        after = modelfile.loadModel(self.model_fn)
+        self.assertIn("terrier", [str(word) for word in after.base])
+        self.assertEqual(len(after.documents["dogs"]), 30)
+
+    def test_new_category_relearns(self):
+        self.learn()
+        tagged_fn = self.writeDocuments("birds", 10)
+
+        output = self.run_quietly(main.doUpdate, self.model_fn, [tagged_fn], self.params)
+        self.assertIn("Learning from scratch: new categories birds", output)
+
+        after = modelfile.loadModel(self.model_fn)
+        self.assertEqual(after.subjects, ["birds", "cats", "dogs"])
+        self.assertEqual([len(after.documents[subject]) for subject in after.subjects], [10, 10, 10])
+        self.assertIn("feather", after.per_subject_word_freq["birds"])
+        self.assertEqual(after.learning_params["algorithm"], "naive")
+
+        scores, subjects = textverarbeitung.compareWordFreqDictsToLearningData(
+            [textverarbeitung.makeWordFrequencyDictionary("bird feather wing nest", "fast")], after, self.params)
+        self.assertEqual(subjects[scores[0].argmax()], "birds")
+
+
+class TestStreamingLearn(LearningTestCase):
+
+    # das geschriebene LearningData abfangen, um auch die Trainingsdaten zu vergleichen
+    def learn(self, files, **params):
+        written = []
+        original = main.writeLearningDataToFile
+        main.writeLearningDataToFile = lambda learning_data, filename: written.append(learning_data)
+        try:
+            self.run_quietly(main.doLearning, self.model_fn, files, dict(self.params, **params))
+        finally:
+            main.writeLearningDataToFile = original
+        return written[0]
+
+    def test_same_as_in_memory(self):
+        files = [self.writeDocuments("dogs", 10), self.writeDocuments("cats", 10), self.writeDocuments("birds", 10)]
+
+        for algorithm in ["naive", "bayes"]:
+            in_memory = self.learn(files, algorithm=algorithm)
+            streamed = self.learn(files, algorithm=algorithm, streaming=True)
+
+            self.assertEqual(list(streamed.base), list(in_memory.base))
+            self.assertEqual(streamed.target, in_memory.target)
+            self.assertEqual(streamed.documents, in_memory.documents)
+            self.assertEqual(streamed.per_subject_word_freq, in_memory.per_subject_word_freq)
+            self.assertTrue(numpy.allclose(streamed.data.toarray(), in_memory.data.toarray()))
+
+    def test_feature_directory_is_removed_on_errors(self):
+        files = [self.writeDocuments("dogs", 10), self.writeDocuments("cats", 10)]
+
+        def fail(learning_data, filename):
+            raise OSError("disk full")
+        original = main.writeLearningDataToFile
+        main.writeLearningDataToFile = fail
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertRaises(OSError, main.doLearning, self.model_fn, files, dict(self.params, streaming=True))
+        finally:
+            main.writeLearningDataToFile = original
+
+        self.assertEqual([name for name in os.listdir(self.directory.name) if name.startswith(".features-")], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import unittest
+import sys, os
+import json
+import numpy
+import tempfile
+import threading
+
+# Modulsuchpfad erweitern
+THIS_MODULES_PATH = os.path.dirname(__file__)
+TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
+
+sys.path.append(TEST_MODULES_PATH)
+
+# Importiere zu testendes Modul
+import modelfile
+import textverarbeitung
+from classification import DummyScaler, SelfmadeNaive
+from sortedcontainers import SortedSet
+
+############################################################
+# Unittest fuer modelfile.py
+############################################################
+
+
+class LearningDataStub:
+    pass
+
+
+def makeLearningData(target=['dogs', 'pigs']):
+    learning_data = LearningDataStub()
+    learning_data.base = SortedSet(['bark', 'dog', 'pig', 'whistl'])
+    learning_data.data = numpy.array([[0.5, 0.5, 0.0, 0.0], [0.0, 0.0, 0.5, 0.5]])
+    learning_data.target = target
+    learning_data.tokenizer = "fast"
+    learning_data.sparse = False
+    learning_data.scaler = DummyScaler()
+    learning_data.classifier = SelfmadeNaive().fit(learning_data.data, target)
+    learning_data.stem_table = {"barking": "bark", "dogs": "dog"}
+    return learning_data
+
+
+class TestModelFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.model_fn = os.path.join(self.directory.name, "learningdata.model")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_roundtrip(self):
+        learning_data = makeLearningData()
+        modelfile.writeModel(learning_data, self.model_fn)
+
+        self.assertTrue(modelfile.isModel(self.model_fn))
+        model = modelfile.loadModel(self.model_fn)
+
+        self.assertEqual(list(model.base), list(learning_data.base))
+        self.assertEqual(model.subjects, ['dogs', 'pigs'])
+        self.assertEqual(model.tokenizer, "fast")
+        self.assertEqual(model.stem_table, learning_data.stem_table)
+        self.assertFalse(hasattr(model, "data"))
+
+        freqs = [{'dog': 0.5, 'bark': 0.5}, {'pig': 1.0}]
+        params = textverarbeitung.getClassificationStdParam()
+        expected, _ = textverarbeitung.compareWordFreqDictsToLearningData(freqs, learning_data, params)
+        scores, subjects = textverarbeitung.compareWordFreqDictsToLearningData(freqs, model, params)
+        self.assertEqual(subjects, ['dogs', 'pigs'])
+        self.assertTrue(numpy.allclose(scores, expected))
+
+    def test_arrays_are_memory_mapped(self):
+        modelfile.writeModel(makeLearningData(), self.model_fn)
+        model = modelfile.loadModel(self.model_fn)
+
+        self.assertIsInstance(model.base, numpy.memmap)
+        self.assertFalse(model.classifier.category_mask.flags.owndata)
+
+    def test_overwrite_existing_model(self):
+        modelfile.writeModel(makeLearningData(), self.model_fn)
+        modelfile.writeModel(makeLearningData(['hounds', 'swine']), self.model_fn)
+
+        self.assertEqual(modelfile.loadModel(self.model_fn).subjects, ['hounds', 'swine'])
+        modelfile.writeModel(makeLearningData(['cats', 'mice']), self.model_fn)
+
+        # der Link und höchstens die aktuelle und die vorige Version
+        names = os.listdir(self.directory.name)
+        self.assertEqual([name for name in names if not name.startswith(".")], ["learningdata.model"])
+        self.assertEqual(len(names), 3)
+        self.assertTrue(os.path.islink(self.model_fn))
+
+    def test_replaces_old_model_directory(self):
+        os.makedirs(self.model_fn)
+        with open(os.path.join(self.model_fn, "stale"), "w"):
+            pass
+        modelfile.writeModel(makeLearningData(), self.model_fn)
+
+        self.assertTrue(os.path.islink(self.model_fn))
+        self.assertEqual(modelfile.loadModel(self.model_fn).subjects, ['dogs', 'pigs'])
+
+    def test_readers_never_see_a_missing_model(self):
+        modelfile.writeModel(makeLearningData(), self.model_fn)
+        errors = []
+        done = threading.Event()
+
+        def read():
+            while not done.is_set():
+                try:
+                    modelfile.loadModel(self.model_fn)
+                except Exception as e:
+                    errors.append(e)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        for i in range(20):
+            modelfile.writeModel(makeLearningData(['dogs%i' % i, 'pigs']), self.model_fn)
+        done.set()
+        reader.join()
+
+        self.assertEqual(errors, [])
+
+    def test_training_state_roundtrip(self):
+        learning_data = makeLearningData()
+        learning_data.per_subject_word_freq = {'dogs': {'bark': 2.0, 'dog': 1.5}, 'pigs': {'pig': 3.0}}
+        learning_data.documents = {'dogs': ['http://a/dog'], 'pigs': ['http://a/pig', 'http://b/pig']}
+        learning_data.learning_params = {'algorithm': 'naive', 'category_base_length': 20}
+        modelfile.writeModel(learning_data, self.model_fn)
+
+        model = modelfile.loadModel(self.model_fn)
+        self.assertTrue(model.hasTrainingState())
+        self.assertEqual(model.per_subject_word_freq, learning_data.per_subject_word_freq)
+        self.assertEqual(model.documents, learning_data.documents)
+        self.assertEqual(model.learning_params, learning_data.learning_params)
+
+    def test_without_training_state(self):
+        modelfile.writeModel(makeLearningData(), self.model_fn)
+
+        model = modelfile.loadModel(self.model_fn)
+        self.assertFalse(model.hasTrainingState())
+        self.assertIsNone(model.per_subject_word_freq)
+
+    def test_hashing_roundtrip(self):
+        from sklearn.linear_model import SGDClassifier
+
+        index = textverarbeitung.HashingIndex(bits=8, signed=True)
+        freqs = [{'dog': 0.5, 'bark': 0.5}, {'pig': 1.0, 'whistl': 0.5}]
+        learning_data = makeLearningData()
+        learning_data.base = SortedSet()
+        learning_data.hashing = index.params()
+        learning_data.sparse = True
+        learning_data.data = textverarbeitung.getClassificationMatrix(index, freqs)
+        learning_data.classifier = SGDClassifier(loss="log_loss", random_state=0).fit(learning_data.data, learning_data.target)
+        modelfile.writeModel(learning_data, self.model_fn)
+
+        model = modelfile.loadModel(self.model_fn)
+        self.assertEqual(model.meta["version"], 2)
+        self.assertEqual(len(model.base), 0)
+        self.assertIsInstance(model.base_index, textverarbeitung.HashingIndex)
+        self.assertEqual(model.base_index.params(), {"bits": 8, "signed": True})
+
+        params = textverarbeitung.getClassificationStdParam()
+        expected, _ = textverarbeitung.compareWordFreqDictsToLearningData(freqs, learning_data, params)
+        scores, subjects = textverarbeitung.compareWordFreqDictsToLearningData(freqs, model, params)
+        self.assertTrue(numpy.allclose(scores, expected))
+
+    def test_newer_version_is_rejected(self):
+        modelfile.writeModel(makeLearningData(), self.model_fn)
+
+        meta_fn = os.path.join(self.model_fn, modelfile.META_FILENAME)
+        with open(meta_fn) as meta_file:
+            meta = json.load(meta_file)
+        meta["version"] = modelfile.FORMAT_VERSION + 1
+        with open(meta_fn, "w") as meta_file:
+            json.dump(meta, meta_file)
+
+        self.assertRaises(ValueError, modelfile.loadModel, self.model_fn)
+
+
+if __name__ == '__main__':
+    unittest.main()
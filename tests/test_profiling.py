@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import unittest
+import sys, os
+import json
+import logging
+import tempfile
+
+# Modulsuchpfad erweitern
+THIS_MODULES_PATH = os.path.dirname(__file__)
+TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
+
+sys.path.append(TEST_MODULES_PATH)
+
+# Importiere zu testendes Modul
+import profiling
+
+############################################################
+# Unittest fuer profiling.py
+############################################################
+
+
+class TestProfiling(unittest.TestCase):
+
+    def tearDown(self):
+        profiling.reset()
+        profiling.ENABLED = False
+
+    def test_disabled_records_nothing(self):
+        with profiling.span("tokenize"):
+            pass
+        profiling.addDocument(tokens=3)
+
+        report = profiling.getReport()
+        self.assertEqual(report["spans"], {})
+        self.assertEqual(report["documents"]["count"], 0)
+
+    def test_spans_and_documents(self):
+        profiling.enable()
+        for _ in range(3):
+            with profiling.span("tokenize"):
+                pass
+        profiling.addDocument(tokens=3, unique_stems=2)
+        profiling.addDocument(tokens=5, unique_stems=4)
+
+        report = profiling.getReport()
+        self.assertEqual(report["spans"]["tokenize"]["count"], 3)
+        self.assertEqual(report["documents"]["summary"]["tokens"]["total"], 8)
+        self.assertEqual(report["documents"]["summary"]["unique_stems"]["max"], 4)
+
+    def test_merge_snapshot(self):
+        profiling.enable()
+        with profiling.span("stem"):
+            pass
+        snapshot = profiling.collect()
+        self.assertEqual(profiling.getReport()["spans"], {})
+
+        profiling.merge(snapshot)
+        profiling.merge(snapshot)
+        self.assertEqual(profiling.getReport()["spans"]["stem"]["count"], 2)
+
+    def test_write_report(self):
+        profiling.enable()
+        profiling.count("fetched_bytes", 10)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "profile.json")
+            profiling.writeReport(filename)
+            with open(filename) as report_file:
+                self.assertEqual(json.load(report_file)["counters"], {"fetched_bytes": 10})
+
+    def test_pretty_format_is_lazy(self):
+        class Unprintable:
+            def __repr__(self):
+                raise AssertionError("formatted")
+
+        logger = logging.getLogger("test_profiling")
+        logger.setLevel(logging.INFO)
+        # wird nicht ausgegeben, also auch nicht formatiert
+        logger.debug("%s", profiling.PrettyFormat(Unprintable()))
+
+        self.assertRaises(AssertionError, str, profiling.PrettyFormat(Unprintable()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import unittest
+import sys, os
+import numpy
+import scipy.sparse
+import tempfile
+
+# Modulsuchpfad erweitern
+THIS_MODULES_PATH = os.path.dirname(__file__)
+TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
+
+sys.path.append(TEST_MODULES_PATH)
+
+# Importiere zu testendes Modul
+import search
+from textcache import FoldCache
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.svm import SVC
+
+############################################################
+# Unittest fuer search.py
+############################################################
+
+
+def makeDataset(n_samples=90, n_features=12):
+    rnd = numpy.random.RandomState(0)
+    y = numpy.array(['cars', 'dogs', 'pigs'])[numpy.arange(n_samples) % 3]
+    X = rnd.rand(n_samples, n_features)
+    # jede Kategorie hat ein eigenes, häufiges Wort
+    X[numpy.arange(n_samples), numpy.arange(n_samples) % 3] += 2.0
+    return X, y
+
+
+class CountingNB(MultinomialNB):
+    fits = 0
+
+    def fit(self, X, y, sample_weight=None):
+        CountingNB.fits += 1
+        return super().fit(X, y, sample_weight)
+
+
+class TestGridSearch(unittest.TestCase):
+
+    GRID = {'alpha': [0.5, 1.0], 'fit_prior': [True, False]}
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        CountingNB.fits = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_each_fit_once_for_all_metrics(self):
+        X, y = makeDataset()
+        result = search.gridSearch(CountingNB(), self.GRID, X, y, cv=5)
+
+        # 4 Kombinationen x 5 Folds und der abschließende Fit auf allen Daten
+        self.assertEqual(CountingNB.fits, 4 * 5 + 1)
+        self.assertEqual(len(result.cv_results_['mean_test_precision']), 4)
+        self.assertEqual(len(result.cv_results_['mean_test_recall']), 4)
+        self.assertIn(result.best_params_, result.cv_results_['params'])
+        self.assertEqual(list(result.predict(X[:3])), ['cars', 'dogs', 'pigs'])
+
+    def test_fold_cache(self):
+        X, y = makeDataset()
+        cache = FoldCache(os.path.join(self.directory.name, "cache.sqlite"))
+
+        first = search.gridSearch(CountingNB(), self.GRID, X, y, cv=5, cache=cache)
+        CountingNB.fits = 0
+        second = search.gridSearch(CountingNB(), self.GRID, X, y, cv=5, cache=cache)
+
+        self.assertEqual(CountingNB.fits, 1)
+        self.assertEqual(cache.hits, 20)
+        self.assertEqual(second.cv_results_['mean_test_precision'], first.cv_results_['mean_test_precision'])
+        self.assertEqual(second.best_params_, first.best_params_)
+
+        # andere Daten, andere Schlüssel
+        search.gridSearch(CountingNB(), self.GRID, X * 2, y, cv=5, cache=cache)
+        self.assertEqual(cache.misses, 40)
+        cache.close()
+
+    def test_dataset_hash(self):
+        X, y = makeDataset()
+        self.assertEqual(search.hashDataset(X, y), search.hashDataset(X.copy(), list(y)))
+        self.assertEqual(search.hashDataset(scipy.sparse.csr_matrix(X), y),
+                         search.hashDataset(scipy.sparse.csr_matrix(X), y))
+        self.assertNotEqual(search.hashDataset(X, y), search.hashDataset(X, y[::-1]))
+
+
+class TestHalvingSearch(unittest.TestCase):
+
+    def test_rounds_grow_and_end_on_all_data(self):
+        X, y = makeDataset(n_samples=270)
+        grid = {'kernel': ['linear', 'rbf'], 'C': [0.01, 0.1, 1, 10, 100]}
+        result = search.halvingSearch(SVC(), grid, X, y, cv=3)
+
+        rounds = sorted(set(zip(result.cv_results_['iter'], result.cv_results_['n_resources'])))
+        self.assertEqual([n_resources for iteration, n_resources in rounds], [30, 90, 270])
+        self.assertEqual(result.cv_results_['iter'].count(0), 10)
+        self.assertEqual(result.cv_results_['iter'].count(2), 2)
+        self.assertIn(result.best_params_, result.cv_results_['params'])
+
+    def test_small_dataset_uses_full_grid(self):
+        X, y = makeDataset(n_samples=30)
+        result = search.halvingSearch(MultinomialNB(), {'alpha': [0.5, 1.0, 2.0, 4.0]}, X, y, cv=5)
+
+        self.assertEqual(set(result.cv_results_['n_resources']), {30})
+        self.assertEqual(len(result.cv_results_['params']), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
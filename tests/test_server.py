@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import unittest
+import sys, os
+import numpy
+import pickle
+import tempfile
+import threading
+import json
+import http.client
+import time
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Modulsuchpfad erweitern
+THIS_MODULES_PATH = os.path.dirname(__file__)
+TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
+
+sys.path.append(TEST_MODULES_PATH)
+
+# Importiere zu testendes Modul
+import server
+import textimport
+import textverarbeitung
+from textcache import TextCache
+from classification import DummyScaler, SelfmadeNaive
+from sortedcontainers import SortedSet
+
+############################################################
+# Unittest fuer server.py
+############################################################
+
+
+class LearningDataStub:
+    pass
+
+
+def makeLearningData(target):
+    learning_data = LearningDataStub()
+    learning_data.base = SortedSet(['bark', 'dog', 'pig', 'whistl'])
+    learning_data.target = target
+    learning_data.tokenizer = "fast"
+    learning_data.scaler = DummyScaler()
+    learning_data.classifier = SelfmadeNaive().fit(
+        numpy.array([[0.5, 0.5, 0.0, 0.0], [0.0, 0.0, 0.5, 0.5]]), target)
+    return learning_data
+
+
+def loadLearningData(filename):
+    with open(filename, "rb") as learning_data_file:
+        return pickle.load(learning_data_file)
+
+
+# antwortet erst, wenn server.release gesetzt ist
+class SlowPageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.release.wait(10)
+        body = b"<html><body><p>My pigs whistle. The pigs whistle again.</p></body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestClassificationServer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.learning_data_fn = os.path.join(self.directory.name, "learningdata.obj")
+        self.writeLearningData(['dogs', 'pigs'])
+
+        self.params = textverarbeitung.getClassificationStdParam()
+        self.params["other_cutoff"] = 0.0
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server.batcher.stop()
+        self.thread.join()
+        self.directory.cleanup()
+
+    def writeLearningData(self, target):
+        with open(self.learning_data_fn + ".tmp", "wb") as learning_data_file:
+            pickle.dump(makeLearningData(target), learning_data_file)
+        os.replace(self.learning_data_fn + ".tmp", self.learning_data_fn)
+
+    def startServer(self, address, batch_wait=server.BATCH_WAIT):
+        self.server = server.makeServer(address, self.learning_data_fn, loadLearningData, self.params,
+                                        batch_wait=batch_wait)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+        if isinstance(self.server.server_address, tuple):
+            return "%s:%i" % self.server.server_address[:2]
+        return self.server.server_address
+
+    def writeText(self, name, text):
+        filename = os.path.join(self.directory.name, name)
+        with open(filename, "w") as text_file:
+            text_file.write(text)
+        return filename
+
+    def test_same_scores_as_local_classification(self):
+        address = self.startServer("127.0.0.1:0")
+        text = "The dog barks. The dog barks again."
+
+        result = server.classifyRemote(address, [self.writeText("dog.txt", text)])[0]
+
+        expected = textverarbeitung.compareWordFreqDictToLearningData(
+            textverarbeitung.makeWordFrequencyDictionary(text, "fast"), makeLearningData(['dogs', 'pigs']), self.params)
+        self.assertEqual(result["scores"].keys(), expected.keys())
+        self.assertTrue(numpy.allclose(list(result["scores"].values()), list(expected.values())))
+        self.assertEqual(result["winner"], textverarbeitung.getWinningSubject(expected, self.params))
+        self.assertEqual(result["winner"], "dogs")
+
+    def test_concurrent_requests_are_batched(self):
+        address = self.startServer(os.path.join(self.directory.name, "server.sock"), batch_wait=0.5)
+        paths = [self.writeText("dog.txt", "The dog barks."), self.writeText("pig.txt", "My pigs whistle.")]
+
+        results = {}
+        def classify(path):
+            results[path] = server.classifyRemote(address, [path])[0]["winner"]
+        threads = [threading.Thread(target=classify, args=(path,)) for path in paths]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {paths[0]: "dogs", paths[1]: "pigs"})
+        self.assertEqual(self.server.batcher.batches, 1)
+
+    def test_reload_on_change(self):
+        address = self.startServer("127.0.0.1:0")
+        path = self.writeText("dog.txt", "The dog barks.")
+        self.assertEqual(server.classifyRemote(address, [path])[0]["winner"], "dogs")
+
+        self.writeLearningData(['hounds', 'swine'])
+        self.assertEqual(server.classifyRemote(address, [path])[0]["winner"], "hounds")
+
+    def test_slow_url_does_not_block_texts(self):
+        page_server = ThreadingHTTPServer(("127.0.0.1", 0), SlowPageHandler)
+        page_server.release = threading.Event()
+        threading.Thread(target=page_server.serve_forever, daemon=True).start()
+        original_cache = textimport.TEXT_CACHE
+        textimport.TEXT_CACHE = TextCache(os.path.join(self.directory.name, "cache.sqlite"), legacy_filename=None)
+        try:
+            address = self.startServer("127.0.0.1:0")
+            url = "http://127.0.0.1:%i/slow" % page_server.server_address[1]
+
+            results = {}
+            thread = threading.Thread(target=lambda: results.update(url=server.classifyRemote(address, [url])[0]))
+            thread.start()
+            time.sleep(0.2)
+
+            # während die URL noch lädt, wird der Text schon beantwortet
+            path = self.writeText("dog.txt", "The dog barks.")
+            self.assertEqual(server.classifyRemote(address, [path], timeout=5)[0]["winner"], "dogs")
+            self.assertTrue(thread.is_alive())
+
+            page_server.release.set()
+            thread.join()
+            self.assertEqual(results["url"]["winner"], "pigs")
+        finally:
+            page_server.release.set()
+            page_server.shutdown()
+            page_server.server_close()
+            textimport.TEXT_CACHE.close()
+            textimport.TEXT_CACHE = original_cache
+
+    def test_invalid_text_fails_only_its_document(self):
+        address = self.startServer("127.0.0.1:0", batch_wait=0.5)
+        host, port = address.rsplit(":", 1)
+
+        def post(documents):
+            con = http.client.HTTPConnection(host, int(port), timeout=10)
+            try:
+                con.request("POST", "/classify", body=json.dumps({"documents": documents}),
+                            headers={"Content-Type": "application/json"})
+                return json.loads(con.getresponse().read())["results"]
+            finally:
+                con.close()
+
+        results = {}
+        threads = [threading.Thread(target=lambda: results.update(good=post([{"text": "The dog barks."}]))),
+                   threading.Thread(target=lambda: results.update(bad=post([{"text": 5}, {"text": ["pig"]}])))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results["good"][0]["winner"], "dogs")
+        self.assertEqual(results["bad"], [{"error": '"text" must be a string'}] * 2)
+
+        # auch direkt an den MicroBatcher übergeben scheitert nur das ungültige Dokument
+        results = self.server.batcher.classify([{"text": 5}, {"text": "My pigs whistle."}])
+        self.assertEqual(results[0], {"error": '"text" must be a string'})
+        self.assertEqual(results[1]["winner"], "pigs")
+
+    def test_missing_text(self):
+        address = self.startServer("127.0.0.1:0")
+        result = server.classifyRemote(address, [os.path.join(self.directory.name, "missing.txt")])[0]
+        self.assertEqual(result, {"error": "no text"})
+
+
+if __name__ == '__main__':
+    unittest.main()
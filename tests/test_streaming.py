@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import unittest
+import sys, os
+import random
+import tempfile
+import tracemalloc
+import mmap
+import numpy
+
+# Modulsuchpfad erweitern
+THIS_MODULES_PATH = os.path.dirname(__file__)
+TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
+
+sys.path.append(TEST_MODULES_PATH)
+
+# Importiere zu testendes Modul
+import streaming
+import textverarbeitung
+from sklearn.preprocessing import StandardScaler
+
+############################################################
+# Unittest fuer streaming.py
+############################################################
+
+
+# künstliche Dokumente als (Kategorie, URL, Worthäufigkeiten), werden erst beim Lesen erzeugt
+def makeTaggedFreqs(n_documents, n_words=5000, words_per_document=300, seed=0):
+    rnd = random.Random(seed)
+    subjects = ["cars", "dogs", "pigs"]
+    words = ["word%i" % i for i in range(n_words)]
+    for document in range(n_documents):
+        freq = {}
+        for word in rnd.choices(words, k=words_per_document):
+            freq[word] = freq.get(word, 0) + 1
+        yield subjects[document % len(subjects)], "http://localhost/%i" % document, freq
+
+
+# beide Durchläufe, liefert die Matrix und den höchsten zusätzlichen Speicherbedarf
+def runBothPasses(n_documents, directory):
+    tracemalloc.start()
+    per_subject_word_freq, documents = streaming.sumPerSubject(makeTaggedFreqs(n_documents))
+    vocabulary = textverarbeitung.VocabularyMatrix(per_subject_word_freq)
+    base = textverarbeitung.buildClassificationSpaceBase(
+        per_subject_word_freq, textverarbeitung.getClassificationStdParam(), vocabulary)
+    base_index = textverarbeitung.getBaseIndex(base)
+
+    writer = streaming.FeatureMatrixWriter(directory, len(base_index))
+    target = streaming.writeFeatureRows(makeTaggedFreqs(n_documents), base_index, writer)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return writer.close(), target, peak
+
+
+# liegt das Array in einer per mmap eingeblendeten Datei?
+def isMapped(array):
+    while array is not None and not isinstance(array, mmap.mmap):
+        array = getattr(array, "base", None)
+    return array is not None
+
+
+class TestFeatureMatrixWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        tagged_freqs = list(makeTaggedFreqs(50, n_words=200, words_per_document=30))
+        self.freqs = [freq for subject, url, freq in tagged_freqs]
+        self.subjects = [subject for subject, url, freq in tagged_freqs]
+        self.base_index = textverarbeitung.getBaseIndex(["word%i" % i for i in range(0, 200, 3)])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, sparse):
+        writer = streaming.FeatureMatrixWriter(self.directory.name, len(self.base_index), sparse)
+        target = streaming.writeFeatureRows(zip(self.subjects, range(len(self.freqs)), self.freqs),
+                                            self.base_index, writer, batch_rows=7)
+        return writer.close(), target
+
+    def test_sparse_same_as_in_memory(self):
+        matrix, target = self.write(sparse=True)
+        expected = textverarbeitung.getClassificationMatrix(self.base_index, self.freqs)
+
+        self.assertEqual(target, self.subjects)
+        self.assertEqual(matrix.shape, expected.shape)
+        self.assertTrue(isMapped(matrix.data))
+        numpy.testing.assert_array_equal(matrix.toarray(), expected.toarray())
+
+    def test_dense_same_as_in_memory(self):
+        matrix, target = self.write(sparse=False)
+        expected = textverarbeitung.getClassificationMatrix(self.base_index, self.freqs)
+
+        self.assertIsInstance(matrix, numpy.memmap)
+        numpy.testing.assert_array_equal(matrix, expected.toarray())
+
+    def test_scaling_in_place(self):
+        for sparse, scaler in [(True, StandardScaler(with_mean=False)), (False, StandardScaler())]:
+            matrix, target = self.write(sparse)
+            expected = textverarbeitung.getClassificationMatrix(self.base_index, self.freqs)
+            if not sparse:
+                expected = expected.toarray()
+            expected = StandardScaler(with_mean=not sparse).fit_transform(expected)
+
+            scaled = streaming.fitTransformInPlace(scaler, matrix, batch_rows=11)
+            if sparse:
+                scaled, expected = scaled.toarray(), expected.toarray()
+            numpy.testing.assert_allclose(scaled, expected, rtol=1e-10, atol=1e-12)
+
+
+class TestBoundedMemory(unittest.TestCase):
+
+    def test_peak_memory_independent_of_corpus_size(self):
+        with tempfile.TemporaryDirectory() as small_directory, tempfile.TemporaryDirectory() as large_directory:
+            # beide Korpora sind größer als ein Paket von streaming.BATCH_ROWS Zeilen
+            small, small_target, small_peak = runBothPasses(600, small_directory)
+            large, large_target, large_peak = runBothPasses(2400, large_directory)
+
+            self.assertEqual(large.shape[0], 2400)
+            self.assertEqual(len(large_target), 2400)
+
+            # nur die Liste der URLs und die Kategorien der Zeilen wachsen mit,
+            # jedes Dokument belegt selbst schon mehr als 10 kB als dict
+            per_document = (large_peak - small_peak) / (2400 - 600)
+            self.assertLess(per_document, 256)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import unittest
+import sys, os
+import pickle
+import tempfile
+import multiprocessing
+import sqlite3
+
+# Modulsuchpfad erweitern
+THIS_MODULES_PATH = os.path.dirname(__file__)
+TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
+
+sys.path.append(TEST_MODULES_PATH)
+
+# Importiere zu testendes Modul
+from textcache import *
+
+############################################################
+# Unittest fuer textcache.py
+############################################################
+
+def writeEntries(filename, prefix):
+    cache = TextCache(filename, legacy_filename=None)
+    for i in range(50):
+        cache["%s%i" % (prefix, i)] = "text %i" % i
+    cache.close()
+
+
+class TestTextCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "cache.sqlite")
+        self.legacy_filename = os.path.join(self.directory.name, "textcache")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def makeCache(self, **params):
+        cache = TextCache(self.filename, legacy_filename=self.legacy_filename, **params)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_store_and_load(self):
+        cache = self.makeCache()
+        cache["http://a"] = "Hallo Welt"
+
+        self.assertIn("http://a", cache)
+        self.assertNotIn("http://b", cache)
+        self.assertEqual(cache["http://a"], "Hallo Welt")
+        self.assertEqual(cache.get("http://b", ""), "")
+        self.assertRaises(KeyError, lambda: cache["http://b"])
+
+    def test_entries_are_persistent(self):
+        cache = self.makeCache(compress=False)
+        cache["http://a"] = "uncompressed"
+        cache.close()
+
+        cache = self.makeCache(compress=True)
+        cache["http://b"] = "compressed " * 100
+
+        self.assertEqual(list(cache), ["http://a", "http://b"])
+        self.assertEqual(cache["http://a"], "uncompressed")
+        self.assertEqual(cache["http://b"], "compressed " * 100)
+
+    def test_validators(self):
+        cache = self.makeCache()
+        cache.put("http://a", "Hallo", etag='"1"', last_modified="Sun, 18 Oct 2026 10:00:00 GMT")
+        cache["http://b"] = "Welt"
+
+        self.assertEqual(cache.validators("http://a"), ('"1"', "Sun, 18 Oct 2026 10:00:00 GMT"))
+        self.assertEqual(cache.validators("http://b"), (None, None))
+        self.assertIsNone(cache.validators("http://c"))
+
+        cache.revalidated("http://a", etag='"2"')
+        self.assertEqual(cache.validators("http://a"), ('"2"', "Sun, 18 Oct 2026 10:00:00 GMT"))
+        self.assertEqual(cache["http://a"], "Hallo")
+
+    def test_adds_validator_columns_to_old_databases(self):
+        con = sqlite3.connect(self.filename)
+        con.execute("CREATE TABLE texts (url TEXT PRIMARY KEY, compressed INTEGER NOT NULL, data BLOB NOT NULL, "
+                    "size INTEGER NOT NULL, stored REAL NOT NULL, accessed REAL NOT NULL)")
+        con.execute("INSERT INTO texts VALUES ('http://a', 0, ?, 5, 0, 0)", (b"Hallo",))
+        con.commit()
+        con.close()
+
+        cache = self.makeCache()
+        self.assertEqual(cache["http://a"], "Hallo")
+        self.assertEqual(cache.validators("http://a"), (None, None))
+
+    def test_delete(self):
+        cache = self.makeCache()
+        cache["http://a"] = "a"
+        del cache["http://a"]
+
+        self.assertEqual(len(cache), 0)
+
+    def test_evict_by_age(self):
+        cache = self.makeCache()
+        cache["http://a"] = "a"
+
+        self.assertEqual(cache.evict(max_age=3600), 0)
+        self.assertEqual(cache.evict(max_age=-1), 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_evict_by_size_drops_least_recently_used(self):
+        cache = self.makeCache(compress=False)
+        for url in ["http://a", "http://b", "http://c"]:
+            cache[url] = "x" * 100
+        cache["http://a"]
+
+        cache.evict(max_size=250)
+        self.assertEqual(list(cache), ["http://a", "http://c"])
+
+    def test_access_times_are_written_in_batches(self):
+        cache = self.makeCache()
+        cache["http://a"] = "Hallo"
+        changes = cache._connection().total_changes
+
+        cache["http://a"]
+        self.assertEqual(cache._connection().total_changes, changes)
+
+        cache.close()
+        con = sqlite3.connect(self.filename)
+        stored, accessed = con.execute("SELECT stored, accessed FROM texts").fetchone()
+        con.close()
+        self.assertGreater(accessed, stored)
+
+    def test_migrates_legacy_pickle(self):
+        with open(self.legacy_filename, mode="wb") as legacy_file:
+            pickle.dump({"http://a": "alt", "http://b": "auch alt"}, legacy_file)
+
+        cache = self.makeCache()
+        self.assertEqual(cache["http://b"], "auch alt")
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(os.path.exists(self.legacy_filename))
+
+    def test_concurrent_processes(self):
+        self.makeCache()["init"] = ""
+
+        processes = [multiprocessing.Process(target=writeEntries, args=(self.filename, prefix))
+                     for prefix in ["a", "b", "c"]]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        self.assertEqual(len(self.makeCache()), 151)
+
+
+class TestFrequencyCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = FrequencyCache(os.path.join(self.directory.name, "cache.sqlite"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_counts_hits_and_misses(self):
+        self.assertIsNone(self.cache.get("key"))
+        self.cache.put("key", {"pig": 0.5, "whistl": 0.25})
+
+        self.assertEqual(self.cache.get("key"), {"pig": 0.5, "whistl": 0.25})
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_evict_by_age(self):
+        self.cache.put("key", {})
+
+        self.assertEqual(self.cache.evict(), 0)
+        self.assertEqual(self.cache.evict(max_age=-1), 1)
+        self.assertIsNone(self.cache.get("key"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,15 @@
 
 import unittest
 import sys, os
+import threading
+import tempfile
+import json
+import tarfile
+import zipfile
+import gzip
+import zlib
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 # Modulsuchpfad erweitern
 THIS_MODULES_PATH = os.path.dirname(__file__)
@@ -11,6 +20,8 @@ TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
 sys.path.append(TEST_MODULES_PATH)
 
 # Importiere zu testendes Modul
+import textimport
+import profiling
 from textimport import *
 
 ############################################################
@@ -31,5 +42,315 @@ class TestGetUrlsPerSubjectFromFile(unittest.TestCase):
         }
         self.assertEqual(get_urls_per_subject_from_file(INPUT_FILE), CONTEXT)
 
+
+class TestExtractTextFromHtml(unittest.TestCase):
+
+    PAGE = b"""<html><head><title>Titel</title><style>p { color: red; }</style></head>
+<body><script>var x = 1;</script><!-- Kommentar --><div><p>Dogs bark at the postman every morning, when he brings the letters to the house.</p>
+<p>The postman runs away, because the dogs are loud and the garden gate is always open.</p></div><noscript>Please enable JavaScript</noscript></body></html>"""
+
+    def test_lxml_drops_invisible_elements(self):
+        text = extract_text_from_html(self.PAGE, "http://localhost/", "lxml")
+        self.assertEqual(text.split("\n"), [
+            "Dogs bark at the postman every morning, when he brings the letters to the house.",
+            "The postman runs away, because the dogs are loud and the garden gate is always open."])
+
+    def test_extractors_agree_on_simple_page(self):
+        texts = [" ".join(extract_text_from_html(self.PAGE, "http://localhost/", extractor).split())
+                 for extractor in EXTRACTORS]
+        self.assertEqual(set(texts), {"Dogs bark at the postman every morning, when he brings the letters to the house. "
+                                      "The postman runs away, because the dogs are loud and the garden gate is always open."})
+
+    def test_unknown_extractor(self):
+        self.assertRaises(ValueError, set_extractor, "regex")
+
+
+############################################################
+# lokaler HTTP-Server als Ersatz für echte Webseiten
+############################################################
+
+TEST_PAGE = b"""<html><head><title>Titel</title><script>var x = 1;</script></head>
+<body><div><p>Pigs whistle loudly when they are happy and the farmer listens to them every day.</p>
+<p>Happy pigs whistle again and again, and the farmer keeps listening.</p></div></body></html>"""
+
+class TestLocalCorpus(unittest.TestCase):
+
+    DOCUMENTS = [("cars", "engine.txt", "The engine needs new oil."),
+                 ("cars", "wheel.txt", "A wheel with a flat tyre."),
+                 ("dogs", "puppy.txt", "The puppy barks at the postman \u00e0 la maison.")]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, "corpus")
+        for subject, name, text in self.DOCUMENTS:
+            os.makedirs(os.path.join(self.root, subject), exist_ok=True)
+            with open(os.path.join(self.root, subject, name), "w", encoding="utf-8") as text_file:
+                text_file.write(text)
+        # ohne Kategorie bzw. versteckt, wird übergangen
+        with open(os.path.join(self.root, "README"), "w") as text_file:
+            text_file.write("not a document")
+        with open(os.path.join(self.root, "dogs", ".hidden"), "w") as text_file:
+            text_file.write("not a document")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def expected(self):
+        return sorted((subject, text) for subject, name, text in self.DOCUMENTS)
+
+    def read(self, path):
+        return sorted((subject, text) for subject, identifier, text in iter_corpus(path))
+
+    def test_directory(self):
+        self.assertTrue(is_corpus(self.root))
+        self.assertEqual(self.read(self.root), self.expected())
+        identifiers = [identifier for subject, identifier, text in iter_corpus(self.root)]
+        self.assertIn(os.path.join(self.root, "cars", "engine.txt"), identifiers)
+
+    def test_archives(self):
+        tar_fn = os.path.join(self.directory.name, "corpus.tar.gz")
+        with tarfile.open(tar_fn, "w:gz") as archive:
+            for subject in ["cars", "dogs"]:
+                archive.add(os.path.join(self.root, subject), "corpus/" + subject)
+        zip_fn = os.path.join(self.directory.name, "corpus.zip")
+        with zipfile.ZipFile(zip_fn, "w") as archive:
+            for subject, name, text in self.DOCUMENTS:
+                archive.writestr("%s/%s" % (subject, name), text.encode("utf-8"))
+
+        for fn in [tar_fn, zip_fn]:
+            self.assertTrue(is_corpus(fn))
+            self.assertEqual(self.read(fn), self.expected())
+        self.assertIn(zip_fn + "!dogs/puppy.txt", [identifier for subject, identifier, text in iter_corpus(zip_fn)])
+
+    def test_jsonl(self):
+        jsonl_fn = os.path.join(self.directory.name, "corpus.jsonl")
+        with open(jsonl_fn, "w") as jsonl_file:
+            for subject, name, text in self.DOCUMENTS:
+                jsonl_file.write(json.dumps({"subject": subject, "text": text}) + "\n")
+            jsonl_file.write("\n{broken\n")
+            jsonl_file.write(json.dumps({"subject": "dogs", "id": "dog-42", "text": "Bones"}) + "\n")
+
+        with self.assertLogs(level="WARNING"):
+            documents = list(iter_corpus(jsonl_fn))
+        self.assertEqual(sorted((subject, text) for subject, identifier, text in documents[:3]), self.expected())
+        self.assertEqual(documents[0][1], jsonl_fn + ":1")
+        self.assertEqual(documents[3][1:], ("dog-42", "Bones"))
+
+    def test_big_files_are_memory_mapped(self):
+        original = textimport.MMAP_MIN_SIZE
+        textimport.MMAP_MIN_SIZE = 1
+        try:
+            self.assertEqual(self.read(self.root), self.expected())
+        finally:
+            textimport.MMAP_MIN_SIZE = original
+
+    def test_tagged_input(self):
+        self.assertIsInstance(get_tagged_input([self.root]), LocalCorpus)
+        self.assertEqual(sorted((subject, text) for subject, identifier, text in get_tagged_input(self.root)),
+                         self.expected())
+        self.assertEqual(len(list(get_tagged_input([self.root, self.root]))), 6)
+
+        tagged_fn = os.path.join("tests", "data", "test_textimport.txt")
+        self.assertFalse(is_corpus(tagged_fn))
+        self.assertEqual(get_tagged_input(tagged_fn), get_urls_per_subject_from_file(tagged_fn))
+        self.assertRaises(ValueError, get_tagged_input, [self.root, tagged_fn])
+
+
+class PageRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.client_ports.add(self.client_address[1])
+            calls = server.requests.count(self.path)
+
+        if self.path.startswith("/versioned"):
+            self.send_versioned_page()
+        elif self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/page")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path.startswith("/page") or (self.path == "/flaky" and calls > 1):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(TEST_PAGE)))
+            self.end_headers()
+            self.wfile.write(TEST_PAGE)
+        elif self.path == "/flaky":
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    # Seite mit ETag und Last-Modified, mit gzip bzw. deflate komprimiert, wenn der
+    # Client das anbietet; server.version ändert den Inhalt
+    def send_versioned_page(self):
+        server = self.server
+        etag = '"v%i"' % server.version
+        with server.lock:
+            server.conditional.append((self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")))
+
+        if server.broken:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        body = TEST_PAGE.replace(b"whistle", b"whistle%i" % server.version)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", "Sun, 18 Oct 2026 10:00:0%i GMT" % server.version)
+        if "gzip" in self.headers.get("Accept-Encoding", "") and self.path.endswith("gzip"):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        elif "deflate" in self.headers.get("Accept-Encoding", "") and self.path.endswith("deflate"):
+            body = zlib.compress(body)
+            self.send_header("Content-Encoding", "deflate")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPrefetchUrls(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), PageRequestHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.client_ports = set()
+        self.server.conditional = []
+        self.server.version = 1
+        self.server.broken = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = "http://127.0.0.1:%i" % self.server.server_address[1]
+
+        # eigener, leerer Cache für jeden Test
+        self.directory = tempfile.TemporaryDirectory()
+        self.original_cache = textimport.TEXT_CACHE
+        textimport.TEXT_CACHE = TextCache(os.path.join(self.directory.name, "cache.sqlite"), legacy_filename=None)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        textimport.TEXT_CACHE.close()
+        textimport.TEXT_CACHE = self.original_cache
+        textimport._REFRESHED_URLS.clear()
+        profiling.ENABLED = False
+        self.directory.cleanup()
+
+    def test_loads_pages_into_cache(self):
+        URLS = [self.base_url + "/page1", self.base_url + "/page2", self.base_url + "/redirect"]
+
+        self.assertEqual(prefetch_urls(URLS, {"fetch_workers": 4}), {})
+        for url in URLS:
+            self.assertIn("whistle", textimport.TEXT_CACHE[url])
+            self.assertNotIn("var x", textimport.TEXT_CACHE[url])
+
+    def test_load_text_of_uncached_url(self):
+        URL = self.base_url + "/versioned-gzip"
+
+        text = load_text(URL)
+        self.assertIn("whistle1", text)
+        self.assertNotIn("var x", text)
+        self.assertEqual(textimport.TEXT_CACHE[URL], text)
+        self.assertEqual(textimport.TEXT_CACHE.validators(URL)[0], '"v1"')
+
+    def test_reports_failed_urls(self):
+        MISSING = self.base_url + "/missing"
+
+        failures = prefetch_urls([MISSING, self.base_url + "/page"], {"fetch_retries": 0})
+        self.assertEqual(list(failures.keys()), [MISSING])
+        self.assertIn("404", failures[MISSING])
+        self.assertNotIn(MISSING, textimport.TEXT_CACHE)
+
+    def test_retries_temporary_errors(self):
+        FLAKY = self.base_url + "/flaky"
+
+        self.assertEqual(prefetch_urls([FLAKY], {"fetch_retries": 1}), {})
+        self.assertEqual(self.server.requests.count("/flaky"), 2)
+
+    def test_reuses_connections(self):
+        URLS = [self.base_url + "/page%i" % i for i in range(5)]
+
+        prefetch_urls(URLS, {"fetch_workers": 1})
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_host_limit_is_released_during_backoff(self):
+        FLAKY, PAGE = self.base_url + "/flaky", self.base_url + "/page"
+
+        self.assertEqual(prefetch_urls([FLAKY, PAGE], {"fetch_workers": 2, "fetch_per_host": 1, "fetch_retries": 1}), {})
+        self.assertEqual(self.server.requests, ["/flaky", "/page", "/flaky"])
+
+    def test_interleaves_hosts(self):
+        URLS = ["http://a/1", "http://a/2", "http://a/3", "http://b/1", "http://c/1", "http://c/2"]
+
+        self.assertEqual(textimport._interleave_by_host(URLS),
+                         ["http://a/1", "http://b/1", "http://c/1", "http://a/2", "http://c/2", "http://a/3"])
+        self.assertEqual(textimport._interleave_by_host([]), [])
+
+    def test_closes_worker_connections(self):
+        prefetch_urls([self.base_url + "/page%i" % i for i in range(4)], {"fetch_workers": 2})
+        self.assertEqual(set(textimport._POOLS) - {threading.get_ident()}, set())
+
+    def test_compressed_transfer(self):
+        URLS = [self.base_url + "/versioned-gzip", self.base_url + "/versioned-deflate"]
+
+        self.assertEqual(prefetch_urls(URLS), {})
+        for url in URLS:
+            self.assertIn("whistle1", textimport.TEXT_CACHE[url])
+
+        page = fetch_page(self.base_url + "/versioned-gzip")
+        self.assertTrue(page.html.startswith(b"<html>"))
+        self.assertEqual((page.etag, page.not_modified), ('"v1"', False))
+
+    def test_refresh_with_conditional_requests(self):
+        URL = self.base_url + "/versioned-gzip"
+        prefetch_urls([URL])
+        self.assertEqual(textimport.TEXT_CACHE.validators(URL), ('"v1"', "Sun, 18 Oct 2026 10:00:01 GMT"))
+
+        # ohne --refresh wird nicht erneut angefragt
+        prefetch_urls([URL])
+        self.assertEqual(len(self.server.conditional), 1)
+
+        # unverändert: 304, nichts wird extrahiert
+        profiling.enable()
+        self.assertEqual(prefetch_urls([URL], {"fetch_refresh": True}), {})
+        self.assertEqual(self.server.conditional[-1], ('"v1"', "Sun, 18 Oct 2026 10:00:01 GMT"))
+        self.assertEqual(profiling.getReport()["counters"], {"fetched_bytes": 0, "not_modified": 1})
+        self.assertNotIn("extract", profiling.getReport()["spans"])
+        self.assertIn("whistle1", textimport.TEXT_CACHE[URL])
+
+        # geändert: neuer Text und neue Validatoren
+        self.server.version = 2
+        textimport._REFRESHED_URLS.clear()
+        prefetch_urls([URL], {"fetch_refresh": True})
+        self.assertIn("whistle2", textimport.TEXT_CACHE[URL])
+        self.assertEqual(textimport.TEXT_CACHE.validators(URL)[0], '"v2"')
+
+    def test_failed_refresh_keeps_cached_text(self):
+        URL = self.base_url + "/versioned"
+        prefetch_urls([URL])
+
+        self.server.broken = True
+        self.assertEqual(prefetch_urls([URL], {"fetch_refresh": True, "fetch_retries": 0}), {})
+        self.assertIn("whistle1", textimport.TEXT_CACHE[URL])
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,6 +4,12 @@
 import unittest
 import sys, os
 import numpy
+import random
+import subprocess
+import tempfile
+
+from collections import Counter
+from functools import reduce
 
 # Modulsuchpfad erweitern
 THIS_MODULES_PATH = os.path.dirname(__file__)
@@ -12,7 +18,10 @@ TEST_MODULES_PATH = os.path.join(THIS_MODULES_PATH, "..")
 sys.path.append(TEST_MODULES_PATH)
 
 # Importiere zu testendes Modul
+import textverarbeitung
 from textverarbeitung import *
+from textcache import FrequencyCache
+from classification import DummyScaler, SelfmadeNaive
 
 ############################################################
 # Unittest fuer textverarbeitung.py
@@ -61,6 +70,51 @@ class TestCleanWordList(unittest.TestCase):
         )
 
 
+class TestStemCache(unittest.TestCase):
+
+    def test_counts_hits_and_misses(self):
+        cache = StemCache(getStemmer())
+
+        self.assertEqual([cache.stem(w) for w in ["pigs", "whistle", "pigs"]], ["pig", "whistl", "pig"])
+        self.assertEqual(cache.getStatistics()["hits"], 1)
+        self.assertEqual(cache.getStatistics()["misses"], 2)
+
+    def test_size_is_bounded(self):
+        cache = StemCache(getStemmer(), maxsize=2)
+        for word in ["pigs", "whistle", "pigs", "loudly"]:
+            cache.stem(word)
+
+        self.assertEqual(cache.export(), {"pigs": "pig", "loudly": "loud"})
+
+    def test_preload_exported_table(self):
+        table = StemCache(getStemmer())
+        table.stem("whistle")
+
+        cache = StemCache(getStemmer())
+        cache.preload(table.export())
+        cache.stem("whistle")
+        self.assertEqual(cache.hits, 1)
+
+
+class TestFastTokenizer(unittest.TestCase):
+
+    def test_invalid_words_are_removed_and_split(self):
+        INPUT_TEXT = "My 32 pigs-whistle 32-times 0x1f 3.5"
+        EXPECTED_OUTPUT = ("pig whistl time".split(" "), 6)
+
+        self.assertEqual(getFilteredTokensFast(INPUT_TEXT), EXPECTED_OUTPUT)
+
+    def test_same_output_as_nltk(self):
+        with open(os.path.join(THIS_MODULES_PATH, "data", "test_tokenizer.txt")) as file_handle:
+            INPUT_TEXT = file_handle.read()
+
+        nltk_words, nltk_count = getFilteredTokens(INPUT_TEXT, "nltk")
+        fast_words, fast_count = getFilteredTokens(INPUT_TEXT, "fast")
+
+        self.assertEqual(Counter(fast_words), Counter(nltk_words))
+        self.assertEqual(fast_count, nltk_count)
+
+
 class TestMergeDictionary(unittest.TestCase):
 
     def test_identity(self):
@@ -152,6 +206,126 @@ class TestBuildClassificationVectorSpaceBase(unittest.TestCase):
         self.assertEqual(buildClassificationSpaceBase(INPUT, PARAM), OUTPUT)
 
 
+# bisherige Implementierung mit vollständiger Sortierung, nur zum Vergleich
+def sortingClassificationSpaceBase(per_subject_wordfreq_dict, classification_params):
+    first_n_words = classification_params["category_base_length"]
+    all_the_words = [set(word_freqs.keys()) for word_freqs in per_subject_wordfreq_dict.values()]
+    if classification_params["remove_shared_words"] and len(all_the_words) > 1:
+        shared_words = set.intersection(*all_the_words)
+    else:
+        shared_words = set()
+
+    result = set()
+    for wordfreq_dist in per_subject_wordfreq_dict.values():
+        result |= set([x[1] for x in buildSortedListFromDictionary(wordfreq_dist) if x[1] not in shared_words][:first_n_words])
+    return result
+
+
+class TestVocabularyMatrixBase(unittest.TestCase):
+
+    def makeInput(self, seed):
+        rnd = random.Random(seed)
+        vocabulary = ["word%i" % i for i in range(300)]
+        # wenige verschiedene Häufigkeiten, damit es viele Gleichstände gibt
+        return {"subject%i" % s: {word: rnd.choice([0.5, 1.0, 1.5, 2.0]) for word in rnd.sample(vocabulary, rnd.randint(20, 250))}
+                for s in range(rnd.randint(1, 6))}
+
+    def test_same_base_as_sorting(self):
+        for seed in range(30):
+            INPUT = self.makeInput(seed)
+            PARAM = getClassificationStdParam()
+            PARAM["remove_shared_words"] = seed % 2 == 0
+            PARAM["category_base_length"] = seed + 1
+
+            self.assertEqual(set(buildClassificationSpaceBase(INPUT, PARAM)), sortingClassificationSpaceBase(INPUT, PARAM))
+
+    def test_category_words(self):
+        INPUT = {'subject1': {'word1': 0.1, 'word2': 0.2}, 'subject2': {'word2': 0.01, 'word3': 0.5}}
+        vocabulary = VocabularyMatrix(INPUT)
+
+        self.assertEqual(vocabulary.categoryWords({'word1', 'word3'}), {'subject1': {'word1'}, 'subject2': {'word3'}})
+
+    def test_statistical_selection_prefers_specific_words(self):
+        # "the" ist in subject1 am häufigsten, kommt aber überall gleich oft vor
+        INPUT = {'subject1': {'the': 5.0, 'dog': 2.0, 'bark': 1.0},
+                 'subject2': {'the': 5.0, 'pig': 3.0},
+                 'subject3': {'the': 5.0, 'cow': 3.0, 'dog': 0.1}}
+        PARAM = getClassificationStdParam()
+        PARAM["remove_shared_words"] = False
+        PARAM["category_base_length"] = 1
+
+        PARAM["feature_selection"] = "frequency"
+        self.assertEqual(buildClassificationSpaceBase(INPUT, PARAM), {'the'})
+        for method in ["chi2", "mutual_info"]:
+            PARAM["feature_selection"] = method
+            self.assertEqual(buildClassificationSpaceBase(INPUT, PARAM), {'dog', 'pig', 'cow'})
+
+
+class TestCompactDocuments(unittest.TestCase):
+
+    INPUT = {'subject1': [{'word1': 0.125, 'word2': 0.25}, {'word2': 0.5, 'word5': 0.5}],
+             'subject2': [{'word3': 0.25, 'word2': 0.01}, {}],
+             'subject3': [{'word4': 1.0, 'word1': 0.75}]}
+
+    def makeDocuments(self):
+        token_vocabulary = TokenVocabulary()
+        documents = {subject: [CompactDocument.fromWordFreqDict(freqs, token_vocabulary) for freqs in dicts]
+                     for subject, dicts in self.INPUT.items()}
+        return documents, token_vocabulary
+
+    def test_roundtrip(self):
+        documents, token_vocabulary = self.makeDocuments()
+
+        self.assertEqual(len(token_vocabulary), 5)
+        self.assertEqual(documents['subject1'][1].ids.dtype, numpy.uint32)
+        self.assertEqual(documents['subject1'][1].toWordFreqDict(token_vocabulary), self.INPUT['subject1'][1])
+        self.assertEqual(len(documents['subject2'][1]), 0)
+
+    def test_vocabulary_matrix_same_as_from_dicts(self):
+        documents, token_vocabulary = self.makeDocuments()
+        merged = {subject: reduce(appendWordFreqDictToExistingDict, dicts, {}) for subject, dicts in self.INPUT.items()}
+
+        compact = VocabularyMatrix.fromCompactDocuments(documents, token_vocabulary)
+        expected = VocabularyMatrix(merged)
+        self.assertEqual(compact.words, expected.words)
+        self.assertEqual(compact.subjects, expected.subjects)
+        self.assertTrue(numpy.array_equal(compact.counts.toarray(), expected.counts.toarray()))
+        self.assertEqual(buildClassificationSpaceBase(None, getClassificationStdParam(), compact),
+                         buildClassificationSpaceBase(merged, getClassificationStdParam()))
+
+    def test_same_base_as_from_dicts_with_ties(self):
+        # 3 x 1/3 ergibt in float64 genau 1.0, der Gleichstand mit 'b' muss erhalten bleiben
+        INPUT = {'subject1': [wordListToFreqDict(['a', 'c', 'd'], 3), wordListToFreqDict(['a', 'd', 'e'], 3),
+                              wordListToFreqDict(['a', 'e', 'c'], 3), {'b': 1.0}],
+                 'subject2': [wordListToFreqDict(['f', 'g', 'g', 'h', 'h', 'h', 'i'], 7)] * 7}
+        token_vocabulary = TokenVocabulary()
+        documents = {subject: [CompactDocument.fromWordFreqDict(freqs, token_vocabulary) for freqs in dicts]
+                     for subject, dicts in INPUT.items()}
+        merged = {subject: reduce(appendWordFreqDictToExistingDict, dicts, {}) for subject, dicts in INPUT.items()}
+
+        compact = VocabularyMatrix.fromCompactDocuments(documents, token_vocabulary)
+        self.assertEqual(compact.wordFreqDicts(), merged)
+
+        PARAM = getClassificationStdParam()
+        for length in [1, 2, 3]:
+            PARAM["category_base_length"] = length
+            self.assertEqual(buildClassificationSpaceBase(None, PARAM, compact),
+                             buildClassificationSpaceBase(merged, PARAM))
+        PARAM["category_base_length"] = 1
+        self.assertIn('b', buildClassificationSpaceBase(None, PARAM, compact))
+
+    def test_classification_matrix_same_as_from_dicts(self):
+        documents, token_vocabulary = self.makeDocuments()
+        base_index = getBaseIndex(['word1', 'word2', 'word4', 'word9'])
+        all_documents = [document for subject_documents in documents.values() for document in subject_documents]
+        all_dicts = [freqs for dicts in self.INPUT.values() for freqs in dicts]
+
+        compact = getCompactClassificationMatrix(base_index, all_documents, token_vocabulary)
+        expected = getClassificationMatrix(base_index, all_dicts)
+        self.assertEqual(compact.shape, (5, 4))
+        self.assertTrue(numpy.array_equal(compact.toarray(), expected.toarray()))
+
+
 class TestGetClassificationVectorSpaceElement(unittest.TestCase):
 
     def test_null(self):
@@ -168,5 +342,146 @@ class TestGetClassificationVectorSpaceElement(unittest.TestCase):
 
         self.assertTrue((getClassificationVectorSpaceElement(BASE, INPUT) == OUTPUT).all() )
 
+
+class TestFrequencyCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        textverarbeitung.FREQUENCY_CACHE = FrequencyCache(os.path.join(self.directory.name, "cache.sqlite"))
+
+    def tearDown(self):
+        textverarbeitung.FREQUENCY_CACHE.close()
+        textverarbeitung.FREQUENCY_CACHE = None
+        self.directory.cleanup()
+
+    def test_fingerprint_is_stable(self):
+        self.assertEqual(getPipelineFingerprint(), getPipelineFingerprint())
+        self.assertNotEqual(getFrequencyCacheKey("My pigs whistle"), getFrequencyCacheKey("My pigs sing"))
+
+    def test_cached_frequencies_are_used(self):
+        CACHED = {"cached": 1.0}
+        textverarbeitung.FREQUENCY_CACHE.put(getFrequencyCacheKey("My pigs whistle"), CACHED)
+
+        self.assertEqual(makeWordFrequencyDictionary("My pigs whistle"), CACHED)
+        self.assertEqual(textverarbeitung.FREQUENCY_CACHE.hits, 1)
+
+
+class TestMakeWordFrequencyDictionaries(unittest.TestCase):
+
+    TEXTS = ["My pigs whistle", "", "The dogs are barking at the pigs"] * 20
+
+    def test_same_result_as_single_document(self):
+        result = list(makeWordFrequencyDictionaries(self.TEXTS, "fast"))
+        self.assertEqual(result, [makeWordFrequencyDictionary(text, "fast") for text in self.TEXTS])
+
+    def test_process_pool_keeps_order(self):
+        result = list(makeWordFrequencyDictionaries(self.TEXTS, "fast", jobs=2, chunksize=4))
+        self.assertEqual(result, list(makeWordFrequencyDictionaries(self.TEXTS, "fast")))
+
+
+class LearningDataStub:
+    pass
+
+
+class TestCompareWordFreqDictsToLearningData(unittest.TestCase):
+
+    def setUp(self):
+        self.learning_data = LearningDataStub()
+        self.learning_data.base = SortedSet(['bark', 'dog', 'pig', 'whistl'])
+        self.learning_data.target = ['dogs', 'pigs']
+        self.learning_data.scaler = DummyScaler()
+        self.learning_data.classifier = SelfmadeNaive()
+        self.learning_data.classifier.fit(numpy.array([[0.5, 0.5, 0.0, 0.0], [0.0, 0.0, 0.5, 0.5]]),
+                                          self.learning_data.target)
+
+    def test_batch_matches_single_documents(self):
+        INPUT = [{'dog': 0.5, 'bark': 0.25, 'cat': 0.25}, {'pig': 1.0}, {}]
+
+        scores, subjects = compareWordFreqDictsToLearningData(INPUT, self.learning_data, getClassificationStdParam())
+
+        self.assertEqual(subjects, ['dogs', 'pigs'])
+        self.assertEqual(scores.shape, (3, 2))
+        for row, freq in zip(scores, INPUT):
+            single = compareWordFreqDictToLearningData(freq, self.learning_data, getClassificationStdParam())
+            self.assertTrue(numpy.allclose(row, list(single.values())))
+
+    def test_empty_batch(self):
+        scores, subjects = compareWordFreqDictsToLearningData([], self.learning_data, getClassificationStdParam())
+        self.assertEqual(scores.shape, (0, 2))
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_main_does_not_load_nltk_or_sklearn(self):
+        code = "import sys, main; print(' '.join(m for m in ['nltk', 'sklearn', 'bs4', 'breadability'] if m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=TEST_MODULES_PATH,
+                                stdout=subprocess.PIPE, check=True, universal_newlines=True)
+        self.assertEqual(result.stdout.strip(), "")
+
+
+class TestGetClassificationMatrix(unittest.TestCase):
+
+    def test_rows_match_vector_space_elements(self):
+        BASE = SortedSet(['word1', 'word2', 'word3'])
+        INPUT = [{'word1': 0.1, 'word3': 0.3, 'word4': 1.0},
+                 {},
+                 {'word2': 0.2}]
+
+        matrix = getClassificationMatrix(getBaseIndex(BASE), INPUT)
+
+        self.assertEqual(matrix.shape, (3, 3))
+        for row, word_freq_dict in zip(matrix.toarray(), INPUT):
+            self.assertTrue((row == getClassificationVectorSpaceElement(BASE, word_freq_dict)).all())
+
+
+class TestHashingIndex(unittest.TestCase):
+
+    INPUT = [{'dog': 2.0, 'bark': 1.0, 'whistl': 0.5},
+             {},
+             {'pig': 3.0, 'dog': 1.0}]
+
+    def test_columns_do_not_depend_on_corpus(self):
+        index = HashingIndex(bits=10)
+        matrix = getClassificationMatrix(index, self.INPUT)
+        alone = getClassificationMatrix(index, self.INPUT[2:])
+
+        self.assertEqual(matrix.shape, (3, 1024))
+        self.assertEqual(len(index), 1024)
+        self.assertTrue((matrix[2].toarray() == alone.toarray()).all())
+        self.assertEqual(matrix[0].sum(), 3.5)
+        self.assertEqual(matrix[1].nnz, 0)
+        for row, word_freq_dict in zip(matrix.toarray(), self.INPUT):
+            self.assertTrue((row == getClassificationVectorSpaceElement(index, word_freq_dict)).all())
+
+    def test_collisions_are_summed(self):
+        # mit einem Bit landen alle Wörter in zwei Spalten
+        matrix = getClassificationMatrix(HashingIndex(bits=1), self.INPUT)
+
+        self.assertEqual(matrix.shape, (3, 2))
+        self.assertTrue(matrix.has_canonical_format)
+        self.assertTrue(numpy.allclose(matrix.sum(axis=1).A1, [3.5, 0.0, 4.0]))
+
+    def test_signed(self):
+        unsigned = getClassificationMatrix(HashingIndex(bits=16), self.INPUT)
+        signed = getClassificationMatrix(HashingIndex(bits=16, signed=True), self.INPUT)
+
+        self.assertTrue((abs(signed).toarray() == unsigned.toarray()).all())
+        many_words = {"word%i" % i: 1.0 for i in range(100)}
+        self.assertGreater(getClassificationMatrix(HashingIndex(bits=16), [many_words]).sum(),
+                           getClassificationMatrix(HashingIndex(bits=16, signed=True), [many_words]).sum())
+
+    def test_invalid_bits(self):
+        self.assertRaises(ValueError, HashingIndex, 0)
+        self.assertRaises(ValueError, HashingIndex, HASH_MAX_BITS + 1)
+
+    def test_feature_index_of_learning_data(self):
+        learning_data = LearningDataStub()
+        learning_data.base = SortedSet()
+        learning_data.hashing = {"bits": 12, "signed": True}
+
+        index = getFeatureIndex(learning_data)
+        self.assertIsInstance(index, HashingIndex)
+        self.assertEqual(index.params(), learning_data.hashing)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Persistente Caches für heruntergeladene Texte und die daraus berechneten Worthäufigkeiten
+#
+# Die Einträge liegen einzeln in einer sqlite-Datenbank, gelesen und geschrieben
+# wird also nur, was gerade gebraucht wird. Mehrere Prozesse können gleichzeitig
+# auf denselben Cache zugreifen (WAL-Modus, sqlite übernimmt das Sperren).
+
+import logging as log
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_FILENAME = ".textcache.sqlite"
+
+# bisheriges Format: ein gepickeltes dict url -> text
+LEGACY_FILENAME = ".textcache"
+
+
+class SqliteStore:
+    SCHEMA = ""
+
+    def __init__(self, filename=DEFAULT_FILENAME):
+        self.filename = filename
+
+        self._con = None
+        self._lock = threading.RLock()
+
+    # Die Datenbank wird erst beim ersten Zugriff geöffnet
+    def _connection(self):
+        if self._con is None:
+            con = sqlite3.connect(self.filename, timeout=60, isolation_level=None, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(self.SCHEMA)
+            self._con = con
+            self._opened()
+
+        return self._con
+
+    # wird nach dem Öffnen der Datenbank aufgerufen
+    def _opened(self):
+        pass
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._connection().execute(sql, args).fetchall()
+
+    # mehrere Anweisungen in einer Transaktion ausführen, liefert die Anzahl geänderter Zeilen
+    def _transaction(self, statements):
+        with self._lock:
+            con = self._connection()
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                changed = sum(con.execute(sql, args).rowcount for sql, args in statements)
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        return changed
+
+    def close(self):
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+
+class TextCache(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS texts (
+        url TEXT PRIMARY KEY,
+        compressed INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        stored REAL NOT NULL,
+        accessed REAL NOT NULL,
+        etag TEXT,
+        last_modified TEXT
+    );
+    CREATE INDEX IF NOT EXISTS texts_accessed ON texts (accessed);
+    """
+
+    # Spalten, die später hinzugekommen sind
+    VALIDATOR_COLUMNS = ["etag", "last_modified"]
+
+    # so viele Lesezugriffe werden gesammelt, bevor "accessed" geschrieben wird
+    ACCESS_FLUSH_SIZE = 1000
+
+    # max_size in Bytes (komprimiert), max_age in Sekunden; None = unbegrenzt
+    def __init__(self, filename=DEFAULT_FILENAME, legacy_filename=LEGACY_FILENAME,
+                 compress=True, max_size=None, max_age=None):
+        super().__init__(filename)
+        self.legacy_filename = legacy_filename
+        self.compress = compress
+        self.max_size = max_size
+        self.max_age = max_age
+
+        # Lesen schreibt nicht in die Datenbank, die Zeitpunkte werden gesammelt
+        # und gebündelt geschrieben (flushAccessTimes, evict, close)
+        self._accessed = {}
+
+    def _opened(self):
+        columns = [row[1] for row in self._con.execute("PRAGMA table_info(texts)").fetchall()]
+        for column in self.VALIDATOR_COLUMNS:
+            if column not in columns:
+                try:
+                    self._con.execute("ALTER TABLE texts ADD COLUMN %s TEXT" % column)
+                except sqlite3.OperationalError:
+                    # ein anderer Prozess war schneller
+                    pass
+
+        if self.legacy_filename and os.path.isfile(self.legacy_filename):
+            self.migrate(self.legacy_filename)
+
+    def _encode(self, text):
+        data = text.encode("utf-8")
+        if self.compress:
+            return 1, zlib.compress(data)
+        return 0, data
+
+    @staticmethod
+    def _decode(compressed, data):
+        if compressed:
+            data = zlib.decompress(data)
+        return bytes(data).decode("utf-8")
+
+    def __contains__(self, url):
+        return len(self._execute("SELECT 1 FROM texts WHERE url = ?", (url,))) > 0
+
+    def __getitem__(self, url):
+        rows = self._execute("SELECT compressed, data FROM texts WHERE url = ?", (url,))
+        if len(rows) == 0:
+            raise KeyError(url)
+
+        with self._lock:
+            self._accessed[url] = time.time()
+            flush = len(self._accessed) >= self.ACCESS_FLUSH_SIZE
+        if flush:
+            self.flushAccessTimes()
+        return self._decode(*rows[0])
+
+    def get(self, url, default=None):
+        try:
+            return self[url]
+        except KeyError:
+            return default
+
+    def __setitem__(self, url, text):
+        self.put(url, text)
+
+    # Text speichern, dazu ETag und Last-Modified der Antwort für spätere bedingte Anfragen
+    def put(self, url, text, etag=None, last_modified=None):
+        compressed, data = self._encode(text)
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO texts (url, compressed, data, size, stored, accessed, etag, last_modified) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (url, compressed, data, len(data), now, now, etag, last_modified))
+
+    # (etag, last_modified) eines Eintrags, None wenn die URL nicht im Cache ist
+    def validators(self, url):
+        rows = self._execute("SELECT etag, last_modified FROM texts WHERE url = ?", (url,))
+        if len(rows) == 0:
+            return None
+        return rows[0]
+
+    # der Server hat den Eintrag bestätigt (304): er gilt wieder als frisch,
+    # neue Validatoren ersetzen die alten
+    def revalidated(self, url, etag=None, last_modified=None):
+        self._execute("UPDATE texts SET stored = ?, etag = COALESCE(?, etag), "
+                      "last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                      (time.time(), etag, last_modified, url))
+
+    def __delitem__(self, url):
+        with self._lock:
+            if url not in self:
+                raise KeyError(url)
+            self._execute("DELETE FROM texts WHERE url = ?", (url,))
+
+    def __iter__(self):
+        return iter([row[0] for row in self._execute("SELECT url FROM texts ORDER BY url")])
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM texts")[0][0]
+
+    # gesammelte Zeitpunkte der Lesezugriffe in einer Transaktion schreiben
+    def flushAccessTimes(self):
+        with self._lock:
+            accessed, self._accessed = self._accessed, {}
+            if len(accessed) == 0:
+                return
+            self._transaction([("UPDATE texts SET accessed = MAX(accessed, ?) WHERE url = ?", (when, url))
+                               for url, when in accessed.items()])
+
+    def close(self):
+        with self._lock:
+            if self._con is not None:
+                self.flushAccessTimes()
+        super().close()
+
+    # Einträge entfernen, die zu alt sind bzw. über die maximale Größe hinausgehen.
+    # Bei der Größe fliegen die am längsten nicht mehr gelesenen Einträge zuerst raus.
+    def evict(self, max_size=None, max_age=None):
+        max_size = self.max_size if max_size is None else max_size
+        max_age = self.max_age if max_age is None else max_age
+
+        self.flushAccessTimes()
+
+        statements = []
+        if max_age is not None:
+            statements.append(("DELETE FROM texts WHERE stored < ?", (time.time() - max_age,)))
+        if max_size is not None:
+            statements.append((
+                "DELETE FROM texts WHERE url IN ("
+                "  SELECT url FROM ("
+                "    SELECT url, SUM(size) OVER (ORDER BY accessed DESC, url) AS running FROM texts"
+                "  ) WHERE running > ?)", (max_size,)))
+        if len(statements) == 0:
+            return 0
+        removed = self._transaction(statements)
+
+        if removed > 0:
+            log.info("Evicted %i entries from the text cache %s" % (removed, self.filename))
+        return removed
+
+    # einmalige Übernahme des alten, gepickelten Caches
+    def migrate(self, legacy_filename):
+        with open(legacy_filename, mode="rb") as legacy_file:
+            legacy_cache = pickle.load(legacy_file)
+
+        now = time.time()
+        rows = []
+        for url, text in legacy_cache.items():
+            compressed, data = self._encode(text)
+            rows.append((url, compressed, data, len(data), now, now))
+
+        self._transaction([("INSERT OR IGNORE INTO texts (url, compressed, data, size, stored, accessed) "
+                            "VALUES (?, ?, ?, ?, ?, ?)", row) for row in rows])
+
+        try:
+            os.replace(legacy_filename, legacy_filename + ".migrated")
+        except OSError:
+            # ein anderer Prozess hat die Datei schon übernommen
+            pass
+
+        log.info("Migrated %i entries from %s to %s" % (len(rows), legacy_filename, self.filename))
+
+
+# Cache für die Worthäufigkeiten der einzelnen Dokumente. Der Schlüssel wird vom
+# Aufrufer gebildet (Hash des Textes und der Einstellungen der Textverarbeitung),
+# so dass geänderte Einstellungen automatisch zu neuen Einträgen führen.
+class FrequencyCache(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS frequencies (
+        key TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        stored REAL NOT NULL
+    );
+    """
+
+    def __init__(self, filename=DEFAULT_FILENAME, max_age=None):
+        super().__init__(filename)
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        rows = self._execute("SELECT data FROM frequencies WHERE key = ?", (key,))
+        if len(rows) == 0:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return pickle.loads(zlib.decompress(rows[0][0]))
+
+    def put(self, key, word_freq_dict):
+        data = zlib.compress(pickle.dumps(dict(word_freq_dict), protocol=pickle.HIGHEST_PROTOCOL))
+        self._execute("INSERT OR REPLACE INTO frequencies (key, data, stored) VALUES (?, ?, ?)",
+                      (key, data, time.time()))
+
+    # veraltete Einträge, z.B. von früheren Einstellungen, entfernen
+    def evict(self, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        if max_age is None:
+            return 0
+        return self._transaction([("DELETE FROM frequencies WHERE stored < ?", (time.time() - max_age,))])
+
+
+# Cache für die Ergebnisse der Parametersuche: je Parameterkombination und Fold
+# die Bewertungen. Der Schlüssel enthält einen Hash der Trainingsdaten (siehe
+# search.py), ein erneutes "learn" auf unveränderten Daten lernt also nichts neu.
+class FoldCache(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS folds (
+        key TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        stored REAL NOT NULL
+    );
+    """
+
+    def __init__(self, filename=DEFAULT_FILENAME, max_age=None):
+        super().__init__(filename)
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        rows = self._execute("SELECT data FROM folds WHERE key = ?", (key,))
+        if len(rows) == 0:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return pickle.loads(rows[0][0])
+
+    def put(self, key, result):
+        self._execute("INSERT OR REPLACE INTO folds (key, data, stored) VALUES (?, ?, ?)",
+                      (key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), time.time()))
+
+    def evict(self, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        if max_age is None:
+            return 0
+        return self._transaction([("DELETE FROM folds WHERE stored < ?", (time.time() - max_age,))])
@@ -4,15 +4,28 @@
 # Alles rund ums Einlesen von Text aus verschiedenen Quellen
 
 import re
-import urllib.request
+import contextlib
+import gzip
+import zlib
+import urllib.parse
 import os
-import pickle
+import threading
+import time
+import http.client
+import json
+import logging as log
+import mmap
+import tarfile
+import zipfile
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from bs4 import BeautifulSoup
+from sortedcontainers import SortedSet, SortedDict
 
-from breadability.readable import Article
+import profiling
 
-from sortedcontainers import SortedSet, SortedDict
+from textcache import TextCache
 
 ##########################################################################
 # Text-Gewinnung
@@ -35,25 +48,362 @@ def is_visible(element):
 def remove_non_ascii_chars(string):
     return string.encode("ascii", "ignore").decode("ascii")
 
+##########################################################################
+# Herunterladen
+#
+##########################################################################
+HEADERS = {'User-Agent': "Magic Browser", 'Accept-Encoding': "gzip, deflate"}
+MAX_REDIRECTS = 5
+
+# bei diesen Status-Codes lohnt sich ein erneuter Versuch
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    def __init__(self, url, reason, retry=False):
+        super().__init__("%s: %s" % (url, reason))
+        self.url = url
+        self.reason = reason
+        self.retry = retry
+
+
+def get_fetch_std_param():
+    param = {}
+    param["fetch_workers"] = 8
+    param["fetch_per_host"] = 2
+    param["fetch_timeout"] = 20.0
+    param["fetch_retries"] = 2
+    # URLs im TEXT_CACHE mit bedingten Anfragen (ETag, Last-Modified) erneut prüfen
+    param["fetch_refresh"] = False
+
+    return param
+
+
+# Verbindungen werden pro Thread und Host offen gehalten (HTTP keep-alive); _POOLS
+# kennt die Verbindungen aller Threads, damit sie sich wieder schließen lassen
+_CONNECTIONS = threading.local()
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def _get_pool():
+    pool = getattr(_CONNECTIONS, "pool", None)
+    if pool is None:
+        pool = _CONNECTIONS.pool = {}
+        with _POOLS_LOCK:
+            _POOLS[threading.get_ident()] = pool
+    return pool
+
+def _get_connection(scheme, netloc, timeout):
+    pool = _get_pool()
+    if (scheme, netloc) not in pool:
+        if scheme == "https":
+            pool[(scheme, netloc)] = http.client.HTTPSConnection(netloc, timeout=timeout)
+        else:
+            pool[(scheme, netloc)] = http.client.HTTPConnection(netloc, timeout=timeout)
+    return pool[(scheme, netloc)]
+
+def _drop_connection(scheme, netloc):
+    con = _get_pool().pop((scheme, netloc), None)
+    if con is not None:
+        con.close()
+
+# offene Verbindungen der Threads schließen, z.B. der Worker von prefetch_urls
+# nach deren Ende; ohne Angabe die aller Threads
+def close_connections(thread_ids=None):
+    with _POOLS_LOCK:
+        thread_ids = list(_POOLS) if thread_ids is None else [i for i in thread_ids if i in _POOLS]
+        pools = [_POOLS.pop(thread_id) for thread_id in thread_ids]
+
+    for pool in pools:
+        for con in pool.values():
+            con.close()
+        pool.clear()
+
+
+# Ergebnis einer Anfrage; bei not_modified (304) ist html None
+Page = namedtuple("Page", ["html", "etag", "last_modified", "not_modified"])
+
+
+# Inhalt nach Content-Encoding entpacken
+def _decode_body(url, body, encoding):
+    encoding = (encoding or "identity").strip().lower()
+    try:
+        if encoding in ("gzip", "x-gzip"):
+            return gzip.decompress(body)
+        if encoding == "deflate":
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                # manche Server schicken deflate ohne zlib-Header
+                return zlib.decompress(body, -zlib.MAX_WBITS)
+    except (OSError, EOFError, zlib.error) as e:
+        raise FetchError(url, "broken %s content: %s" % (encoding, e))
+
+    if encoding != "identity":
+        raise FetchError(url, "unsupported content encoding %s" % encoding)
+    return body
+
+
+def _fetch_once(url, timeout, etag=None, last_modified=None):
+    headers = dict(HEADERS)
+    if etag is not None:
+        headers["If-None-Match"] = etag
+    if last_modified is not None:
+        headers["If-Modified-Since"] = last_modified
+
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(url)
+        path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+
+        con = _get_connection(parts.scheme, parts.netloc, timeout)
+        try:
+            con.request("GET", path, headers=headers)
+            response = con.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            _drop_connection(parts.scheme, parts.netloc)
+            raise FetchError(url, e, retry=True)
+
+        if response.will_close:
+            _drop_connection(parts.scheme, parts.netloc)
+
+        location = response.getheader("Location")
+        if response.status in (301, 302, 303, 307, 308) and location:
+            url = urllib.parse.urljoin(url, location)
+            continue
+
+        if response.status == 304:
+            return Page(None, response.getheader("ETag"), response.getheader("Last-Modified"), True), 0
+
+        if response.status >= 400:
+            raise FetchError(url, "HTTP %i %s" % (response.status, response.reason),
+                             retry=response.status in RETRY_STATUS)
+
+        html = _decode_body(url, body, response.getheader("Content-Encoding"))
+        return Page(html, response.getheader("ETag"), response.getheader("Last-Modified"), False), len(body)
+
+    raise FetchError(url, "too many redirects")
+
+
+# Seite laden, mit Timeout und begrenzter Anzahl an Wiederholungen; mit etag bzw.
+# last_modified wird bedingt angefragt und bei unveränderter Seite not_modified geliefert.
+# limit (z.B. ein Semaphore je Host) wird nur während der Anfragen gehalten, nicht
+# während des Wartens vor einer Wiederholung.
+def fetch_page(url, timeout=None, retries=None, etag=None, last_modified=None, limit=None):
+    param = get_fetch_std_param()
+    timeout = param["fetch_timeout"] if timeout is None else timeout
+    retries = param["fetch_retries"] if retries is None else retries
+    limit = limit or contextlib.nullcontext()
+
+    for attempt in range(retries + 1):
+        try:
+            with limit, profiling.span("fetch"):
+                page, transferred = _fetch_once(url, timeout, etag, last_modified)
+            profiling.count("fetched_bytes", transferred)
+            if page.not_modified:
+                profiling.count("not_modified")
+            return page
+        except FetchError as e:
+            if not e.retry or attempt == retries:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+
+# HTML einer URL laden
+def fetch_html(url, timeout=None, retries=None):
+    return fetch_page(url, timeout, retries).html
+
+
+# Verfahren, um den Text aus dem HTML zu gewinnen:
+#   breadability       breadability sucht den Artikel, BeautifulSoup liest dessen Text aus
+#   breadability-lxml  derselbe Artikel, der Text wird aber direkt aus dem lxml-Baum von
+#                      breadability gelesen, ohne erneutes Parsen
+#   lxml               ohne Suche nach dem Artikel: script, style, head usw. werden in einem
+#                      Durchlauf entfernt, der übrige Text der Seite wird übernommen
+EXTRACTORS = ["breadability", "breadability-lxml", "lxml"]
+EXTRACTOR = "breadability"
+
+# diese Elemente enthalten keinen sichtbaren Text
+INVISIBLE_TAGS = ["script", "style", "head", "title", "noscript", "template"]
+
+
+def set_extractor(name):
+    global EXTRACTOR
+    if name not in EXTRACTORS:
+        raise ValueError("unknown extractor %s, supported: %s" % (name, ", ".join(EXTRACTORS)))
+    EXTRACTOR = name
+
+
+def _extract_breadability(html, url):
+    # erst hier laden, viele Aufrufe brauchen keine Webseiten
+    from bs4 import BeautifulSoup
+    from breadability.readable import Article
+
+    # Nutzen von breadability, um den relevanten html-Code herauszufiltern
+    filtered_html = Article(html, url=url).readable
+
+    # in Text umwandeln
+    soup = BeautifulSoup(filtered_html, 'html.parser')
+
+    texts = soup.find_all(text=True)
+
+    text_per_tag = filter(is_visible, texts)
+
+    return "\n".join(text_per_tag)
+
+
+# Text eines lxml-Baums, unsichtbare Elemente und Kommentare werden vorher entfernt
+def _text_of_tree(tree):
+    from lxml import etree
+
+    etree.strip_elements(tree, etree.Comment, *INVISIBLE_TAGS, with_tail=False)
+    texts = (text.strip() for text in tree.itertext())
+    return "\n".join(text for text in texts if text)
+
+
+def _extract_breadability_lxml(html, url):
+    from breadability.readable import Article
+
+    tree = Article(html, url=url).readable_dom
+    if tree is None:
+        return ""
+    return _text_of_tree(tree)
+
+
+def _extract_lxml(html, url):
+    import lxml.html
+    from lxml.etree import ParserError
+
+    # lxml liest die Kodierung aus dem Dokument, bei str ist sie schon bekannt
+    parser = None
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+        parser = lxml.html.HTMLParser(encoding="utf-8")
+
+    try:
+        tree = lxml.html.document_fromstring(html, parser=parser)
+    except ParserError:
+        # leeres Dokument
+        return ""
+    return _text_of_tree(tree)
+
+
+_EXTRACTOR_FUNCTIONS = {
+    "breadability": _extract_breadability,
+    "breadability-lxml": _extract_breadability_lxml,
+    "lxml": _extract_lxml,
+}
+
+
+def extract_text_from_html(html, url, extractor=None):
+    extract = _EXTRACTOR_FUNCTIONS[extractor or EXTRACTOR]
+
+    with profiling.span("extract"):
+        return remove_non_ascii_chars(extract(html, url))
+
+
 def load_text_from_url(url):
     if not url in TEXT_CACHE:
-        req = urllib.request.Request(url, headers={'User-Agent': "Magic Browser"})
-        con = urllib.request.urlopen(req)
-        html = con.read()
+        page = fetch_page(url)
+        _store_page(url, page._replace(html=extract_text_from_html(page.html, url)))
 
-        # Nutzen von breadability, um den relevanten html-Code herauszufiltern
-        filtered_html = Article(html, url=url).readable
+    return TEXT_CACHE[url]
 
-        # in Text umwandeln
-        soup = BeautifulSoup(filtered_html, 'html.parser')
 
-        texts = soup.find_all(text=True)
+def _store_page(url, page):
+    if page.not_modified:
+        TEXT_CACHE.revalidated(url, page.etag, page.last_modified)
+    elif isinstance(TEXT_CACHE, TextCache):
+        TEXT_CACHE.put(url, page.html, page.etag, page.last_modified)
+    else:
+        TEXT_CACHE[url] = page.html
 
-        text_per_tag = filter(is_visible, texts)
 
-        TEXT_CACHE[url] = remove_non_ascii_chars("\n".join(text_per_tag))
+# liefert die Seite, der Text ist schon extrahiert; bei 304 wird nichts extrahiert
+def _fetch_and_extract(url, fetch_params, host_limits, validators=None):
+    etag, last_modified = validators or (None, None)
+    page = fetch_page(url, fetch_params["fetch_timeout"], fetch_params["fetch_retries"], etag, last_modified,
+                      limit=host_limits[urllib.parse.urlsplit(url).netloc])
 
-    return TEXT_CACHE[url]
+    if page.not_modified:
+        return page
+    return page._replace(html=extract_text_from_html(page.html, url))
+
+
+# URLs abwechselnd nach Host ordnen (erste URL jedes Hosts, dann die zweite usw.),
+# damit die Worker nicht alle auf die Freigabe desselben Hosts warten
+def _interleave_by_host(urls):
+    per_host = SortedDict()
+    for url in urls:
+        per_host.setdefault(urllib.parse.urlsplit(url).netloc, []).append(url)
+
+    interleaved = []
+    for i in range(max([len(queue) for queue in per_host.values()], default=0)):
+        interleaved.extend(queue[i] for queue in per_host.values() if i < len(queue))
+    return interleaved
+
+
+# in diesem Prozess schon erneut geprüfte URLs (z.B. beim zweiten Durchlauf von --streaming)
+_REFRESHED_URLS = set()
+
+
+# Alle noch nicht bekannten URLs parallel herunterladen und in TEXT_CACHE ablegen.
+# Mit fetch_refresh werden auch die URLs im Cache bedingt neu angefragt, schlägt das
+# fehl, bleibt der alte Text erhalten. Zurückgegeben werden die URLs, die nicht
+# geladen werden konnten, mit dem Grund.
+def prefetch_urls(urls, fetch_params=None):
+    param = get_fetch_std_param()
+    param.update(fetch_params or {})
+
+    refresh = param["fetch_refresh"] and isinstance(TEXT_CACHE, TextCache)
+    validators = {}
+    todo = []
+    for url in SortedSet(urls):
+        if not is_url(url):
+            continue
+        if refresh and url not in _REFRESHED_URLS:
+            validators[url] = TEXT_CACHE.validators(url)
+            todo.append(url)
+        elif url not in TEXT_CACHE:
+            todo.append(url)
+
+    failures = SortedDict()
+    if len(todo) == 0:
+        return failures
+
+    todo = _interleave_by_host(todo)
+    host_limits = {urllib.parse.urlsplit(url).netloc: threading.BoundedSemaphore(param["fetch_per_host"])
+                   for url in todo}
+
+    # die Verbindungen der Worker werden am Ende geschlossen
+    workers = set()
+    try:
+        with ThreadPoolExecutor(max_workers=param["fetch_workers"],
+                                initializer=lambda: workers.add(threading.get_ident())) as executor:
+            futures = {executor.submit(_fetch_and_extract, url, param, host_limits, validators.get(url)): url
+                       for url in todo}
+
+            # in den Cache wird nur aus diesem Thread geschrieben
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    _store_page(url, future.result())
+                    if refresh:
+                        _REFRESHED_URLS.add(url)
+                    continue
+                except FetchError as e:
+                    reason = str(e.reason)
+                except Exception as e:
+                    reason = repr(e)
+
+                if validators.get(url) is not None:
+                    log.warning("Keeping cached text of %s, refresh failed (%s)" % (url, reason))
+                else:
+                    failures[url] = reason
+    finally:
+        close_connections(workers)
+
+    return failures
 
 
 def load_text_from_file(fn):
@@ -64,8 +414,12 @@ def load_text_from_file(fn):
         return file_handle.read()
 
 
+def is_url(path):
+    return re.match("http[s]?://", path) is not None
+
+
 def load_text(path):
-    if re.match("http[s]?://", path):
+    if is_url(path):
         return load_text_from_url(path)
     else:
         return load_text_from_file(path)
@@ -99,15 +453,155 @@ def get_urls_per_subject_from_file(fn_list):
     return urls_per_subject
 
 
-def read_textcache():
-    if os.path.isfile(".textcache"):
-        text_cache_file = open(".textcache", mode="rb")
-        return pickle.load(text_cache_file)
-    return {}
+##########################################################################
+# Lokale Korpora
+#
+# Statt einer Datei mit "Kategorie | URL"-Zeilen kann ein ganzer Korpus auf
+# einmal gelesen werden:
+#   Verzeichnis   jede Datei ist ein Dokument, Kategorie ist der Name des
+#                 Verzeichnisses, in dem sie liegt
+#   *.jsonl       je Zeile ein Objekt mit "subject" und "text", optional "id"
+#   tar, zip      wie ein Verzeichnis, auch komprimiert (tar.gz, tar.bz2, ...)
+# Die Dokumente werden nacheinander gelesen und nicht in TEXT_CACHE abgelegt,
+# große Dateien werden per mmap eingeblendet statt kopiert.
+##########################################################################
+
+# ab dieser Größe werden Dateien per mmap gelesen
+MMAP_MIN_SIZE = 1024 * 1024
+
+
+def _decode(data):
+    return str(data, "utf-8", "replace")
+
+
+def _read_file(fn):
+    with open(fn, "rb") as file_handle:
+        if os.path.getsize(fn) < MMAP_MIN_SIZE:
+            return _decode(file_handle.read())
+        with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _decode(mapped)
+
+
+# Kategorie eines Dokuments im Archiv: das Verzeichnis, in dem es liegt
+def _subject_of_member(name):
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if len(parts) < 2 or any(part.startswith(".") for part in parts):
+        return None
+    return parts[-2]
+
+
+def _iter_directory(path):
+    for root, directories, files in os.walk(path):
+        directories[:] = sorted(directory for directory in directories if not directory.startswith("."))
+        # Dateien direkt im Korpus-Verzeichnis haben keine Kategorie
+        if root == path:
+            continue
+        for name in sorted(files):
+            if not name.startswith("."):
+                fn = os.path.join(root, name)
+                yield os.path.basename(root), fn, _read_file(fn)
+
+
+def _parse_jsonl(path, lines):
+    for number, line in enumerate(lines, 1):
+        if len(line.strip()) == 0:
+            continue
+        try:
+            record = json.loads(line)
+            subject, text = str(record["subject"]), str(record["text"])
+        except (ValueError, KeyError, TypeError) as e:
+            log.warning("%s:%i: skipping invalid line (%r)" % (path, number, e))
+            continue
+        yield subject, str(record.get("id") or "%s:%i" % (path, number)), text
+
+
+def _iter_jsonl(path):
+    with open(path, "rb") as jsonl_file:
+        if os.path.getsize(path) < MMAP_MIN_SIZE:
+            yield from _parse_jsonl(path, jsonl_file)
+        else:
+            with mmap.mmap(jsonl_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield from _parse_jsonl(path, iter(mapped.readline, b""))
+
+
+def _iter_tar(path):
+    # "r|*": nur vorwärts lesen, auch bei komprimierten Archiven ohne Zurückspringen
+    with tarfile.open(path, "r|*") as archive:
+        for member in archive:
+            subject = _subject_of_member(member.name)
+            if member.isfile() and subject is not None:
+                yield subject, "%s!%s" % (path, member.name), _decode(archive.extractfile(member).read())
+
+
+def _iter_zip(path):
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.infolist():
+            subject = _subject_of_member(member.filename)
+            if not member.is_dir() and subject is not None:
+                yield subject, "%s!%s" % (path, member.filename), _decode(archive.read(member))
+
+
+def is_corpus(path):
+    if os.path.isdir(path) or path.endswith(".jsonl"):
+        return True
+    return os.path.isfile(path) and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+# liefert (Kategorie, Kennung, Text) für jedes Dokument eines Korpus; die Kennung
+# ist der Dateiname, "Archiv!Name" oder die "id" bzw. "Datei:Zeile" bei JSONL
+def iter_corpus(path):
+    if os.path.isdir(path):
+        return _iter_directory(path)
+    if path.endswith(".jsonl"):
+        return _iter_jsonl(path)
+    if zipfile.is_zipfile(path):
+        return _iter_zip(path)
+    if os.path.isfile(path) and tarfile.is_tarfile(path):
+        return _iter_tar(path)
+    raise ValueError("%s is not a corpus (directory, .jsonl, tar or zip archive)" % path)
+
+
+# mehrere Korpora, lassen sich beliebig oft durchlaufen
+class LocalCorpus:
+    def __init__(self, paths):
+        self.paths = list(paths)
+
+    def __iter__(self):
+        for path in self.paths:
+            yield from iter_corpus(path)
+
+
+# getaggte Eingabe: Dateien mit "Kategorie | URL"-Zeilen (SortedDict Kategorie -> URLs)
+# oder lokale Korpora (LocalCorpus), beides gemischt geht nicht
+def get_tagged_input(fn_list):
+    if isinstance(fn_list, str):
+        fn_list = [ fn_list ]
 
+    corpora = [fn for fn in fn_list if is_corpus(fn)]
+    if len(corpora) == 0:
+        return get_urls_per_subject_from_file(fn_list)
+    if len(corpora) < len(fn_list):
+        raise ValueError("files with tagged urls and local corpora cannot be mixed: %s" %
+                         ", ".join(fn for fn in fn_list if fn not in corpora))
+    return LocalCorpus(corpora)
+
+
+# Der Cache liegt in einer sqlite-Datenbank (siehe textcache.py), ein alter
+# gepickelter .textcache wird beim ersten Zugriff automatisch übernommen
+def read_textcache(filename=None, **cache_params):
+    if filename is None:
+        return TextCache(**cache_params)
+    return TextCache(filename, **cache_params)
+
+def configure_textcache(filename=None, **cache_params):
+    global TEXT_CACHE
+    TEXT_CACHE.close()
+    _REFRESHED_URLS.clear()
+    TEXT_CACHE = read_textcache(filename, **cache_params)
+
+# Einträge werden sofort einzeln gespeichert, hier wird nur noch aufgeräumt
 def write_textcache():
-    text_cache_file = open(".textcache", mode="wb")
-    pickle.dump(TEXT_CACHE, text_cache_file)
+    TEXT_CACHE.evict()
 
 
 TEXT_CACHE = read_textcache()
@@ -4,27 +4,117 @@
 # Verarbeiten des eingelesenen Textes - Tokenisieren, Filtern
 
 import re
-import nltk
+import hashlib
+import zlib
+import importlib.metadata
+import inspect
 import logging as log
-import pprint
 import numpy
-import classification
+import scipy.sparse
+import profiling
 
-from functools import  reduce
+from concurrent.futures import ProcessPoolExecutor
 
-from collections import defaultdict # sum of dicts
+from collections import Counter, OrderedDict
 
-from fractions import Fraction # rational numbers
-
-from nltk.corpus import stopwords
 from sortedcontainers import SortedSet, SortedDict
 
-# NLTK-Stoppwörter global in Set importieren
-STOP_WORDS = set(stopwords.words('english'))
-
-from nltk.stem.snowball import SnowballStemmer
-
-STEMMER = SnowballStemmer("english", ignore_stopwords=True)
+# NLTK wird erst bei der ersten Verwendung geladen, das Importieren dauert länger
+# als viele Aufrufe (--help, classify über den Dienst) insgesamt
+_STOP_WORDS = None
+_STEMMER = None
+
+# NLTK-Stoppwörter als Set
+def getStopWords():
+    global _STOP_WORDS
+    if _STOP_WORDS is None:
+        from nltk.corpus import stopwords
+        _STOP_WORDS = frozenset(stopwords.words('english'))
+    return _STOP_WORDS
+
+
+def getStemmer():
+    global _STEMMER
+    if _STEMMER is None:
+        from nltk.stem.snowball import SnowballStemmer
+        _STEMMER = SnowballStemmer("english", ignore_stopwords=True)
+    return _STEMMER
+
+
+# bisherige Modul-Variablen STOP_WORDS und STEMMER, jetzt ebenfalls erst bei Bedarf
+def __getattr__(name):
+    if name == "STOP_WORDS":
+        return getStopWords()
+    if name == "STEMMER":
+        return getStemmer()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+# Begrenzter Zwischenspeicher (LRU) für die Wortstämme: natürliche Sprache wiederholt
+# sich stark, die meisten Aufrufe von stem liefern schon bekannte Stämme.
+# Ohne Angabe wird der Stemmer von getStemmer beim ersten Fehlschlag geladen.
+class StemCache:
+    def __init__(self, stemmer=None, maxsize=200000):
+        self.stemmer = stemmer
+        self.maxsize = maxsize
+        self.stems = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = None
+
+    def stem(self, word):
+        stem_word = self.stems.get(word)
+        if stem_word is not None:
+            self.hits += 1
+            self.stems.move_to_end(word)
+            return stem_word
+
+        self.misses += 1
+        if self.stemmer is None:
+            self.stemmer = getStemmer()
+        stem_word = self.stemmer.stem(word)
+        self.stems[word] = stem_word
+        if self.recorded is not None:
+            self.recorded[word] = stem_word
+        if len(self.stems) > self.maxsize:
+            self.stems.popitem(last=False)
+        return stem_word
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        while len(self.stems) > self.maxsize:
+            self.stems.popitem(last=False)
+
+    # die zuletzt benutzten Einträge als Tabelle, z.B. um sie mit den Lerndaten zu speichern
+    def export(self, limit=None):
+        items = list(self.stems.items())
+        if limit is not None:
+            items = items[-limit:]
+        return dict(items)
+
+    def preload(self, stem_table):
+        for word, stem_word in stem_table.items():
+            self.stems.setdefault(word, stem_word)
+        self.resize(self.maxsize)
+
+    # neu berechnete Stämme mitschreiben, z.B. um sie aus einem Worker-Prozess zurückzugeben
+    def startRecording(self):
+        self.recorded = {}
+
+    def stopRecording(self):
+        recorded, self.recorded = self.recorded, None
+        return recorded
+
+    def getStatistics(self):
+        calls = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.stems),
+                "hit_rate": self.hits / calls if calls > 0 else 0.0}
+
+
+STEM_CACHE = StemCache()
+
+# so viele Einträge werden als Tabelle mit den Lerndaten gespeichert
+STEM_TABLE_SIZE = 50000
 
 ##################(##############################################################
 # Liste bereinigen
@@ -44,30 +134,35 @@ def cleanWordList(in_list):
         for split_word in word.split("-"):
             if isValidWord(split_word):
                 #Stemming = Worte werden auf den Wortstamm zurückgeführt
-                stem_word = STEMMER.stem(split_word)
+                stem_word = STEM_CACHE.stem(split_word)
                 out_list.append(stem_word)
 
     return out_list
 
+VALID_START_RE = re.compile(r'[a-zA-Z0-9]')
+HEX_NUMBER_RE = re.compile(r'0[xX][0-9a-fA-F]+$')
+DECIMAL_NUMBER_RE = re.compile(r'\d+[.,]?\d*$')
+
 def isValidWord(in_word):
-    if not re.match('[a-zA-Z0-9]', in_word):
+    if not VALID_START_RE.match(in_word):
         return False
 
     # Hex-Zahlen rausfiltern
-    if re.match('0[xX][0-9a-fA-F]+$', in_word):
+    if HEX_NUMBER_RE.match(in_word):
         return False
     
     # Dezimalzahlen filtern (\d entspricht [0-9])
-    if re.match('\d+[.,]?\d*$', in_word):
+    if DECIMAL_NUMBER_RE.match(in_word):
         return False
 
     return True
 
 
 # Worten die Häufigkeit des Vorkommens zuordnen
+# Die Worte werden in einem Durchlauf gezählt und anschließend mit "scale" normiert
 def wordListToFreqDict(wordlist, scale=1):
-    wordfreq = [ Fraction(wordlist.count(p), scale) for p in wordlist]
-    return SortedDict(zip(wordlist, wordfreq))
+    scale = float(scale)
+    return {word: count / scale for word, count in Counter(wordlist).items()}
 
 
 # Worte nach Häufigkeit des Vorkommens sortieren
@@ -80,55 +175,293 @@ def buildSortedListFromDictionary(freqdict):
 ################################################################################
 
 
-def getFilteredTokens(INPUT_TEXT):
-    raw_tokens = list(nltk.word_tokenize(INPUT_TEXT, language="english"))
+TOKENIZERS = ["nltk", "fast"]
+
+def getFilteredTokens(INPUT_TEXT, tokenizer="nltk"):
+    if tokenizer == "fast":
+        # tokenisiert und stemmt in einem Durchgang, die Zeit zählt daher komplett als "tokenize"
+        with profiling.span("tokenize"):
+            return getFilteredTokensFast(INPUT_TEXT)
+
+    import nltk
+
+    with profiling.span("tokenize"):
+        raw_tokens = list(nltk.word_tokenize(INPUT_TEXT, language="english"))
     number_of_tokens = len(raw_tokens)
 
     # Liste bereinigen, siehe oben
-    cleaned_text = cleanWordList(raw_tokens)
+    with profiling.span("stem"):
+        cleaned_text = cleanWordList(raw_tokens)
+
+        stop_words = getStopWords()
+        return ( [w for w in cleaned_text if w not in stop_words], number_of_tokens )
+
+
+# Nachbildung von nltk.word_tokenize mit einem einzigen regulären Ausdruck.
+# Satzgrenzen (Punkt) werden nicht gelernt, sondern geraten: ein Punkt am Wortende
+# gilt als Satzende, wenn danach kein klein geschriebenes Wort folgt. Abweichungen
+# zu NLTK gibt es daher bei Abkürzungen vor Großbuchstaben und seltenen
+# Kontraktionen ('tis, more'n, d'ye).
+
+# immer einzeln stehende Zeichen (Klammern, Anführungszeichen, Satzzeichen, Gedankenstriche)
+_SPLIT_CHARS = r";@#$%&?!*()\[\]{}<>\"`\u00ab\u00bb\u201c\u201d\u2018\u2019\u201e\u2012-\u2015"
+# Punkt am Satzende
+_FINAL_PERIOD = r"\.(?=[\]\)}>\"']*(?:\s+[^a-z\s]|\s*$))"
+# Position, an der ein Token endet
+_TOKEN_END = r"(?=\s|$|[" + _SPLIT_CHARS + r"]|[,:](?!\d)|--|" + _FINAL_PERIOD + ")"
+# abgetrennte Endungen wie 's, 'll, n't
+_CLITIC = r"(?:'[sSmMdD]|'ll|'LL|'re|'RE|'ve|'VE|n't|N'T)" + _TOKEN_END
+
+# innerhalb eines Wortes erlaubt: Bindestrich (nicht --), Komma und Doppelpunkt vor
+# Ziffern, Punkt (nicht am Satzende), Apostroph (nicht vor einer abgetrennten Endung)
+_WORD_CHAR = (
+    r"[^\s,:.'\-nN" + _SPLIT_CHARS + r"]+"
+    + r"|n(?!'t" + _TOKEN_END + r")|N(?!'T" + _TOKEN_END + r")"
+    + r"|-(?!-)"
+    + r"|[,:](?=\d)"
+    + r"|(?!" + _FINAL_PERIOD + r")\.(?!\.)"
+    + r"|(?<=\w)'(?!(?:[sSmMdD]|ll|LL|re|RE|ve|VE)?" + _TOKEN_END + r")")
+
+FAST_TOKEN_RE = re.compile(
+    r"\.{2,}|--|[" + _SPLIT_CHARS + r"]|" + _FINAL_PERIOD + r"|[,:](?!\d)"
+    + r"|'(?:[sSmMdD]|ll|LL|re|RE|ve|VE)" + _TOKEN_END
+    + r"|(?P<contraction>(?:n't|N'T)" + _TOKEN_END
+    + r"|(?i:\b(?:can(?=not\b)|gim(?=me\b)|gon(?=na\b)|got(?=ta\b)|lem(?=me\b)|wan(?=na\s))))"
+    + r"|(?P<word>(?:" + _WORD_CHAR + r")+)"
+    + r"|\S")
+
+
+# Schnelle Variante von getFilteredTokens: ein Durchlauf über den Text, in dem
+# tokenisiert, klein geschrieben, am Bindestrich getrennt und Zahlen verworfen werden
+def getFilteredTokensFast(INPUT_TEXT):
+    out_list = []
+    number_of_tokens = 0
+    stop_words = getStopWords()
+
+    for match in FAST_TOKEN_RE.finditer(INPUT_TEXT):
+        number_of_tokens += 1
+
+        word = match.group("word") or match.group("contraction")
+        if word is None:
+            continue
+
+        word = word.lower()
+        if not isValidWord(word):
+            continue
+
+        for split_word in word.split("-"):
+            if isValidWord(split_word):
+                stem_word = STEM_CACHE.stem(split_word)
+                if stem_word not in stop_words:
+                    out_list.append(stem_word)
+
+    return (out_list, number_of_tokens)
+
 
-    # Liste alphabetisch sortieren
-    sorted_text = (sorted(cleaned_text))
+################################################################################
+# Cache für die Worthäufigkeiten (siehe textcache.FrequencyCache), wird von main gesetzt
+FREQUENCY_CACHE = None
+
+# bei Änderungen an der Textverarbeitung, die sich nicht im Quelltext der
+# Funktionen unten niederschlagen (z.B. andere NLTK-Version), erhöhen
+PIPELINE_VERSION = 1
+
+_PIPELINE_FINGERPRINTS = {}
+
+# Fingerabdruck aller Einstellungen, die das Ergebnis von makeWordFrequencyDictionary beeinflussen
+def getPipelineFingerprint(tokenizer="nltk"):
+    if tokenizer not in _PIPELINE_FINGERPRINTS:
+        fingerprint = hashlib.sha1()
+        fingerprint.update(("%i %s %s" % (PIPELINE_VERSION, importlib.metadata.version("nltk"), tokenizer)).encode("utf-8"))
+
+        for function in [getFilteredTokens, getFilteredTokensFast, cleanWordList, isValidWord, wordListToFreqDict]:
+            try:
+                fingerprint.update(inspect.getsource(function).encode("utf-8"))
+            except (OSError, TypeError):
+                fingerprint.update(function.__code__.co_code)
 
+        fingerprint.update(FAST_TOKEN_RE.pattern.encode("utf-8"))
+        fingerprint.update(" ".join(sorted(getStopWords())).encode("utf-8"))
+        fingerprint.update(type(getStemmer().stemmer).__name__.encode("utf-8"))
+        fingerprint.update(" ".join(sorted(getStemmer().stopwords)).encode("utf-8"))
 
-    return ( [w for w in sorted_text if w not in STOP_WORDS], number_of_tokens )
+        _PIPELINE_FINGERPRINTS[tokenizer] = fingerprint.hexdigest()
+
+    return _PIPELINE_FINGERPRINTS[tokenizer]
+
+
+def getFrequencyCacheKey(INPUT_TEXT, tokenizer="nltk"):
+    return hashlib.sha1(INPUT_TEXT.encode("utf-8")).hexdigest() + ":" + getPipelineFingerprint(tokenizer)
 
 
 # Wörterbuch mit normierter Worthäufigkeit als "value" und Wörtern als "key" erstellen
-def makeWordFrequencyDictionary(INPUT_TEXT):
+def makeWordFrequencyDictionary(INPUT_TEXT, tokenizer="nltk"):
+    if FREQUENCY_CACHE is not None:
+        key = getFrequencyCacheKey(INPUT_TEXT, tokenizer)
+        DICTIONARY = FREQUENCY_CACHE.get(key)
+        if DICTIONARY is not None:
+            return DICTIONARY
+
+    DICTIONARY = computeWordFrequencyDictionary(INPUT_TEXT, tokenizer)
+
+    if FREQUENCY_CACHE is not None:
+        FREQUENCY_CACHE.put(key, DICTIONARY)
+
+    return DICTIONARY
+
+
+# wie makeWordFrequencyDictionary, aber ohne Cache
+def computeWordFrequencyDictionary(INPUT_TEXT, tokenizer="nltk"):
     # Text tokenisieren
-    (TOKENIZED_TEXT, INPUT_WORD_COUNT) = getFilteredTokens(INPUT_TEXT)
+    (TOKENIZED_TEXT, INPUT_WORD_COUNT) = getFilteredTokens(INPUT_TEXT, tokenizer)
 
     DICTIONARY = wordListToFreqDict(TOKENIZED_TEXT, INPUT_WORD_COUNT)
 
+    if profiling.ENABLED:
+        profiling.addDocument(bytes=len(INPUT_TEXT.encode("utf-8")), tokens=INPUT_WORD_COUNT,
+                              unique_stems=len(DICTIONARY))
     return DICTIONARY
 
 
+################################################################################
+# Verarbeitung vieler Dokumente, wahlweise verteilt auf mehrere Prozesse
+
+def initWordFrequencyWorker(stem_cache_size, stem_table, profile=False):
+    global FREQUENCY_CACHE
+    # der Cache gehört dem Hauptprozess
+    FREQUENCY_CACHE = None
+
+    if profile:
+        profiling.enable()
+
+    STEM_CACHE.resize(stem_cache_size)
+    STEM_CACHE.preload(stem_table)
+
+
+# wird im Worker-Prozess ausgeführt; liefert neben den Worthäufigkeiten die neu
+# berechneten Wortstämme, die Statistik des Stem-Caches und die Messwerte an den Hauptprozess
+def computeWordFrequencyChunk(texts, tokenizer):
+    hits, misses = STEM_CACHE.hits, STEM_CACHE.misses
+    STEM_CACHE.startRecording()
+
+    dictionaries = [computeWordFrequencyDictionary(text, tokenizer) for text in texts]
+
+    return (dictionaries, STEM_CACHE.stopRecording(), STEM_CACHE.hits - hits, STEM_CACHE.misses - misses,
+            profiling.collect())
+
+
+def _processWordFrequencyBatch(texts, tokenizer, executor, chunksize):
+    results = [None] * len(texts)
+    keys = {}
+    todo = []
+
+    for i, text in enumerate(texts):
+        if len(text) == 0:
+            results[i] = {}
+            continue
+
+        if FREQUENCY_CACHE is not None:
+            keys[i] = getFrequencyCacheKey(text, tokenizer)
+            results[i] = FREQUENCY_CACHE.get(keys[i])
+
+        if results[i] is None:
+            todo.append(i)
+
+    if executor is not None and len(todo) > 1:
+        chunks = [todo[start:start + chunksize] for start in range(0, len(todo), chunksize)]
+        computed = []
+        for dictionaries, stems, hits, misses, profile in executor.map(
+                computeWordFrequencyChunk, [[texts[i] for i in chunk] for chunk in chunks],
+                [tokenizer] * len(chunks)):
+            computed.extend(dictionaries)
+            STEM_CACHE.preload(stems)
+            STEM_CACHE.hits += hits
+            STEM_CACHE.misses += misses
+            profiling.merge(profile)
+    else:
+        computed = [computeWordFrequencyDictionary(texts[i], tokenizer) for i in todo]
+
+    for i, dictionary in zip(todo, computed):
+        results[i] = dictionary
+        if FREQUENCY_CACHE is not None:
+            FREQUENCY_CACHE.put(keys[i], dictionary)
+
+    return results
+
+
+# Worthäufigkeiten für viele Texte; bei jobs > 1 werden die Texte in Paketen von
+# "chunksize" Dokumenten auf mehrere Prozesse verteilt. Die Texte werden
+# stückweise gelesen, die Ergebnisse kommen in der Reihenfolge der Texte zurück.
+def makeWordFrequencyDictionaries(texts, tokenizer="nltk", jobs=1, chunksize=8):
+    executor = None
+    if jobs > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, initializer=initWordFrequencyWorker,
+            initargs=(STEM_CACHE.maxsize, STEM_CACHE.export(STEM_TABLE_SIZE), profiling.ENABLED))
+
+    batch_size = max(jobs, 1) * chunksize * 4
+    try:
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_size:
+                yield from _processWordFrequencyBatch(batch, tokenizer, executor, chunksize)
+                batch = []
+
+        yield from _processWordFrequencyBatch(batch, tokenizer, executor, chunksize)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
 def appendWordFreqDictToExistingDict(existing, to_append):
     for key, value in to_append.items():
-        existing[key] = value + existing.get(key, Fraction(0,1))
+        existing[key] = value + existing.get(key, 0.0)
 
     return existing
 
 
 def compareWordFreqDictToLearningData(freq, learning_data, params):
-    FIRST_N_WORDS=40
-    log.debug("Words: %s" % pprint.pformat(freq))
+    log.debug("Words: %s", profiling.PrettyFormat(freq))
 
+    scores, subjects = compareWordFreqDictsToLearningData([freq], learning_data, params)
 
-    p = learning_data.scaler.transform(
-        getClassificationVectorSpaceElement(learning_data.base, freq).reshape(1,-1)
-    )
-    if isinstance(learning_data.classifier, classification.SelfmadeNaive):
-        # For our selfmade classifier, we need to scale the vectors differently
-        N_WORDS_TOT = len(freq.keys())
-        WORDS_PER_BASE = len(learning_data.base) / len(learning_data.all_learned_subjects)
-        p *= N_WORDS_TOT / WORDS_PER_BASE
+    result = SortedDict({subject: score for subject, score in zip(subjects, scores[0])})
+    return result
 
-    res = learning_data.classifier.predict_proba(p.reshape(1,-1))
 
-    result = SortedDict({subject: score for subject, score in zip(learning_data.all_learned_subjects, res[0])})
-    return result
+# Die gelernten Kategorien in der Reihenfolge der Spalten von predict_proba
+def getLearnedSubjects(learning_data):
+    subjects = getattr(learning_data, "subjects", None)
+    if subjects is not None:
+        return list(subjects)
+    return list(SortedSet(learning_data.target))
+
+
+# Viele Dokumente auf einmal bewerten: liefert eine Matrix mit einer Zeile pro
+# Dokument und einer Spalte pro Kategorie sowie die Liste der Kategorien
+def compareWordFreqDictsToLearningData(freqs, learning_data, params):
+    subjects = getLearnedSubjects(learning_data)
+    if len(freqs) == 0:
+        return numpy.zeros((0, len(subjects))), subjects
+
+    # Vektoren wie beim Lernen aufbauen: dünnbesetzt, wenn das Modell darauf trainiert wurde
+    p = getClassificationMatrix(getFeatureIndex(learning_data), freqs)
+    if not getattr(learning_data, "sparse", False):
+        p = p.toarray()
+
+    import classification
+
+    with profiling.span("predict"):
+        p = learning_data.scaler.transform(p)
+        if isinstance(learning_data.classifier, classification.SelfmadeNaive):
+            # For our selfmade classifier, we need to scale the vectors differently
+            N_WORDS_TOT = numpy.array([len(freq) for freq in freqs], dtype=numpy.float64)
+            WORDS_PER_BASE = len(learning_data.base) / len(subjects)
+            p = scipy.sparse.diags(N_WORDS_TOT / WORDS_PER_BASE) @ p
+
+        scores = numpy.vstack(learning_data.classifier.predict_proba(p))
+    return scores, subjects
 
 def getClassificationStdParam():
     param = {}
@@ -136,7 +469,17 @@ def getClassificationStdParam():
     param["other_cutoff"] = 0.6
     param["algorithm"] = "svm"
     param["category_base_length"] = 40  # aka first_n_words
+    param["feature_selection"] = "frequency"  # siehe FEATURE_SELECTIONS
     param["remove_shared_words"] = True
+    param["tokenizer"] = "nltk"
+    param["jobs"] = 1  # Prozesse für die Textverarbeitung
+    param["search_jobs"] = -1  # Prozesse für die Parametersuche, -1 = alle Kerne
+    param["halving"] = False  # successive halving statt des vollständigen Gitters
+    param["streaming"] = False  # Lernen in zwei Durchläufen mit begrenztem Speicher
+    param["hashing"] = False  # Merkmale per Hash statt einer Basis
+    param["hash_bits"] = HASH_BITS  # 2**hash_bits Spalten
+    param["signed_hash"] = False  # Vorzeichen der Merkmale aus dem Hash
+    param["retrain_threshold"] = 0.1  # update: Anteil geänderter Basis-Wörter, ab dem neu gelernt wird
 
     return param
 
@@ -162,36 +505,362 @@ def getWinningSubject(per_subject_score, classification_params):
     else:
         return winning_subjects.pop()
 
+################################################################################
+# Kompakte Dokumente
+#
+# Beim Lernen werden alle Dokumente gleichzeitig gebraucht. Statt eines dict je
+# Dokument (Wortstamm -> Häufigkeit) wird jedes Dokument als zwei Arrays gehalten:
+# die IDs der Wortstämme (uint32, aufsteigend) und die Häufigkeiten (float64).
+# Die IDs vergibt ein gemeinsames TokenVocabulary, jeder Wortstamm liegt also nur
+# einmal im Speicher. Die Häufigkeiten bleiben float64 wie in den dicts: schon
+# gerundete Summen ändern bei Gleichstand, welche Wörter in die Basis kommen.
+
+class TokenVocabulary:
+    def __init__(self):
+        self.ids = {}
+        self.words = []
+
+    def __len__(self):
+        return len(self.words)
+
+    # IDs der Wörter, unbekannte Wörter bekommen eine neue ID
+    def idsFor(self, words):
+        ids = numpy.empty(len(words), dtype=numpy.uint32)
+        for i, word in enumerate(words):
+            word_id = self.ids.get(word)
+            if word_id is None:
+                word_id = self.ids[word] = len(self.words)
+                self.words.append(word)
+            ids[i] = word_id
+        return ids
+
+    def wordsFor(self, ids):
+        return [self.words[word_id] for word_id in ids]
+
+
+class CompactDocument:
+    __slots__ = ("ids", "freqs")
+
+    def __init__(self, ids, freqs):
+        order = numpy.argsort(ids, kind="stable")
+        self.ids = numpy.asarray(ids, dtype=numpy.uint32)[order]
+        self.freqs = numpy.asarray(freqs, dtype=numpy.float64)[order]
+
+    # Anzahl verschiedener Wortstämme wie len() eines Worthäufigkeits-dict
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def fromWordFreqDict(cls, word_freq_dict, token_vocabulary):
+        return cls(token_vocabulary.idsFor(list(word_freq_dict.keys())),
+                   numpy.fromiter(word_freq_dict.values(), dtype=numpy.float64, count=len(word_freq_dict)))
+
+    def toWordFreqDict(self, token_vocabulary):
+        return {token_vocabulary.words[word_id]: float(freq) for word_id, freq in zip(self.ids, self.freqs)}
+
+    def nbytes(self):
+        return self.ids.nbytes + self.freqs.nbytes
+
+
+# Verfahren zur Auswahl der Wörter der Basis je Kategorie
+#   frequency    die häufigsten Wörter (bisheriges Verfahren)
+#   chi2         größte Abweichung von der Verteilung über alle Kategorien (Chi²)
+#   mutual_info  größte Transinformation zwischen Wort und Kategorie
+FEATURE_SELECTIONS = ["frequency", "chi2", "mutual_info"]
+
+
+# Worthäufigkeiten aller Kategorien als dünnbesetzte Matrix (Kategorien x Wörter).
+# Die Wörter sind sortiert, die Spalte eines Wortes ist also seine Position in
+# der Sortierung. Einträge mit Häufigkeit 0 bleiben erhalten: ein Wort gehört zu
+# einer Kategorie, wenn es in deren Wortliste vorkommt.
+class VocabularyMatrix:
+    def __init__(self, per_subject_wordfreq_dict):
+        subjects = list(per_subject_wordfreq_dict.keys())
+        words = sorted(set(word for word_freqs in per_subject_wordfreq_dict.values() for word in word_freqs))
+        index = {word: column for column, word in enumerate(words)}
+
+        indptr = [0]
+        indices = []
+        data = []
+        for word_freqs in per_subject_wordfreq_dict.values():
+            indices.extend(index[word] for word in word_freqs)
+            data.extend(float(freq) for freq in word_freqs.values())
+            indptr.append(len(indices))
+
+        self._setCounts(subjects, words, index, numpy.array(data, dtype=numpy.float64),
+                        numpy.array(indices, dtype=numpy.int64), numpy.array(indptr))
+
+    # Summen der Häufigkeiten direkt aus den Arrays der kompakten Dokumente
+    # (dict Kategorie -> Liste von CompactDocument), ohne Wörterbücher
+    @classmethod
+    def fromCompactDocuments(cls, per_subject_documents, token_vocabulary):
+        per_subject_ids = []
+        per_subject_sums = []
+        for documents in per_subject_documents.values():
+            ids, inverse = numpy.unique(
+                numpy.concatenate([document.ids for document in documents] + [numpy.zeros(0, numpy.uint32)]),
+                return_inverse=True)
+            freqs = numpy.concatenate([document.freqs for document in documents] + [numpy.zeros(0)])
+            per_subject_ids.append(ids)
+            per_subject_sums.append(numpy.bincount(inverse, weights=freqs, minlength=len(ids)))
+
+        # Spalten in der Sortierung der Wörter statt in der Reihenfolge der IDs
+        used = numpy.unique(numpy.concatenate(per_subject_ids + [numpy.zeros(0, numpy.uint32)]))
+        used = used[numpy.argsort(numpy.array(token_vocabulary.wordsFor(used), dtype=str), kind="stable")]
+        column_of_id = numpy.full(len(token_vocabulary), -1, dtype=numpy.int64)
+        column_of_id[used] = numpy.arange(len(used))
+
+        words = token_vocabulary.wordsFor(used)
+        matrix = cls.__new__(cls)
+        matrix._setCounts(list(per_subject_documents.keys()), words, {word: column for column, word in enumerate(words)},
+                          numpy.concatenate(per_subject_sums + [numpy.zeros(0)]),
+                          numpy.concatenate([column_of_id[ids] for ids in per_subject_ids] + [numpy.zeros(0, numpy.int64)]),
+                          numpy.cumsum([0] + [len(ids) for ids in per_subject_ids]))
+        return matrix
+
+    def _setCounts(self, subjects, words, index, data, indices, indptr):
+        self.subjects = subjects
+        self.words = words
+        self.index = index
+        self.counts = scipy.sparse.csr_matrix((data, indices, indptr), shape=(len(subjects), len(words)))
+        self.counts.sort_indices()
+
+    # Worthäufigkeiten je Kategorie als Wörterbücher (für update und die Modelldatei)
+    def wordFreqDicts(self):
+        per_subject_word_freq = SortedDict()
+        for row, subject in enumerate(self.subjects):
+            columns, freqs = self.row(row)
+            per_subject_word_freq[subject] = {self.words[column]: float(freq) for column, freq in zip(columns, freqs)}
+        return per_subject_word_freq
+
+    # Spalten und Werte der Wörter einer Kategorie
+    def row(self, row):
+        start, end = self.counts.indptr[row], self.counts.indptr[row + 1]
+        return self.counts.indices[start:end], self.counts.data[start:end]
+
+    # Wörter, die in jeder Kategorie vorkommen (bei nur einer Kategorie keine)
+    def sharedWords(self):
+        if len(self.subjects) < 2:
+            return numpy.zeros(len(self.words), dtype=bool)
+        return numpy.bincount(self.counts.indices, minlength=len(self.words)) == len(self.subjects)
+
+    # Wörter der Basis je Kategorie
+    def categoryWords(self, base):
+        in_base = numpy.zeros(len(self.words), dtype=bool)
+        in_base[[self.index[word] for word in base if word in self.index]] = True
+
+        category_words = SortedDict()
+        for row, subject in enumerate(self.subjects):
+            columns = self.row(row)[0]
+            category_words[subject] = SortedSet(self.words[column] for column in columns[in_base[columns]])
+        return category_words
+
+
+# Bewertung der Wörter einer Kategorie für die Auswahl, höher ist besser
+def _featureScores(vocabulary, row, method, column_sums, total):
+    columns, observed = vocabulary.row(row)
+    if method == "frequency":
+        return observed
+
+    row_sum = observed.sum()
+    expected = row_sum * column_sums[columns] / total
+    if method == "chi2":
+        scores = numpy.divide((observed - expected) ** 2, expected, out=numpy.zeros_like(observed), where=expected > 0)
+    else:
+        # Vierfeldertafel je Wort: Wort/andere Wörter x Kategorie/andere Kategorien
+        n11 = observed
+        n10 = column_sums[columns] - observed
+        n01 = row_sum - observed
+        n00 = total - n11 - n10 - n01
+        scores = numpy.zeros_like(observed)
+        for n, word_total, category_total in [(n11, n11 + n10, n11 + n01), (n10, n11 + n10, n10 + n00),
+                                              (n01, n01 + n00, n11 + n01), (n00, n01 + n00, n10 + n00)]:
+            ratio = numpy.divide(total * n, word_total * category_total,
+                                 out=numpy.ones_like(observed), where=(n > 0) & (word_total * category_total > 0))
+            scores += n / total * numpy.log2(ratio)
+
+    # nur Wörter, die in der Kategorie häufiger als erwartet sind, kennzeichnen sie
+    return numpy.where(observed > expected, scores, -numpy.inf)
+
+
+# die k besten Spalten; bei gleicher Bewertung gewinnt wie bisher das alphabetisch
+# spätere Wort, columns muss dafür aufsteigend sortiert sein
+def _selectTopK(scores, columns, k):
+    if k <= 0:
+        return columns[:0]
+    if len(scores) <= k:
+        return columns
+
+    threshold = numpy.partition(scores, len(scores) - k)[len(scores) - k]
+    above = columns[scores > threshold]
+    tied = columns[scores == threshold]
+    return numpy.concatenate([above, tied[len(tied) - (k - len(above)):]])
+
+
 # Erstellen der Basis
-def buildClassificationSpaceBase(per_subject_wordfreq_dict, classification_params):
+@profiling.timed("base")
+def buildClassificationSpaceBase(per_subject_wordfreq_dict, classification_params, vocabulary=None):
     first_n_words = classification_params["category_base_length"]
+    method = classification_params.get("feature_selection", "frequency")
+    if method not in FEATURE_SELECTIONS:
+        raise ValueError("unknown feature selection %s, supported: %s" % (method, ", ".join(FEATURE_SELECTIONS)))
 
-    result = SortedSet()
-
-    all_the_words = [SortedSet(word_freqs.keys()) for word_freqs in per_subject_wordfreq_dict.values()]
+    if vocabulary is None:
+        vocabulary = VocabularyMatrix(per_subject_wordfreq_dict)
 
     if classification_params["remove_shared_words"]:
-        shared_words = reduce(lambda x, y: x & y, all_the_words) if len(all_the_words) > 1 else SortedSet()
+        shared_words = vocabulary.sharedWords()
     else:
-        shared_words = SortedSet()
+        shared_words = numpy.zeros(len(vocabulary.words), dtype=bool)
+
+    log.info("Those words exist in every category: %s",
+             profiling.PrettyFormat([vocabulary.words[column] for column in numpy.flatnonzero(shared_words)]))
 
-    log.info("Those words exist in every category: %s" % pprint.pformat(shared_words))
+    column_sums = numpy.asarray(vocabulary.counts.sum(axis=0)).ravel()
+    total = column_sums.sum()
 
-    for category, wordfreq_dist in per_subject_wordfreq_dict.items():
+    in_base = numpy.zeros(len(vocabulary.words), dtype=bool)
+    for row, category in enumerate(vocabulary.subjects):
         log.info("Processing category %s" % category)
-        words = SortedSet([x[1] for x in buildSortedListFromDictionary(wordfreq_dist) if x[1] not in shared_words][:first_n_words])
-        intersection = words & result
+        columns = vocabulary.row(row)[0]
+        scores = _featureScores(vocabulary, row, method, column_sums, total)
+
+        candidates = ~shared_words[columns] & (scores > -numpy.inf)
+        selected = _selectTopK(scores[candidates], columns[candidates], first_n_words)
 
+        intersection = selected[in_base[selected]]
         if len(intersection) > 0:
-            log.warning("The base of category %s seems not to be unique! Those base elements already exist: %s" %
-                        (category, pprint.pformat(intersection)))
+            log.warning("The base of category %s seems not to be unique! Those base elements already exist: %s",
+                        category, profiling.PrettyFormat(sorted(vocabulary.words[column] for column in intersection)))
 
-        result |= words
+        in_base[selected] = True
+
+    return SortedSet(vocabulary.words[column] for column in numpy.flatnonzero(in_base))
+
+################################################################################
+# Merkmale per Hash (learn --hashing)
+#
+# Statt einer Basis wird jeder Wortstamm per crc32 auf eine von 2**bits Spalten
+# abgebildet. Die Länge der Vektoren hängt nicht vom Korpus ab, neue Dokumente
+# oder Kategorien ändern die Zuordnung nicht und es wird kein Vokabular im
+# Speicher gehalten. Mit signed legt das oberste Bit des Hashes das Vorzeichen
+# fest, Kollisionen heben sich dann im Mittel auf.
+
+HASH_BITS = 18
+HASH_MAX_BITS = 30
+
+class HashingIndex:
+    def __init__(self, bits=HASH_BITS, signed=False):
+        if not 1 <= bits <= HASH_MAX_BITS:
+            raise ValueError("the number of hash bits must be between 1 and %i, not %i" % (HASH_MAX_BITS, bits))
+        self.bits = bits
+        self.signed = signed
+
+    # Anzahl der Spalten, wie len() der Zuordnung aus getBaseIndex
+    def __len__(self):
+        return 1 << self.bits
+
+    # Einstellungen, wie sie im Modell gespeichert werden
+    def params(self):
+        return {"bits": self.bits, "signed": self.signed}
+
+    def matrix(self, word_freq_dicts):
+        crc32 = zlib.crc32
+        mask = (1 << self.bits) - 1
+        sign_bit = 0x80000000 if self.signed else 0
+
+        indptr = [0]
+        indices = []
+        data = []
+        for word_freq_dict in word_freq_dicts:
+            for word, freq in word_freq_dict.items():
+                word_hash = crc32(word.encode("utf-8"))
+                indices.append(word_hash & mask)
+                data.append(-float(freq) if word_hash & sign_bit else float(freq))
+            indptr.append(len(indices))
+
+        matrix = scipy.sparse.csr_matrix(
+            (numpy.array(data, dtype=numpy.float64), numpy.array(indices, dtype=numpy.int32), numpy.array(indptr)),
+            shape=(len(indptr) - 1, len(self)))
+        # Kollisionen innerhalb eines Dokuments addieren
+        matrix.sum_duplicates()
+        return matrix
+
+
+# Zuordnung Wort -> Spalte eines gelernten Modells (LearningData oder modelfile.Model)
+def getFeatureIndex(learning_data):
+    base_index = getattr(learning_data, "base_index", None)
+    if base_index is not None:
+        return base_index
+
+    hashing = getattr(learning_data, "hashing", None)
+    if hashing:
+        return HashingIndex(**hashing)
+    return getBaseIndex(learning_data.base)
 
-    return result
 
 def getClassificationVectorSpaceElement(base, word_freq_dict):
+    if isinstance(base, HashingIndex):
+        return base.matrix([word_freq_dict]).toarray()[0]
     if len(base) > 0:
         return numpy.array([float(word_freq_dict.get(word, 0.0)) for word in base])
     else:
         return None
+
+
+# Zuordnung Wort -> Spalte der Vektoren, einmalig aus der Basis berechnet
+def getBaseIndex(base):
+    return {word: column for column, word in enumerate(base)}
+
+
+# Alle Dokumente in einem Durchlauf in eine dünnbesetzte Matrix (CSR) umwandeln,
+# eine Zeile je Dokument, eine Spalte je Wort der Basis
+@profiling.timed("vectorize")
+def getClassificationMatrix(base_index, word_freq_dicts):
+    if isinstance(base_index, HashingIndex):
+        return base_index.matrix(word_freq_dicts)
+
+    indptr = [0]
+    indices = []
+    data = []
+
+    for word_freq_dict in word_freq_dicts:
+        for word, freq in word_freq_dict.items():
+            column = base_index.get(word)
+            if column is not None:
+                indices.append(column)
+                data.append(float(freq))
+        indptr.append(len(indices))
+
+    matrix = scipy.sparse.csr_matrix(
+        (numpy.array(data, dtype=numpy.float64), numpy.array(indices, dtype=numpy.int32), numpy.array(indptr)),
+        shape=(len(indptr) - 1, len(base_index)))
+    matrix.sort_indices()
+    return matrix
+
+
+# wie getClassificationMatrix, aber für kompakte Dokumente: die Zuordnung
+# ID -> Spalte wird einmal berechnet, alles Weitere sind Array-Operationen
+@profiling.timed("vectorize")
+def getCompactClassificationMatrix(base_index, documents, token_vocabulary):
+    column_of_id = numpy.full(len(token_vocabulary), -1, dtype=numpy.int64)
+    for word, column in base_index.items():
+        word_id = token_vocabulary.ids.get(word)
+        if word_id is not None:
+            column_of_id[word_id] = column
+
+    ids = numpy.concatenate([document.ids for document in documents] + [numpy.zeros(0, numpy.uint32)])
+    freqs = numpy.concatenate([document.freqs for document in documents] + [numpy.zeros(0)])
+    columns = column_of_id[ids]
+    in_base = columns >= 0
+
+    # Zeilengrenzen nach dem Herausfiltern der Wörter außerhalb der Basis
+    lengths = numpy.array([len(document) for document in documents], dtype=numpy.int64)
+    row_of_entry = numpy.repeat(numpy.arange(len(documents)), lengths)
+    indptr = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(row_of_entry[in_base], minlength=len(documents)))])
+
+    matrix = scipy.sparse.csr_matrix(
+        (freqs[in_base], columns[in_base].astype(numpy.int32), indptr),
+        shape=(len(documents), len(base_index)))
+    matrix.sort_indices()
+    return matrix